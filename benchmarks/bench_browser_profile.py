@@ -0,0 +1,214 @@
+"""
+Benchmark of the 'full' and 'lean' browser profiles of selenium_driver_factory
+
+A local server serves the article fixtures dressed like real news pages: stylesheets,
+web fonts, a dozen images and an autoplaying video per page, each asset answered
+after `--asset-latency-ms`. Every profile renders the same pages with the readiness
+conditions used by ContentScraper, and the report gives the page load time, the
+assets downloaded, the RSS of the browser processes and whether trafilatura still
+extracts the same text. Needs Chrome; psutil for the memory figures.
+
+Usage:
+    python -m benchmarks.bench_browser_profile --pages 30
+    python -m benchmarks.bench_browser_profile --profiles full lean --headed
+"""
+import os
+import re
+import glob
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from benchmarks.harness import save_results
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+ASSET_TYPES = {
+    'css': 'text/css',
+    'woff2': 'font/woff2',
+    'jpg': 'image/jpeg',
+    'mp4': 'video/mp4',
+}
+
+class AssetServer:
+    """Serves /page-<n>.html built from the article fixtures and the assets they reference"""
+
+    def __init__(self, images=12, image_kb=120, css_kb=80, font_kb=60, video_kb=1024, asset_latency_ms=20):
+        self.images = images
+        self.sizes = {'css': css_kb * 1024, 'woff2': font_kb * 1024, 'jpg': image_kb * 1024, 'mp4': video_kb * 1024}
+        self.asset_latency = asset_latency_ms / 1000
+        self.articles = []
+        for path in sorted(glob.glob(os.path.join(FIXTURE_DIR, 'article_*.html'))):
+            with open(path, encoding='utf-8') as f:
+                self.articles.append(f.read())
+        if not self.articles:
+            raise SystemExit(f"No article fixtures found in {FIXTURE_DIR}")
+
+        self._lock = threading.Lock()
+        self.requests = Counter()  # Asset type -> requests served
+        self.bytes_sent = 0
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                server.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, name='asset-server', daemon=True).start()
+
+    def page(self, index):
+        """An article fixture with the assets of a typical news page, unique per page"""
+        article = self.articles[index % len(self.articles)]
+        head = (f'<link rel="stylesheet" href="/assets/site-{index}.css">'
+                f'<style>@font-face {{font-family: Body; src: url(/assets/body-{index}.woff2)}} '
+                f'body {{font-family: Body}}</style>')
+        media = ''.join(f'<img src="/assets/photo-{index}-{image}.jpg" alt="">' for image in range(self.images))
+        media += f'<video src="/assets/clip-{index}.mp4" autoplay muted></video>'
+        article = article.replace('</head>', head + '</head>', 1)
+        return article.replace('</body>', media + '</body>', 1)
+
+    def handle(self, request):
+        match = re.match(r'/page-(\d+)\.html$', request.path)
+        if match:
+            body, content_type, kind = self.page(int(match.group(1))).encode('utf-8'), 'text/html; charset=utf-8', 'html'
+        else:
+            kind = request.path.rsplit('.', 1)[-1]
+            if not request.path.startswith('/assets/') or kind not in ASSET_TYPES:
+                request.send_error(404)
+                return
+            time.sleep(self.asset_latency)
+            body, content_type = b'\0' * self.sizes[kind], ASSET_TYPES[kind]
+        with self._lock:
+            self.requests[kind] += 1
+            self.bytes_sent += len(body)
+        try:
+            request.send_response(200)
+            request.send_header('Content-Type', content_type)
+            request.send_header('Content-Length', str(len(body)))
+            request.send_header('Cache-Control', 'max-age=3600')
+            request.end_headers()
+            request.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The browser dropped a blocked or no longer needed download
+
+    def take_counters(self):
+        with self._lock:
+            counters = dict(self.requests), self.bytes_sent
+            self.requests.clear()
+            self.bytes_sent = 0
+        return counters
+
+def browser_rss_mb(driver):
+    """RSS of chromedriver and the browser processes in MB, None without psutil"""
+    from utils.selenium_utils import DriverPool, PooledDriver, psutil
+    if psutil is None:
+        return None
+    return round(DriverPool._driver_rss(PooledDriver(driver)) / (1024 * 1024), 1)
+
+def extracted_length(html):
+    try:
+        import trafilatura
+    except ImportError:
+        return None
+    text = trafilatura.extract(html)
+    return len(text) if text else 0
+
+def run_profile(profile, server, pages, headless, user_data_dir, wait_time):
+    from utils.selenium_utils import selenium_driver_factory
+    from utils.readiness import PageReadiness
+
+    options = {'profile': profile, 'performance_log': True}
+    if profile == 'lean' and user_data_dir:
+        options['user_data_dir'] = user_data_dir
+    driver = selenium_driver_factory(headless=headless, **options)
+    try:
+        driver.set_page_load_timeout(60)
+        # Warm up the browser processes on a page outside the measured range
+        driver.get(f"{server.base_url}/page-{pages}.html")
+        server.take_counters()
+
+        load_times = []
+        rss_samples = []
+        text_lengths = []
+        for index in range(pages):
+            readiness = PageReadiness.from_names(['body', 'dom', 'network'], timeout=wait_time)
+            start = time.perf_counter()
+            readiness.prepare(driver)
+            driver.get(f"{server.base_url}/page-{index}.html")
+            readiness.wait(driver)
+            load_times.append(time.perf_counter() - start)
+            text_lengths.append(extracted_length(driver.page_source))
+            rss_samples.append(browser_rss_mb(driver))
+        requests, bytes_sent = server.take_counters()
+    finally:
+        driver.quit()
+
+    load_times.sort()
+    rss = [sample for sample in rss_samples if sample is not None]
+    return {
+        'pages': pages,
+        'mean_load_ms': round(sum(load_times) / len(load_times) * 1000, 1),
+        'p95_load_ms': round(load_times[min(len(load_times) - 1, int(len(load_times) * 0.95))] * 1000, 1),
+        'requests': requests,
+        'mb_downloaded': round(bytes_sent / (1024 * 1024), 1),
+        'rss_mb_mean': round(sum(rss) / len(rss), 1) if rss else None,
+        'rss_mb_max': max(rss) if rss else None,
+        'text_lengths': text_lengths,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare page load time and memory of the browser profiles")
+    parser.add_argument('--profiles', nargs='+', default=['full', 'lean'], choices=['full', 'lean'])
+    parser.add_argument('--pages', type=int, default=20, help="Pages rendered per profile")
+    parser.add_argument('--images', type=int, default=12, help="Images per page")
+    parser.add_argument('--asset-latency-ms', type=float, default=20, help="Latency of every asset response")
+    parser.add_argument('--wait-time', type=float, default=10, help="Deadline of the readiness conditions")
+    parser.add_argument('--headed', action='store_true', help="Show the browser windows")
+    parser.add_argument('--output', default=None, help="JSON report (default: benchmarks/results/<timestamp>.json)")
+    args = parser.parse_args()
+
+    server = AssetServer(images=args.images, asset_latency_ms=args.asset_latency_ms)
+    user_data_dir = tempfile.mkdtemp(prefix='bench_browser_profile_')
+    results = {}
+    try:
+        for profile in args.profiles:
+            try:
+                results[profile] = run_profile(profile, server, args.pages, not args.headed, user_data_dir,
+                                               args.wait_time)
+            except Exception as e:
+                results[profile] = {'skipped': f"{type(e).__name__}: {e}"}
+                print(f"{profile:5s} skipped: {results[profile]['skipped']}")
+                continue
+            result = results[profile]
+            print(f"{profile:5s} {result['mean_load_ms']:>8.1f} ms mean load, {result['p95_load_ms']:>8.1f} ms p95, "
+                  f"{result['mb_downloaded']:>7.1f} MB downloaded, RSS {result['rss_mb_mean']} MB mean / "
+                  f"{result['rss_mb_max']} MB max, requests {result['requests']}")
+    finally:
+        server.httpd.shutdown()
+        shutil.rmtree(user_data_dir, ignore_errors=True)
+
+    full, lean = results.get('full', {}), results.get('lean', {})
+    if 'mean_load_ms' in full and 'mean_load_ms' in lean:
+        print(f"Lean profile: {lean['mean_load_ms'] / full['mean_load_ms'] - 1:+.1%} load time", end='')
+        if full['rss_mb_mean'] and lean['rss_mb_mean']:
+            print(f", {lean['rss_mb_mean'] / full['rss_mb_mean'] - 1:+.1%} RSS", end='')
+        print(f", same extracted text on {sum(a == b for a, b in zip(full['text_lengths'], lean['text_lengths']))}"
+              f"/{args.pages} pages")
+
+    path = save_results({'browser_profile': results}, args.output)
+    print(f"\nSaved results to {path}")
+
+if __name__ == '__main__':
+    main()
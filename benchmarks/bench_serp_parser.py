@@ -0,0 +1,89 @@
+"""
+Benchmark of SERP parsing over the stored result pages in benchmarks/fixtures
+
+Times parse_serp on every serp_*.html fixture and, when parsel (installed with
+Scrapy) is available, the per-block CSS selector queries it replaced, checking that
+both return the same results on the pages using the known class names.
+
+Usage:
+    python -m benchmarks.bench_serp_parser --repeat 500
+"""
+import time
+import glob
+import os
+import argparse
+from urllib.parse import unquote
+
+from google_crawler.serp_parser import parse_serp
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+def load_fixtures(pattern='serp_*.html'):
+    """Read the stored result pages as {file name: bytes}"""
+    fixtures = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURE_DIR, pattern))):
+        with open(path, 'rb') as f:
+            fixtures[os.path.basename(path)] = f.read()
+    return fixtures
+
+def parse_with_selectors(body):
+    """The selector queries GoogleSpider.parse used before parse_serp, for comparison"""
+    from parsel import Selector
+
+    selector = Selector(text=body.decode('utf-8'))
+    results = []
+    for result in selector.css("div.ezO2md"):
+        link_raw = result.css("a::attr(href)").get()
+        title = result.css("a span.CVA68e::text").get()
+        description_parts = result.css("span.FrIlee *::text").getall()
+        description = ' '.join([part.strip() for part in description_parts]).strip() if description_parts else ""
+        if link_raw and title:
+            link = unquote(link_raw.split("&")[0].replace("/url?q=", ""))
+            results.append((link, title.strip(), description))
+    return results, selector.css("a.frGj1b::attr(href)").get()
+
+def time_parser(function, pages, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for body in pages:
+            function(body)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SERP parsing on the stored fixtures")
+    parser.add_argument('--repeat', type=int, default=500, help="Number of passes over the fixtures")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures()
+    if not fixtures:
+        raise SystemExit(f"No SERP fixtures found in {FIXTURE_DIR}")
+
+    for name, body in fixtures.items():
+        page = parse_serp(body)
+        print(f"{name:28s} {page.block_count:3d} blocks, {len(page.results):3d} results, "
+              f"next link: {'yes' if page.next_link else 'no'}")
+
+    pages = list(fixtures.values())
+    page_count = len(pages) * args.repeat
+    parse_time = time_parser(parse_serp, pages, args.repeat)
+    print(f"parse_serp : {parse_time:.4f}s ({page_count / parse_time:,.0f} pages/s)")
+
+    try:
+        import parsel  # noqa: F401
+    except ImportError:
+        print("parsel is not installed, skipping the selector baseline")
+        return
+
+    known_layout = {name: body for name, body in fixtures.items() if b'class="ezO2md"' in body}
+    for name, body in known_layout.items():
+        page = parse_serp(body)
+        expected_results, expected_next = parse_with_selectors(body)
+        if [(r.link, r.title, r.description) for r in page.results] != expected_results or page.next_link != expected_next:
+            raise SystemExit(f"parse_serp results differ from the selector baseline on {name}")
+
+    selector_time = time_parser(parse_with_selectors, pages, args.repeat)
+    print(f"selectors  : {selector_time:.4f}s ({page_count / selector_time:,.0f} pages/s)")
+    print(f"Speedup    : {selector_time / parse_time:,.1f}x")
+
+if __name__ == '__main__':
+    main()
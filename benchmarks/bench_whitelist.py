@@ -0,0 +1,65 @@
+"""
+Benchmark of whitelist matching: linear scan of the domain list vs WhitelistIndex
+
+Usage:
+    python -m benchmarks.bench_whitelist --domains 20000 --urls 5000
+"""
+import time
+import random
+import string
+import argparse
+
+from utils.url import is_in_whitelist, WhitelistIndex
+
+def random_label(rng, length=8):
+    return ''.join(rng.choice(string.ascii_lowercase) for _ in range(length))
+
+def make_dataset(domain_count, url_count, seed=42):
+    """Build a synthetic whitelist and a URL mix of exact, subdomain and unlisted hosts"""
+    rng = random.Random(seed)
+    tlds = ['com', 'vn', 'net', 'org', 'com.vn']
+    domains = [f"{random_label(rng)}.{rng.choice(tlds)}" for _ in range(domain_count)]
+
+    urls = []
+    for _ in range(url_count):
+        kind = rng.random()
+        if kind < 0.2:
+            host = f"www.{rng.choice(domains)}"
+        elif kind < 0.4:
+            host = f"{random_label(rng, 4)}.{rng.choice(domains)}"
+        else:
+            host = f"{random_label(rng)}.{rng.choice(tlds)}"
+        urls.append(f"https://{host}/{random_label(rng)}/{random_label(rng)}.html")
+    return domains, urls
+
+def time_calls(function, urls, whitelist):
+    start = time.perf_counter()
+    matches = [function(url, whitelist) for url in urls]
+    return time.perf_counter() - start, matches
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark whitelist matching")
+    parser.add_argument('--domains', type=int, default=20000, help="Number of whitelisted domains")
+    parser.add_argument('--urls', type=int, default=5000, help="Number of URLs to check")
+    args = parser.parse_args()
+
+    domains, urls = make_dataset(args.domains, args.urls)
+
+    start = time.perf_counter()
+    index = WhitelistIndex(domains)
+    build_time = time.perf_counter() - start
+
+    linear_time, linear_matches = time_calls(is_in_whitelist, urls, domains)
+    index_time, index_matches = time_calls(is_in_whitelist, urls, index)
+
+    if linear_matches != index_matches:
+        raise SystemExit("WhitelistIndex results differ from the linear scan")
+
+    print(f"Whitelist: {len(domains)} domains, {len(urls)} URLs, {sum(index_matches)} matches")
+    print(f"Linear scan : {linear_time:.4f}s ({len(urls) / linear_time:,.0f} URLs/s)")
+    print(f"Index build : {build_time:.4f}s")
+    print(f"Index lookup: {index_time:.4f}s ({len(urls) / index_time:,.0f} URLs/s)")
+    print(f"Speedup     : {linear_time / index_time:,.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""
+Small benchmark harness: throughput, memory and JSON reports
+
+Each benchmark is a function taking no argument that performs one operation. It is
+timed over rounds of repeated calls until `min_time` seconds have passed, and the
+median round gives the operations per second. One extra call runs under tracemalloc
+for the peak memory allocated by an operation.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import statistics
+import tracemalloc
+from datetime import datetime
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+class SkipBenchmark(Exception):
+    """Raised by a benchmark setup when an optional dependency is missing"""
+
+def measure(function, min_time=1.0, rounds=5):
+    """
+    Measure the throughput and memory of an operation
+
+    Args:
+        function (callable): Performs one operation
+        min_time (float): Minimum seconds spent timing the operation
+        rounds (int): Number of timed rounds
+
+    Returns:
+        dict: ops_per_sec (median round), best_ops_per_sec, mean_ms, peak_memory_kb, calls
+    """
+    # Warm up and size the rounds so each lasts about min_time / rounds
+    start = time.perf_counter()
+    function()
+    single = max(time.perf_counter() - start, 1e-7)
+    calls_per_round = max(1, int(min_time / rounds / single))
+
+    round_rates = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(calls_per_round):
+            function()
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        round_rates.append(calls_per_round / elapsed)
+
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    ops_per_sec = statistics.median(round_rates)
+    return {
+        'ops_per_sec': round(ops_per_sec, 2),
+        'best_ops_per_sec': round(max(round_rates), 2),
+        'mean_ms': round(1000 / ops_per_sec, 4),
+        'peak_memory_kb': round(peak / 1024, 1),
+        'calls': calls_per_round * rounds,
+    }
+
+def run_benchmarks(benchmarks, min_time=1.0, rounds=5, only=None):
+    """
+    Run benchmarks and print one line per benchmark
+
+    Args:
+        benchmarks (dict): Benchmark name -> setup function returning the operation to time;
+            the setup may raise SkipBenchmark
+        min_time (float): Minimum seconds spent timing each benchmark
+        rounds (int): Number of timed rounds per benchmark
+        only (list): Optional substrings; only benchmarks whose name contains one are run
+
+    Returns:
+        dict: Benchmark name -> measurements, or {'skipped': reason}
+    """
+    results = {}
+    for name, setup in benchmarks.items():
+        if only and not any(part in name for part in only):
+            continue
+        try:
+            operation = setup()
+        except SkipBenchmark as e:
+            results[name] = {'skipped': str(e)}
+            print(f"{name:40s} skipped: {e}")
+            continue
+        result = measure(operation, min_time=min_time, rounds=rounds)
+        results[name] = result
+        print(f"{name:40s} {result['ops_per_sec']:>12,.1f} ops/s {result['mean_ms']:>10.3f} ms/op "
+              f"{result['peak_memory_kb']:>10,.1f} KB peak")
+    return results
+
+def environment():
+    """Describe the machine and interpreter the benchmarks ran on"""
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+    }
+
+def save_results(results, path=None):
+    """
+    Save benchmark results with the environment as JSON
+
+    Args:
+        results (dict): Returned by run_benchmarks
+        path (str): Output file (default: benchmarks/results/<timestamp>.json)
+
+    Returns:
+        str: The file written
+    """
+    if path is None:
+        path = os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'argv': sys.argv[1:],
+        'environment': environment(),
+        'results': results,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    return path
+
+def compare_results(results, baseline_path):
+    """
+    Print the change of each benchmark against a saved report
+
+    Args:
+        results (dict): Returned by run_benchmarks
+        baseline_path (str): JSON report saved by a previous run
+    """
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)['results']
+
+    print(f"\nCompared with {baseline_path}:")
+    for name, result in results.items():
+        before = baseline.get(name)
+        if 'skipped' in result or not before or 'skipped' in before:
+            continue
+        speed = result['ops_per_sec'] / before['ops_per_sec'] - 1
+        memory = result['peak_memory_kb'] - before['peak_memory_kb']
+        print(f"{name:40s} {speed:>+8.1%} ops/s {memory:>+10,.1f} KB peak")
@@ -0,0 +1,380 @@
+"""
+End-to-end load test against a local fake Google and a synthetic farm of article sites
+
+A threaded HTTP server answers /search with pages in Google's basic HTML markup
+(div.ezO2md result blocks, a.frGj1b Next link) and serves the articles they link to
+under /site-<n>/. Latency, server errors, 429s, CAPTCHA redirects and JS-only
+articles are injected at configurable rates. GoogleCrawler.run is pointed at the
+server through GOOGLE_BASE_URL and the run reports the end-to-end throughput and
+the tail latency of the keywords, from their first SERP request to their last
+extracted article.
+
+Usage:
+    python -m benchmarks.loadtest --keywords 1000 --latency-ms 50 --rate-limit-rate 0.01
+    python -m benchmarks.loadtest --serve-only --port 8765   # then run main.py with
+        GOOGLE_CRAWLER_BASE_URL=http://127.0.0.1:8765
+"""
+import time
+import html
+import random
+import hashlib
+import logging
+import argparse
+import threading
+from collections import Counter, defaultdict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, quote
+
+from benchmarks.harness import save_results
+from utils.sinks import ResultSink
+from utils.metrics import metrics
+
+WORDS = ("giá vàng hôm nay tăng mạnh thị trường chứng khoán ngân hàng lãi suất bất động sản kinh tế "
+         "xuất khẩu doanh nghiệp đầu tư nhà nước chính sách người dân tiêu dùng lạm phát tỷ giá").split()
+
+def stable_random(*parts):
+    """Random generator seeded from strings, identical across runs and processes"""
+    seed = hashlib.blake2b('|'.join(str(part) for part in parts).encode('utf-8'), digest_size=8).digest()
+    return random.Random(int.from_bytes(seed, 'little'))
+
+def sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+def latency_summary(values):
+    """p50/p95/p99/max of latencies in seconds, reported in milliseconds"""
+    return {name: (round(percentile(values, fraction) * 1000, 1) if values else None)
+            for name, fraction in (('p50', 0.50), ('p95', 0.95), ('p99', 0.99), ('max', 1.0))}
+
+
+class FakeWeb:
+    """
+    Local HTTP server imitating Google result pages and the article sites they link to
+
+    Each keyword has `results_available` results spread over pages of `page_size`;
+    pages past the last result are empty. Results and articles are generated from
+    the keyword and the path, so the same URL always returns the same content.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency_ms=50, jitter_ms=30, error_rate=0.0,
+                 rate_limit_rate=0.0, captcha_rate=0.0, js_only_rate=0.0, results_available=30,
+                 page_size=10, sites=50, paragraphs=8):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.captcha_rate = captcha_rate
+        self.js_only_rate = js_only_rate
+        self.results_available = results_available
+        self.page_size = page_size
+        self.sites = sites
+        self.paragraphs = paragraphs
+
+        self._lock = threading.Lock()
+        self._random = random.Random(1234)
+        self.responses = Counter()  # (kind, status) -> count
+        self.service_times = defaultdict(list)  # kind -> seconds
+        self.keyword_started = {}  # keyword -> time of its first SERP request
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                server.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.base_url = f"http://{host}:{self.httpd.server_address[1]}"
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='fake-web', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _roll(self, rate):
+        with self._lock:
+            return self._random.random() < rate
+
+    def _sleep(self):
+        with self._lock:
+            delay = max(0.0, self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+        time.sleep(delay)
+
+    def handle(self, request):
+        start = time.time()
+        url = urlparse(request.path)
+        query = parse_qs(url.query)
+        self._sleep()
+
+        if url.path == '/search':
+            kind = 'serp'
+            keyword = query.get('q', [''])[0]
+            with self._lock:
+                self.keyword_started.setdefault(keyword, start)
+            if self._roll(self.captcha_rate):
+                kind = 'captcha'
+                status, body, headers = 302, b'', {'Location': f"/sorry/index?continue={quote(request.path)}"}
+            elif self._roll(self.rate_limit_rate):
+                status, body, headers = 429, b'Too Many Requests', {}
+            elif self._roll(self.error_rate):
+                status, body, headers = 500, b'Server Error', {}
+            else:
+                status, headers = 200, {}
+                body = self.serp_page(keyword, int(query.get('start', ['0'])[0] or 0))
+        elif url.path.startswith('/sorry/'):
+            kind = 'captcha'
+            status, headers = 429, {}
+            body = (b'<html><body><form action="/sorry/index" method="post">'
+                    b'<div class="g-recaptcha" data-sitekey="fake"></div></form></body></html>')
+        elif url.path.startswith('/site-'):
+            kind = 'article'
+            if self._roll(self.error_rate):
+                status, body, headers = 500, b'Server Error', {}
+            else:
+                status, headers = 200, {}
+                body = self.article_page(url.path)
+                if stable_random('js', url.path).random() < self.js_only_rate:
+                    kind = 'article_js_only'
+                    body = self.js_only_page(url.path, body)
+        else:
+            kind = 'other'
+            status, body, headers = 404, b'Not Found', {}
+
+        request.send_response(status)
+        for name, value in headers.items():
+            request.send_header(name, value)
+        request.send_header('Content-Type', 'text/html; charset=utf-8')
+        request.send_header('Content-Length', str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+        with self._lock:
+            self.responses[(kind, status)] += 1
+            self.service_times[kind].append(time.time() - start)
+
+    def serp_page(self, keyword, start):
+        """Result page of a keyword starting at result `start`"""
+        blocks = []
+        slug = hashlib.blake2b(keyword.encode('utf-8'), digest_size=5).hexdigest()
+        for index in range(start, min(start + self.page_size, self.results_available)):
+            rng = stable_random(keyword, index)
+            link = f"{self.base_url}/site-{rng.randrange(self.sites)}/{slug}-{index}.html"
+            title = html.escape(sentence(rng, 8))
+            description = html.escape(sentence(rng, 24))
+            blocks.append(
+                f'<div class="ezO2md"><div><div><a class="fuLhoc ZWRArf" href="/url?q={quote(link, safe=":/")}'
+                f'&amp;sa=U&amp;ved=fake"><span class="CVA68e qXLe6d fuLhoc ZWRArf">{title}</span></a></div>'
+                f'<div class="RgAZAc"><span class="qXLe6d FrIlee"><span class="fYyStc">{description}</span>'
+                f'</span></div></div></div>'
+            )
+        next_link = ''
+        if start + self.page_size < self.results_available:
+            next_link = (f'<footer><a class="frGj1b" href="/search?q={quote(keyword)}&amp;hl=vi&amp;gl=vn'
+                         f'&amp;start={start + self.page_size}&amp;sa=N">Trang sau&nbsp;&gt;</a></footer>')
+        page = (f'<!DOCTYPE html><html lang="vi"><head><meta charset="UTF-8"><title>{html.escape(keyword)}</title>'
+                f'</head><body><div id="main">{"".join(blocks)}</div>{next_link}</body></html>')
+        return page.encode('utf-8')
+
+    def article_page(self, path):
+        """News article with metadata, paragraphs and images"""
+        rng = stable_random('article', path)
+        title = html.escape(sentence(rng, 10))
+        site = path.split('/')[1]
+        paragraphs = []
+        for index in range(self.paragraphs):
+            if index and index % 3 == 0:
+                paragraphs.append(f'<figure><img src="/{site}/images/{index}.jpg" alt="{title}"></figure>')
+            paragraphs.append('<p>' + html.escape('. '.join(sentence(rng, rng.randint(12, 24)) for _ in range(4))) + '.</p>')
+        page = (f'<!DOCTYPE html><html lang="vi"><head><meta charset="utf-8"><title>{title}</title>'
+                f'<meta property="og:image" content="/{site}/images/cover.jpg">'
+                f'<meta name="author" content="Phóng viên {rng.randrange(100)}">'
+                f'<meta property="article:published_time" content="2025-03-{rng.randint(1, 28):02d}T08:00:00+07:00">'
+                f'</head><body><header><nav><a href="/">{site}</a></nav></header><main><article>'
+                f'<h1>{title}</h1>{"".join(paragraphs)}</article></main><footer>© {site}</footer></body></html>')
+        return page.encode('utf-8')
+
+    def js_only_page(self, path, full_page):
+        """Empty shell whose article is inserted by a script, as on client-rendered sites"""
+        content = full_page.decode('utf-8').split('<main>', 1)[1].split('</main>', 1)[0]
+        script = content.replace('\\', '\\\\').replace('`', '\\`').replace('</', '<\\/')
+        page = (f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>Loading</title></head><body>'
+                f'<div id="app"></div><script>document.getElementById("app").innerHTML = `{script}`;</script>'
+                f'</body></html>')
+        return page.encode('utf-8')
+
+    def report(self):
+        """Server-side counters and service times"""
+        with self._lock:
+            return {
+                'responses': {f"{kind}/{status}": count for (kind, status), count in sorted(self.responses.items())},
+                'service_time_ms': {kind: latency_summary(times) for kind, times in self.service_times.items()},
+            }
+
+
+class TimingSink(ResultSink):
+    """Sink recording when each result of each keyword arrives, without keeping the results"""
+
+    def __init__(self, logger=None):
+        super().__init__('', logger)
+        self.arrivals = defaultdict(list)  # keyword -> arrival times
+
+    def _write(self, result):
+        self.arrivals[result.get('keyword')].append(time.time())
+
+    def _close(self):
+        pass
+
+
+def make_web(args):
+    return FakeWeb(port=args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                   error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+                   captcha_rate=args.captcha_rate, js_only_rate=args.js_only_rate,
+                   results_available=args.results_available, sites=args.sites)
+
+def crawler_settings(base_url, concurrency):
+    """Settings pointing the crawler at the fake server and lifting the politeness limits"""
+    return {
+        'GOOGLE_BASE_URL': base_url,
+        'SERP_CACHE_ENABLED': False,
+        'CONCURRENT_REQUESTS': concurrency,
+        'IDENTITY_POOL_ENABLED': True,  # Many identities on one IP only fool the fake Google
+        'IDENTITY_POOL_SIZE': concurrency,
+        'IDENTITY_PROXIES': [],
+        'IDENTITY_QUARANTINE': 5,
+        'IDENTITY_MAX_QUARANTINE': 30,
+        'ADAPTIVE_THROTTLE_START_RATE': 50.0,
+        # Injected 429s must not drop to the production floor of 0.05 requests/s and
+        # take minutes to recover, or the run measures the back-off instead of the crawler
+        'ADAPTIVE_THROTTLE_MIN_RATE': 5.0,
+        'ADAPTIVE_THROTTLE_MAX_RATE': 1000.0,
+        'ADAPTIVE_THROTTLE_INCREASE': 5.0,
+        'ADAPTIVE_THROTTLE_MAX_CONCURRENCY': concurrency,
+        'ADAPTIVE_THROTTLE_COOLDOWN': 5,
+        'CAPTCHA_RETRY_DELAY': 1,
+        'CAPTCHA_RETRY_MAX_DELAY': 5,
+        'LOG_LEVEL': 'WARNING',
+    }
+
+def run_load_test(args):
+    """Start the fake web, crawl it and return the report"""
+    from google_crawler.google_crawler import GoogleCrawler
+    from content_scraper.content_scraper import ContentScraper
+
+    web = make_web(args).start()
+    logger = logging.getLogger('loadtest')
+    # Injected failures are expected: only report errors
+    logger.setLevel(logging.ERROR)
+    logging.getLogger('urllib3').setLevel(logging.ERROR)
+    keywords = [f"từ khóa {index} {sentence(stable_random('keyword', index), 2).lower()}"
+                for index in range(args.keywords)]
+    sink = TimingSink(logger=logger)
+    scraper = ContentScraper(logger=logger, extraction_processes=args.extraction_processes,
+                             fetch_workers=args.extractor_workers)
+
+    print(f"Crawling {len(keywords)} keywords from {web.base_url}")
+    metrics.reset()
+    start = time.time()
+    try:
+        search_results, _ = GoogleCrawler(logger=logger).run(
+            keywords=keywords,
+            results_per_keyword=args.results_per_keyword,
+            max_pages=args.max_pages,
+            content_extractor=scraper,
+            extractor_method='scrape',
+            extractor_workers=args.extractor_workers,
+            sink=sink,
+            parallel_pages=args.parallel_pages,
+            settings_overrides=crawler_settings(web.base_url, args.concurrency)
+        )
+    finally:
+        elapsed = time.time() - start
+        sink.close()
+        scraper.close()
+        web.stop()
+
+    keyword_latencies = [max(times) - web.keyword_started[keyword]
+                         for keyword, times in sink.arrivals.items() if keyword in web.keyword_started]
+    return {
+        'config': vars(args),
+        'elapsed_s': round(elapsed, 2),
+        'keywords': len(keywords),
+        'keywords_with_results': len(sink.arrivals),
+        'search_results': len(search_results),
+        'content_results': sink.count,
+        'keywords_per_s': round(len(keywords) / elapsed, 2),
+        'results_per_s': round(sink.count / elapsed, 2),
+        'keyword_latency_ms': latency_summary(keyword_latencies),
+        'server': web.report(),
+        'stages': metrics.summary(),
+    }
+
+def print_report(report):
+    print(f"\nElapsed            : {report['elapsed_s']}s")
+    print(f"Keywords           : {report['keywords']} ({report['keywords_with_results']} with results), "
+          f"{report['keywords_per_s']}/s")
+    print(f"Search results     : {report['search_results']}")
+    print(f"Extracted articles : {report['content_results']}, {report['results_per_s']}/s")
+    print(f"Keyword latency    : {report['keyword_latency_ms']} ms (first SERP request to last article)")
+    for name, count in report['server']['responses'].items():
+        print(f"  {name:28s} {count}")
+    for kind, summary in report['server']['service_time_ms'].items():
+        print(f"  {kind + ' service time':28s} {summary} ms")
+    print("Crawler stages (total s, p95 ms):")
+    for name, stage in sorted(report['stages']['histograms'].items(), key=lambda item: -item[1]['total_s']):
+        print(f"  {name:44s} {stage['total_s']:>9.2f} {stage['p95']:>10}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the crawler against a local fake Google")
+    parser.add_argument('--keywords', type=int, default=200, help="Number of keywords to crawl")
+    parser.add_argument('--results-per-keyword', type=int, default=20, help="Target results per keyword")
+    parser.add_argument('--results-available', type=int, default=30, help="Results the fake Google has per keyword")
+    parser.add_argument('--max-pages', type=int, default=4, help="Maximum pages per keyword")
+    parser.add_argument('--parallel-pages', action='store_true', help="Request the result pages in parallel")
+    parser.add_argument('--concurrency', type=int, default=8, help="Concurrent SERP requests")
+    parser.add_argument('--extractor-workers', type=int, default=16, help="Article extraction threads")
+    parser.add_argument('--extraction-processes', type=int, default=0, help="Trafilatura extraction processes")
+    parser.add_argument('--sites', type=int, default=50, help="Number of synthetic article sites")
+    parser.add_argument('--latency-ms', type=float, default=50, help="Mean response latency")
+    parser.add_argument('--jitter-ms', type=float, default=30, help="Uniform jitter around the latency")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of 500 responses")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="Share of SERP requests answered with 429")
+    parser.add_argument('--captcha-rate', type=float, default=0.0, help="Share of SERP requests redirected to a CAPTCHA")
+    parser.add_argument('--js-only-rate', type=float, default=0.0, help="Share of articles only rendered by JavaScript")
+    parser.add_argument('--port', type=int, default=0, help="Port of the fake server (default: any free port)")
+    parser.add_argument('--serve-only', action='store_true', help="Only run the fake server until interrupted")
+    parser.add_argument('--output', default=None, help="JSON report (default: benchmarks/results/<timestamp>.json)")
+    args = parser.parse_args()
+
+    if args.serve_only:
+        web = make_web(args).start()
+        print(f"Fake Google serving at {web.base_url} (set GOOGLE_CRAWLER_BASE_URL={web.base_url})")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            web.stop()
+        return
+
+    report = run_load_test(args)
+    print_report(report)
+    path = save_results({'loadtest': report}, args.output)
+    print(f"\nSaved report to {path}")
+
+if __name__ == '__main__':
+    main()
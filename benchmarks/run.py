@@ -0,0 +1,238 @@
+"""
+Offline benchmark suite of the pipeline stages
+
+Covers the SERP parse (parse_serp and GoogleSpider.parse), whitelist matching,
+ContentScraper._process_extracted_content and _extract_images_from_content,
+trafilatura.bare_extraction with the project's setting.cfg, and writing results to
+every output sink. Inputs are the HTML fixtures in benchmarks/fixtures; nothing is
+downloaded. Benchmarks whose optional dependency is missing are reported as skipped.
+
+Usage:
+    python -m benchmarks.run
+    python -m benchmarks.run --only serp whitelist --min-time 2
+    python -m benchmarks.run --compare benchmarks/results/20250318_083000.json
+"""
+import os
+import re
+import html
+import glob
+import shutil
+import logging
+import argparse
+import tempfile
+
+from benchmarks.harness import SkipBenchmark, run_benchmarks, save_results, compare_results
+from benchmarks.bench_whitelist import make_dataset
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+# Quiet logger for the components that log every operation
+QUIET_LOGGER = logging.getLogger('benchmarks')
+QUIET_LOGGER.setLevel(logging.WARNING)
+
+def read_fixtures(pattern):
+    """Read the fixtures matching a pattern as {file name: text}"""
+    fixtures = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURE_DIR, pattern))):
+        with open(path, encoding='utf-8') as f:
+            fixtures[os.path.basename(path)] = f.read()
+    if not fixtures:
+        raise SkipBenchmark(f"no {pattern} fixtures in {FIXTURE_DIR}")
+    return fixtures
+
+def require(module):
+    """Import an optional dependency or skip the benchmark"""
+    try:
+        return __import__(module, fromlist=['_'])
+    except ImportError as e:
+        raise SkipBenchmark(f"{module} is not installed ({e})")
+
+def article_url(page):
+    match = re.search(r'<link rel="canonical" href="([^"]+)"', page)
+    return match.group(1) if match else 'https://example.vn/article.html'
+
+# SERP parsing
+
+def bench_parse_serp():
+    require('lxml')
+    from google_crawler.serp_parser import parse_serp
+
+    pages = [page.encode('utf-8') for page in read_fixtures('serp_*.html').values()]
+
+    def operation():
+        for page in pages:
+            parse_serp(page)
+    return operation
+
+def bench_spider_parse():
+    require('scrapy')
+    from scrapy.http import HtmlResponse, Request
+    from google_crawler.spiders.google_spider import GoogleSpider
+
+    spider = GoogleSpider(keywords=['giá vàng'], results_per_keyword=1000, max_pages=100)
+    spider.logger.logger.setLevel(logging.ERROR)  # Quiet the per-page progress and warnings
+    responses = []
+    for page in read_fixtures('serp_*.html').values():
+        request = Request('https://www.google.com/search?q=gi%C3%A1+v%C3%A0ng&hl=vi&gl=vn',
+                          meta={'keyword': 'giá vàng', 'page': 0})
+        responses.append(HtmlResponse(request.url, body=page.encode('utf-8'), encoding='utf-8', request=request))
+
+    def operation():
+        for response in responses:
+            # Start from a fresh keyword so every result is emitted again
+            spider.visited_urls.clear()
+            spider.results_count['giá vàng'] = 0
+            spider.keyword_state['giá vàng'].update(page=0, next_url=None, done=False)
+            for _ in spider.parse(response):
+                pass
+    return operation
+
+# Whitelist matching
+
+def whitelist_dataset():
+    return make_dataset(domain_count=2000, url_count=200)
+
+def bench_whitelist_linear():
+    from utils.url import is_in_whitelist
+
+    domains, urls = whitelist_dataset()
+
+    def operation():
+        for url in urls:
+            is_in_whitelist(url, domains)
+    return operation
+
+def bench_whitelist_index():
+    from utils.url import is_in_whitelist, WhitelistIndex
+
+    domains, urls = whitelist_dataset()
+    index = WhitelistIndex(domains)
+
+    def operation():
+        for url in urls:
+            is_in_whitelist(url, index)
+    return operation
+
+# Content processing
+
+def content_scraper():
+    require('trafilatura')
+    from content_scraper.content_scraper import ContentScraper
+    return ContentScraper(logger=QUIET_LOGGER)
+
+def extracted_articles(scraper):
+    """bare_extraction output of every article fixture, as (url, extracted) pairs"""
+    articles = []
+    for page in read_fixtures('article_*.html').values():
+        extracted = scraper._bare_extraction(page)
+        if extracted:
+            articles.append((article_url(page), extracted))
+    return articles
+
+def bench_process_extracted_content():
+    scraper = content_scraper()
+    articles = extracted_articles(scraper)
+
+    def operation():
+        for url, extracted in articles:
+            scraper._process_extracted_content(extracted, url, 'giá vàng', 'Search title', 'Search description')
+    return operation
+
+def bench_extract_images_from_content():
+    scraper = content_scraper()
+    contents = [(url, extracted.text) for url, extracted in extracted_articles(scraper)]
+
+    def operation():
+        for url, text in contents:
+            scraper._extract_images_from_content(text, url)
+    return operation
+
+def bench_bare_extraction(fixture):
+    def setup():
+        scraper = content_scraper()
+        page = read_fixtures(fixture)[fixture]
+
+        def operation():
+            scraper._bare_extraction(page)
+        return operation
+    return setup
+
+# Output writing
+
+def sample_results(count=100):
+    """Content results shaped like ContentScraper's output, built from the article fixtures"""
+    results = []
+    for page in read_fixtures('article_*.html').values():
+        title = html.unescape(re.search(r'<title>(.*?)</title>', page).group(1))
+        paragraphs = [html.unescape(text) for text in re.findall(r'<p class="Normal">(.*?)</p>', page)]
+        images = re.findall(r'<img src="([^"]+)"', page)
+        results.append({
+            'title': title,
+            'url': article_url(page),
+            'description': paragraphs[0][:200] if paragraphs else '',
+            'content': '\n'.join(paragraphs),
+            'date': '2025-03-18',
+            'main_image': images[0] if images else '',
+            'images': images,
+            'author': 'Nguyễn Văn An',
+            'site': article_url(page).split('/')[2],
+            'keyword': 'giá vàng',
+        })
+    return [dict(results[i % len(results)]) for i in range(count)]
+
+def bench_sink(extension, module=None, **sink_options):
+    def setup():
+        if module:
+            require(module)
+        from utils.sinks import create_sink
+
+        results = sample_results()
+        directory = tempfile.mkdtemp(prefix='bench_sink_')
+        path = os.path.join(directory, f"results{extension}")
+
+        def operation():
+            sink = create_sink(path, logger=QUIET_LOGGER, **sink_options)
+            for result in results:
+                sink.write(result)
+            sink.close()
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        return operation
+    return setup
+
+BENCHMARKS = {
+    'serp/parse_serp': bench_parse_serp,
+    'serp/spider_parse': bench_spider_parse,
+    'whitelist/linear_scan': bench_whitelist_linear,
+    'whitelist/index': bench_whitelist_index,
+    'content/process_extracted_content': bench_process_extracted_content,
+    'content/extract_images_from_content': bench_extract_images_from_content,
+    'content/bare_extraction/news': bench_bare_extraction('article_news.html'),
+    'content/bare_extraction/long': bench_bare_extraction('article_long.html'),
+    'content/bare_extraction/boilerplate': bench_bare_extraction('article_boilerplate.html'),
+    'output/jsonl_100': bench_sink('.jsonl'),
+    'output/jsonl_gz_100': bench_sink('.jsonl.gz'),
+    'output/xlsx_100': bench_sink('.xlsx', 'openpyxl'),
+    'output/parquet_100': bench_sink('.parquet', 'pyarrow'),
+    'output/parquet_by_keyword_100': bench_sink('.parquet', 'pyarrow', partition_by='keyword'),
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline pipeline benchmarks")
+    parser.add_argument('--only', nargs='*', help="Only run benchmarks whose name contains one of these")
+    parser.add_argument('--min-time', type=float, default=1.0, help="Minimum seconds spent timing each benchmark")
+    parser.add_argument('--rounds', type=int, default=5, help="Timed rounds per benchmark")
+    parser.add_argument('--output', default=None, help="JSON report (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument('--compare', default=None, help="JSON report of a previous run to compare with")
+    args = parser.parse_args()
+
+    results = run_benchmarks(BENCHMARKS, min_time=args.min_time, rounds=args.rounds, only=args.only)
+    path = save_results(results, args.output)
+    print(f"\nSaved results to {path}")
+    if args.compare:
+        compare_results(results, args.compare)
+
+if __name__ == '__main__':
+    main()
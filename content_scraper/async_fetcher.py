@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import random
+from collections import defaultdict
+from urllib.parse import urlparse
+
+import aiohttp
+from trafilatura.utils import decode_file
+
+class AsyncFetcher:
+    """
+    Concurrent HTTP fetcher for article pages built on aiohttp.
+
+    One keep-alive connection pool is shared by every request of a batch. Semaphores
+    enforce a global cap and a per-host cap on the requests in flight, so a batch
+    spread over many hosts keeps the network busy without hammering a single site.
+    DOWNLOAD_TIMEOUT only starts once a request holds its slots, so URLs queued
+    behind a slow host are not timed out before they are sent. Download limits are
+    read from the same Trafilatura config used by trafilatura.fetch_url.
+    """
+
+    def __init__(self, config, max_concurrency=32, per_host_concurrency=4, logger=None):
+        """
+        Initialize the fetcher
+
+        Args:
+            config: Trafilatura ConfigParser (content_scraper/setting.cfg)
+            max_concurrency (int): Maximum number of simultaneous connections
+            per_host_concurrency (int): Maximum number of simultaneous connections per host
+            logger: Logger instance
+        """
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+        self.max_concurrency = int(max_concurrency)
+        self.per_host_concurrency = int(per_host_concurrency)
+
+        # Download limits shared with trafilatura.fetch_url
+        self.timeout = config.getint('DEFAULT', 'DOWNLOAD_TIMEOUT')
+        self.max_file_size = config.getint('DEFAULT', 'MAX_FILE_SIZE')
+        self.min_file_size = config.getint('DEFAULT', 'MIN_FILE_SIZE')
+        self.max_redirects = config.getint('DEFAULT', 'MAX_REDIRECTS')
+        self.cookie = config.get('DEFAULT', 'COOKIE', fallback='').strip()
+        self.user_agents = self._parse_user_agents(config.get('DEFAULT', 'USER_AGENTS', fallback=''))
+
+    @staticmethod
+    def _parse_user_agents(raw_value):
+        """Parse the one-per-line USER_AGENTS config value"""
+        user_agents = []
+        for line in raw_value.strip().splitlines():
+            user_agent = line.strip().strip("'\"")
+            if user_agent:
+                user_agents.append(user_agent)
+        return user_agents
+
+    def _build_headers(self):
+        """Build request headers with a random user agent from the config"""
+        headers = {'Accept-Encoding': 'gzip, deflate'}
+        if self.user_agents:
+            headers['User-Agent'] = random.choice(self.user_agents)
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+        return headers
+
+    async def _read_body(self, response):
+        """Read the response body, giving up as soon as it exceeds MAX_FILE_SIZE"""
+        content_length = response.content_length
+        if content_length is not None and content_length > self.max_file_size:
+            return None
+
+        chunks = []
+        size = 0
+        async for chunk in response.content.iter_chunked(64 * 1024):
+            size += len(chunk)
+            if size > self.max_file_size:
+                return None
+            chunks.append(chunk)
+        return b''.join(chunks)
+
+    async def fetch(self, session, url):
+        """
+        Download a single URL
+
+        Args:
+            session (aiohttp.ClientSession): Session holding the connection pool
+            url (str): The URL to download
+
+        Returns:
+            str: The decoded page, or None if the download failed
+        """
+        try:
+            async with session.get(
+                url,
+                headers=self._build_headers(),
+                allow_redirects=self.max_redirects > 0,
+                max_redirects=max(self.max_redirects, 1),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            ) as response:
+                if response.status != 200:
+                    self.logger.warning(f"Async fetch of {url} returned status {response.status}")
+                    return None
+
+                body = await self._read_body(response)
+                if body is None:
+                    self.logger.warning(f"Async fetch of {url} exceeded MAX_FILE_SIZE")
+                    return None
+                if len(body) < self.min_file_size:
+                    self.logger.warning(f"Async fetch of {url} returned a body smaller than MIN_FILE_SIZE")
+                    return None
+
+                return decode_file(body)
+        except asyncio.TimeoutError:
+            self.logger.warning(f"Async fetch of {url} timed out after {self.timeout}s")
+        except aiohttp.ClientError as e:
+            self.logger.warning(f"Async fetch of {url} failed: {str(e)}")
+        except Exception as e:
+            self.logger.error(f"Unexpected error fetching {url}: {str(e)}")
+        return None
+
+    async def _fetch_in_slot(self, session, url, slots, host_slots):
+        """Download a URL once a global slot and a slot of its host are free"""
+        async with slots, host_slots[urlparse(url).netloc.lower()]:
+            return await self.fetch(session, url)
+
+    async def fetch_all(self, urls):
+        """
+        Download many URLs concurrently over one connection pool
+
+        Args:
+            urls (list): URLs to download
+
+        Returns:
+            dict: Mapping of URL to decoded page (None for failed downloads)
+        """
+        connector = aiohttp.TCPConnector(
+            limit=self.max_concurrency,
+            limit_per_host=self.per_host_concurrency,
+            ttl_dns_cache=300,
+        )
+        slots = asyncio.Semaphore(self.max_concurrency)
+        host_slots = defaultdict(lambda: asyncio.Semaphore(self.per_host_concurrency))
+        unique_urls = list(dict.fromkeys(urls))
+
+        async with aiohttp.ClientSession(connector=connector) as session:
+            pages = await asyncio.gather(*(self._fetch_in_slot(session, url, slots, host_slots)
+                                           for url in unique_urls))
+
+        hosts = len({urlparse(url).netloc for url in unique_urls})
+        downloaded = sum(1 for page in pages if page is not None)
+        self.logger.info(f"Async fetch downloaded {downloaded}/{len(unique_urls)} URLs across {hosts} hosts")
+        return dict(zip(unique_urls, pages))
+
+    def fetch_many(self, urls):
+        """Synchronous wrapper around fetch_all that runs its own event loop"""
+        return asyncio.run(self.fetch_all(urls))
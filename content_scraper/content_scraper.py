@@ -2,33 +2,144 @@ import os
 import re
 import logging
 import random
-import time
+import threading
+import multiprocessing
 import trafilatura
 
 from copy import deepcopy
+from contextlib import ExitStack
+from types import SimpleNamespace
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from trafilatura.settings import use_config
 
 from utils.user_agents import get_user_agent_list
 from utils.logger import silence_trafilatura_log
 from utils.url import make_absolute_url, get_base_domain
+from utils.metrics import metrics
+from utils.fetch_strategy import STATIC, SELENIUM, SKIP
+
+# Metadata fields read from trafilatura's Document by _process_extracted_content
+EXTRACTED_FIELDS = ('text', 'title', 'description', 'date', 'image', 'author', 'hostname', 'sitename')
+
+# Outcome of a scrape, stored under STATUS_KEY in the result and popped before it is written
+STATUS_KEY = 'extraction_status'
+EXTRACTED = 'extracted'  # Content was extracted from the page
+FAILED = 'failed'  # Fallback result built from the search result, with the error as content
+SKIPPED = 'skipped'  # Domain skipped by the fetch statistics, fallback result
+DUPLICATE = 'duplicate'  # Near-duplicate dropped by the detector, only url, keyword and duplicate_of are set
+
+def size_trafilatura_pool(config, maxsize):
+    """
+    Replace trafilatura's shared urllib3 pools with pools keeping `maxsize` connections per host
+
+    trafilatura.fetch_url keeps a single connection per host by default: threads fetching
+    the same site at once open extra connections that are thrown away ("Connection pool
+    is full" warnings) instead of being kept alive.
+
+    Args:
+        config: Trafilatura config, for the download timeout
+        maxsize (int): Connections kept per host, the number of threads fetching at the same time
+    """
+    import certifi
+    from trafilatura import downloads
+
+    timeout = config.getint('DEFAULT', 'DOWNLOAD_TIMEOUT')
+    downloads.HTTP_POOL = downloads.create_pool(timeout=timeout, ca_certs=certifi.where(),
+                                                cert_reqs='CERT_REQUIRED', maxsize=maxsize)
+    downloads.NO_CERT_POOL = downloads.create_pool(timeout=timeout, ca_certs=None,
+                                                   cert_reqs='CERT_NONE', maxsize=maxsize)
+
+class BrowserUnavailable(Exception):
+    """Raised when no browser could render a page, whatever the site"""
+
+# Trafilatura config of an extraction worker process, loaded once per process
+_worker_config = None
+
+def _init_extraction_worker(config_path):
+    """Load the Trafilatura config once when an extraction worker process starts"""
+    global _worker_config
+    _worker_config = use_config(config_path)
+    silence_trafilatura_log()
+
+def _extract_in_worker(html):
+    """
+    Run trafilatura.bare_extraction inside an extraction worker process.
+
+    The Document returned by trafilatura holds lxml trees that cannot be pickled,
+    so only the fields used by the scraper are sent back to the parent process.
+    """
+    extracted = trafilatura.bare_extraction(
+        html,
+        include_images=True,
+        with_metadata=True,
+        config=_worker_config
+    )
+    if not extracted:
+        return None
+    return {field: getattr(extracted, field, None) for field in EXTRACTED_FIELDS}
 
 class ContentScraper:
     """
     Content scraper that uses Trafilatura library to scrape content from a URL. 
     """
     
-    def __init__(self, logger=None, selenium_headless=True):
-        """Initialize the content scraper"""
+    def __init__(self, logger=None, selenium_headless=True, extraction_processes=0,
+                 fetch_concurrency=32, per_host_concurrency=4, cache=None, dedup=None,
+                 fetch_strategy=None, selenium_wait_time=10, selenium_readiness=('body', 'dom', 'network'),
+                 fetch_workers=1):
+        """
+        Initialize the content scraper
+
+        Args:
+            logger: Logger instance
+            selenium_headless (bool): Use headless mode for the Selenium fallback
+            extraction_processes (int): Number of worker processes for trafilatura.bare_extraction.
+                0 runs the extraction in the calling thread.
+            fetch_concurrency (int): Maximum simultaneous connections used by scrape_many
+            per_host_concurrency (int): Maximum simultaneous connections per host used by scrape_many
+            cache (ResponseCache): Optional on-disk cache of downloaded and rendered pages
+            dedup (NearDuplicateDetector): Optional near-duplicate detector; duplicates are
+                flagged in a 'duplicate_of' field or dropped, depending on its mode
+            fetch_strategy (FetchStrategyStore): Optional per-domain statistics routing URLs
+                straight to Selenium or skipping them when the static fetch keeps failing
+            selenium_wait_time (float): Deadline in seconds of each readiness condition of a rendered page
+            selenium_readiness (tuple): Conditions a rendered page must meet before its source
+                is read (utils.readiness.CONDITIONS); pages without a body are dropped
+            fetch_workers (int): Number of threads calling scrape() at the same time, e.g. the
+                crawler's extractor_workers; sizes the per-host connection pool of trafilatura.fetch_url
+        """
         self.logger = logger or logging.getLogger(self.__class__.__name__)
 
         # Load custom Trafilatura configuration
-        config_path = os.path.join(os.path.dirname(__file__), 'setting.cfg')
-        self.custom_config = use_config(config_path)
+        self.config_path = os.path.join(os.path.dirname(__file__), 'setting.cfg')
+        self.custom_config = use_config(self.config_path)
         self.logger.debug(f"Loaded Trafilatura config: {self.custom_config}")
 
         silence_trafilatura_log()
-        self.driver = None # Selenium driver instance
+        if fetch_workers > 1:
+            size_trafilatura_pool(self.custom_config, fetch_workers)
         self.selenium_headless = selenium_headless # Use headless mode for Selenium
+        self.selenium_wait_time = selenium_wait_time
+        self.selenium_readiness = tuple(selenium_readiness)
+        self._browsers = None # Shared BrowserManager, looked up on the first Selenium fallback
+
+        # Process pool for the CPU-bound extraction step, started on first use
+        self.extraction_processes = int(extraction_processes)
+        self._extraction_pool = None
+        self._pool_lock = threading.Lock()
+
+        # Connection limits of the batch fetcher used by scrape_many
+        self.fetch_concurrency = int(fetch_concurrency)
+        self.per_host_concurrency = int(per_host_concurrency)
+
+        # Optional persistent cache of downloaded pages (utils.response_cache.ResponseCache)
+        self.cache = cache
+
+        # Optional near-duplicate detector (content_scraper.dedup.NearDuplicateDetector)
+        self.dedup = dedup
+
+        # Optional per-domain fetch statistics (utils.fetch_strategy.FetchStrategyStore)
+        self.fetch_strategy = fetch_strategy
     
     def scrape(self, search_result):
         """
@@ -41,7 +152,7 @@ class ContentScraper:
             description (str): The description from search result (fallback)
             
         Returns:
-            dict: Scraped content with standardized fields
+            dict: Scraped content with standardized fields, and the outcome under STATUS_KEY
         """
         url = search_result['link']
         keyword = search_result['keyword']
@@ -51,101 +162,289 @@ class ContentScraper:
         self.logger.info(f"Scraping content from: {url}")
         
         try:  
-            # Use trafilatura's built-in fetch function
-            downloaded = trafilatura.fetch_url(
-                url,
-                config=self.custom_config,
-            )
-            
+            strategy = self._choose_strategy(url)
+            if strategy != STATIC:
+                return self._scrape_rerouted(strategy, url, keyword, title, description)
+
+            downloaded = self._cache_get(url, 'static')
+            from_cache = downloaded is not None
             if downloaded is None:
-                self.logger.warning(f"Failed to download content from {url} with Trafilatura, trying Selenium")
-                return self._try_selenium_scrape(url, keyword, title, description)
-            
-            # Extract rich content using bare_extraction
-            extracted = trafilatura.bare_extraction(
-                downloaded, 
-                include_images=True, 
-                with_metadata=True,
-                config=self.custom_config
-            )
+                # Use trafilatura's built-in fetch function
+                with metrics.timer('stage_seconds', stage='article_fetch'):
+                    downloaded = trafilatura.fetch_url(
+                        url,
+                        config=self.custom_config,
+                    )
+                self._cache_put(url, downloaded, 'static')
             
-            if not extracted:
-                self.logger.warning(f"Trafilatura couldn't extract content from downloaded {url}, trying Selenium")
-                return self._try_selenium_scrape(url, keyword, title, description)
-            
-            # Process extracted content
-            return self._process_extracted_content(extracted, url, keyword, title, description)
+            return self._extract_downloaded(downloaded, url, keyword, title, description, from_cache)
             
         except Exception as e:
             self.logger.error(f"Error scraping {url}: {str(e)}")
             return self._create_fallback_result(url, keyword, title, description, 
                                               f"Error extracting content")
+
+    def scrape_many(self, search_results):
+        """
+        Scrape a batch of search results, downloading all pages concurrently.
+
+        Pages are fetched with AsyncFetcher over a shared keep-alive connection pool,
+        then extracted like in scrape(), including the Selenium fallback.
+
+        Args:
+            search_results (list): Search result dicts with 'link', 'keyword', 'title' and 'description'
+
+        Returns:
+            list: Scraped content dicts, in the order of search_results
+        """
+        if not search_results:
+            return []
+
+        from content_scraper.async_fetcher import AsyncFetcher
+
+        fetcher = AsyncFetcher(
+            self.custom_config,
+            max_concurrency=self.fetch_concurrency,
+            per_host_concurrency=self.per_host_concurrency,
+            logger=self.logger
+        )
+        # Only download the pages missing from the cache, of domains worth a static fetch
+        strategies = {}
+        pages = {}
+        for search_result in search_results:
+            url = search_result['link']
+            if url not in strategies:
+                strategies[url] = self._choose_strategy(url)
+                if strategies[url] == STATIC:
+                    pages[url] = self._cache_get(url, 'static')
+        missing = [url for url, page in pages.items() if page is None]
+        cached = set(pages) - set(missing)
+
+        self.logger.info(f"Fetching {len(missing)} URLs concurrently ({len(pages) - len(missing)} cached)")
+        with metrics.timer('stage_seconds', stage='article_fetch_batch'):
+            fetched = fetcher.fetch_many(missing)
+        for url, page in fetched.items():
+            pages[url] = page
+            self._cache_put(url, page, 'static')
+
+        def extract(search_result):
+            url = search_result['link']
+            keyword = search_result['keyword']
+            title = search_result['title']
+            description = search_result.get('description', '')
+            try:
+                if strategies[url] != STATIC:
+                    return self._scrape_rerouted(strategies[url], url, keyword, title, description)
+                return self._extract_downloaded(pages.get(url), url, keyword, title, description,
+                                                url in cached)
+            except Exception as e:
+                self.logger.error(f"Error scraping {url}: {str(e)}")
+                return self._create_fallback_result(url, keyword, title, description,
+                                                  f"Error extracting content")
+
+        # Keep every extraction process busy while the results are processed
+        with ThreadPoolExecutor(max_workers=max(1, self.extraction_processes)) as executor:
+            return list(executor.map(extract, search_results))
+
+    def _choose_strategy(self, url):
+        """Fetch strategy of a URL, static unless the domain statistics say otherwise"""
+        strategy = self.fetch_strategy.choose(url) if self.fetch_strategy else STATIC
+        metrics.inc('fetch_strategy_total', strategy=strategy)
+        return strategy
+
+    def _record_strategy(self, url, strategy, success, from_cache=False):
+        """Record the outcome of a fetch strategy if the statistics are enabled, and the page was really fetched"""
+        if self.fetch_strategy and not from_cache:
+            self.fetch_strategy.record(url, strategy, success)
+
+    def _scrape_rerouted(self, strategy, url, keyword, title, description):
+        """Scrape a URL whose domain is routed away from the static fetch"""
+        if strategy == SKIP:
+            self.logger.info(f"Skipping {url}, no content could be extracted from this site recently")
+            return self._create_fallback_result(url, keyword, title, description,
+                                              "Site skipped after repeated extraction failures", status=SKIPPED)
+        self.logger.info(f"Static fetch usually fails on {url}, going straight to Selenium")
+        return self._try_selenium_scrape(url, keyword, title, description)
+
+    def _extract_downloaded(self, downloaded, url, keyword, title, description, from_cache=False):
+        """
+        Extract content from a downloaded page, falling back to Selenium when needed
+
+        Pages served from the response cache (from_cache) are not counted in the fetch
+        strategy statistics, which only learn from real downloads.
+        """
+        if downloaded is None:
+            self.logger.warning(f"Failed to download content from {url} with Trafilatura, trying Selenium")
+            metrics.inc('fallbacks_total', reason='download_failed')
+            self._record_strategy(url, STATIC, False)
+            return self._try_selenium_scrape(url, keyword, title, description)
+        
+        # Extract rich content using bare_extraction
+        extracted = self._bare_extraction(downloaded)
+        
+        if not extracted:
+            self.logger.warning(f"Trafilatura couldn't extract content from downloaded {url}, trying Selenium")
+            metrics.inc('fallbacks_total', reason='nothing_extracted')
+            self._record_strategy(url, STATIC, False, from_cache)
+            return self._try_selenium_scrape(url, keyword, title, description)
+        self._record_strategy(url, STATIC, True, from_cache)
+        
+        # Process extracted content
+        return self._process_extracted_content(extracted, url, keyword, title, description)
     
     def _try_selenium_scrape(self, url, keyword, title, description):
         """Use Selenium as fallback for downloading and extracting content"""
         self.logger.info(f"Attempting to scrape {url} using Selenium")
         
+        from_cache = False
         try:
-            # Initialize Selenium driver if not already done
-            if self.driver is None:
-                from utils.selenium_utils import selenium_driver_factory
-                self.driver = selenium_driver_factory(headless=self.selenium_headless)
-                # Set page load timeout
-                self.driver.set_page_load_timeout(30)
-            
-            # Navigate to URL with proper error handling
-            try:
-                from selenium.common.exceptions import TimeoutException, WebDriverException
-                from selenium.webdriver.support.ui import WebDriverWait
-                from selenium.webdriver.support import expected_conditions as EC
-                from selenium.webdriver.common.by import By
-                
-                self.driver.get(url)
-                WebDriverWait(self.driver, 10).until(
-                    EC.presence_of_element_located((By.TAG_NAME, "body"))
-                )
-            except TimeoutException:
-                self.logger.warning(f"Selenium: Timeout while loading page: {url}")
-                return self._create_fallback_result(url, keyword, title, description, 
-                                            f"Failed to download content")
-            except WebDriverException as e:
-                error_message = str(e).split('\n')[0].strip()
-                self.logger.error(f"Selenium: Connection error for {url}: {str(e)}")
+            page_source = self._cache_get(url, 'selenium')
+            from_cache = page_source is not None
+            if page_source is None:
+                with metrics.timer('stage_seconds', stage='selenium_render'):
+                    page_source = self._render_with_selenium(url)
+            if page_source is None:
+                self._record_strategy(url, SELENIUM, False)
                 return self._create_fallback_result(url, keyword, title, description, 
                                             f"Failed to download content")
-            
-            # Add a small delay to ensure dynamic content loads
-            time.sleep(2)
-            
-            # Get the page source
-            page_source = self.driver.page_source
+            self._cache_put(url, page_source, 'selenium')
             
             # Use Trafilatura to extract content from the page source
-            extracted = trafilatura.bare_extraction(
-                page_source,
-                include_images=True,
-                with_metadata=True,
-                config=self.custom_config
-            )
+            extracted = self._bare_extraction(page_source)
             
             if not extracted:
                 self.logger.warning(f"Trafilatura (with Selenium) couldn't extract content from downloaded {url}")
+                self._record_strategy(url, SELENIUM, False, from_cache)
                 return self._create_fallback_result(url, keyword, title, description, 
                                                   "No content could be extracted")
             
             # Process extracted content
-            return self._process_extracted_content(extracted, url, keyword, title, description)
+            result = self._process_extracted_content(extracted, url, keyword, title, description)
+            self._record_strategy(url, SELENIUM, True, from_cache)
+            return result
+
+        except BrowserUnavailable as e:
+            # Not the site's fault, so the fetch statistics of the domain are left alone
+            self.logger.error(f"Error scraping (with Selenium) {url}: {str(e)}")
+            return self._create_fallback_result(url, keyword, title, description,
+                                              f"Failed to download content")
             
         except Exception as e:
             self.logger.error(f"Error scraping (with Selenium) {url}: {str(e)}")
+            self._record_strategy(url, SELENIUM, False, from_cache)
             return self._create_fallback_result(url, keyword, title, description, 
                                               f"Error extracting content")
-        finally:
-            # We don't close the driver here as we might reuse it for other scrapes
-            pass
+
+    def _render_with_selenium(self, url):
+        """
+        Load a URL in a browser leased from the shared pool
+
+        Returns:
+            str: The rendered page source, or None if the page could not be loaded
+
+        Raises:
+            BrowserUnavailable: No browser could be started, or it crashed or stopped responding
+        """
+        from selenium.common.exceptions import TimeoutException, WebDriverException
+        from utils.readiness import PageReadiness
+
+        readiness = PageReadiness.from_names(self.selenium_readiness, timeout=self.selenium_wait_time,
+                                             logger=self.logger)
+
+        browsers = self._get_browsers()
+        with ExitStack() as stack:
+            # Lease a browser from the pool shared with the SERP middleware
+            try:
+                driver = stack.enter_context(browsers.lease())
+                # Set page load timeout
+                driver.set_page_load_timeout(30)
+            except Exception as e:
+                raise BrowserUnavailable(f"No browser available: {str(e)}") from e
+        
+            # Navigate to URL with proper error handling
+            try:
+                readiness.prepare(driver)
+                driver.get(url)
+            except TimeoutException:
+                self.logger.warning(f"Selenium: Timeout while loading page: {url}")
+                return None
+            except WebDriverException as e:
+                # Chrome reports the page's own network errors as net::ERR_*, anything else is the browser
+                if 'net::ERR_' not in str(e):
+                    browsers.retire(driver)
+                    raise BrowserUnavailable(f"Browser failed: {str(e)}") from e
+                self.logger.error(f"Selenium: Connection error for {url}: {str(e)}")
+                return None
+        
+            # Wait until dynamic content has settled instead of a fixed delay
+            states = readiness.wait(driver)
+            if states.get('body') == 'timeout':
+                self.logger.warning(f"Selenium: Timeout while loading page: {url}")
+                return None
+        
+            # Get the page source
+            try:
+                return driver.page_source
+            except WebDriverException as e:
+                browsers.retire(driver)
+                raise BrowserUnavailable(f"Browser failed: {str(e)}") from e
+
+    def _get_browsers(self):
+        """Return the process-wide BrowserManager, configured for this scraper on first use"""
+        if self._browsers is None:
+            from utils.selenium_utils import get_browser_manager
+            browsers = get_browser_manager()
+            options = {'headless': self.selenium_headless}
+            if 'network' in self.selenium_readiness:
+                # Only ever turned on here, the SERP middleware may share the browsers
+                options['performance_log'] = True
+            browsers.configure(**options)
+            self._browsers = browsers
+        return self._browsers
     
+    def _get_extraction_pool(self):
+        """Start the extraction process pool on first use"""
+        with self._pool_lock:
+            if self._extraction_pool is None:
+                self.logger.info(f"Starting extraction process pool with {self.extraction_processes} workers")
+                # Use spawn: forking a process that runs the Twisted reactor and worker threads is unsafe
+                self._extraction_pool = ProcessPoolExecutor(
+                    max_workers=self.extraction_processes,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_extraction_worker,
+                    initargs=(self.config_path,)
+                )
+            return self._extraction_pool
+
+    def _bare_extraction(self, html):
+        """
+        Run trafilatura.bare_extraction on downloaded HTML, in the process pool if configured
+
+        Args:
+            html (str): The downloaded page
+
+        Returns:
+            Object exposing the extracted fields as attributes, or None if nothing was extracted
+        """
+        with metrics.timer('stage_seconds', stage='bare_extraction'):
+            if self.extraction_processes <= 0:
+                return trafilatura.bare_extraction(
+                    html,
+                    include_images=True,
+                    with_metadata=True,
+                    config=self.custom_config
+                )
+
+            fields = self._get_extraction_pool().submit(_extract_in_worker, html).result()
+            return SimpleNamespace(**fields) if fields else None
+
     def _process_extracted_content(self, extracted, url, keyword, search_title, search_description):
         """Process the extracted content and return standardized dict"""
+        with metrics.timer('stage_seconds', stage='postprocess'):
+            return self._build_result(extracted, url, keyword, search_title, search_description)
+
+    def _build_result(self, extracted, url, keyword, search_title, search_description):
+        """Build the result dict of _process_extracted_content"""
         try:
             # Get content text - this is the main article content
             content = extracted.text if extracted.text else ""
@@ -174,11 +473,18 @@ class ContentScraper:
 
             # Extract images from content
             content_cleaned, images = self._extract_images_from_content(content, url)
+
+            # Detect syndicated copies of an article already extracted
+            duplicate_of = self.dedup.check(url, content_cleaned) if self.dedup else None
+            if duplicate_of and self.dedup.mode == 'drop':
+                metrics.inc('duplicates_total', action='dropped')
+                self.logger.info(f"Dropping near-duplicate content from {url} (duplicate of {duplicate_of})")
+                return {'url': url, 'keyword': keyword, 'duplicate_of': duplicate_of, STATUS_KEY: DUPLICATE}
             
             self.logger.info(f"Successfully extracted content from {url}")
             
             # Return standardized format
-            return {
+            result = {
                 'title': page_title,
                 'url': url,
                 'description': page_description,
@@ -188,8 +494,12 @@ class ContentScraper:
                 'images': images,
                 'author': author,
                 'site': sitename or hostname,
-                'keyword': keyword
+                'keyword': keyword,
+                STATUS_KEY: EXTRACTED
             }
+            if self.dedup:
+                result['duplicate_of'] = duplicate_of or ""
+            return result
             
         except Exception as e:
             self.logger.error(f"Error processing extracted content: {str(e)}")
@@ -245,9 +555,10 @@ class ContentScraper:
         
         return content_with_placeholders, images
     
-    def _create_fallback_result(self, url, keyword, title, description, error_message):
+    def _create_fallback_result(self, url, keyword, title, description, error_message, status=FAILED):
         """Create a fallback result with error message"""
-        return {
+        metrics.inc('fallback_results_total')
+        result = {
             'title': title,
             'url': url,
             'description': description,
@@ -257,14 +568,41 @@ class ContentScraper:
             'images': [],
             'author': "",
             'site': "",
-            'keyword': keyword
+            'keyword': keyword,
+            STATUS_KEY: status
         }
+        if self.dedup:
+            result['duplicate_of'] = ""
+        return result
     
+    def _cache_get(self, url, namespace):
+        """Return a cached page, or None if caching is disabled or the page is not cached"""
+        if self.cache is None:
+            return None
+        try:
+            page = self.cache.get(url, namespace)
+            metrics.inc('cache_requests_total', cache=namespace, result='miss' if page is None else 'hit')
+            return page
+        except Exception as e:
+            self.logger.warning(f"Response cache lookup failed for {url}: {str(e)}")
+            return None
+
+    def _cache_put(self, url, content, namespace):
+        """Store a downloaded page in the cache if caching is enabled"""
+        if self.cache is None or not content:
+            return
+        try:
+            self.cache.put(url, content, namespace)
+        except Exception as e:
+            self.logger.warning(f"Response cache store failed for {url}: {str(e)}")
+
     def close(self):
-        """Close selenium driver if it exists"""
-        if self.driver:
-            try:
-                self.driver.quit()
-                self.driver = None
-            except Exception as e:
-                self.logger.error(f"Error closing Selenium driver: {str(e)}")
+        """
+        Close the extraction process pool if it exists.
+
+        Browsers belong to the shared BrowserManager and are shut down with
+        utils.selenium_utils.shutdown_browsers().
+        """
+        if self._extraction_pool:
+            self._extraction_pool.shutdown(wait=True)
+            self._extraction_pool = None
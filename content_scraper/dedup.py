@@ -0,0 +1,142 @@
+import re
+import hashlib
+import logging
+import threading
+from itertools import combinations
+from collections import Counter
+
+WORD_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+def simhash(text, shingle_size=3, bits=64):
+    """
+    SimHash fingerprint of a text
+
+    The text is lowercased and split into overlapping word shingles; each shingle
+    votes on every bit of the fingerprint with its hash, weighted by how often it
+    occurs. Texts sharing most shingles get fingerprints with a small Hamming distance.
+
+    Args:
+        text (str): The text to fingerprint
+        shingle_size (int): Number of words per shingle
+        bits (int): Fingerprint size (at most 64)
+
+    Returns:
+        int: The fingerprint
+    """
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < shingle_size:
+        shingles = Counter([' '.join(words)])
+    else:
+        shingles = Counter(' '.join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1))
+
+    votes = [0] * bits
+    for shingle, weight in shingles.items():
+        value = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'little')
+        for bit in range(bits):
+            if value >> bit & 1:
+                votes[bit] += weight
+            else:
+                votes[bit] -= weight
+
+    fingerprint = 0
+    for bit, vote in enumerate(votes):
+        if vote > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+class NearDuplicateDetector:
+    """
+    Near-duplicate detector for extracted article text based on SimHash with an LSH index
+
+    Two texts are near-duplicates when their fingerprints differ in at most
+    `max_distance` bits. Fingerprints are split into `blocks` blocks; the differing
+    bits fall in at most `max_distance` of them, so two near-duplicates agree exactly
+    on at least `blocks - max_distance` blocks. Every combination of that many blocks
+    gets a table keyed on the fingerprint bits of those blocks, and only documents
+    colliding in a table are compared. With the defaults (8 blocks, distance 6) that
+    is 28 tables with 16-bit keys, so a lookup compares about 28 / 65536 of the
+    documents seen instead of a fraction of them growing with each band narrowed.
+    """
+
+    MODES = ('flag', 'drop')
+
+    def __init__(self, max_distance=6, min_length=200, mode='flag', bits=64, blocks=None, logger=None):
+        """
+        Initialize the detector
+
+        Args:
+            max_distance (int): Maximum Hamming distance between near-duplicate fingerprints
+            min_length (int): Texts shorter than this many characters are never flagged
+            mode (str): 'flag' marks duplicates in the result, 'drop' removes them
+            bits (int): Fingerprint size (at most 64)
+            blocks (int): Blocks the fingerprint is split into, more than max_distance
+                (default: max_distance + 2, so tables are keyed on two blocks)
+            logger: Logger instance
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"mode must be one of {self.MODES}, got {mode}")
+        blocks = int(blocks) if blocks else int(max_distance) + 2
+        if not int(max_distance) < blocks <= int(bits):
+            raise ValueError(f"blocks must be above max_distance and at most bits, got {blocks}")
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+        self.max_distance = int(max_distance)
+        self.min_length = int(min_length)
+        self.mode = mode
+        self.bits = int(bits)
+
+        # Split the fingerprint into blocks of (nearly) equal width
+        width, extra = divmod(self.bits, blocks)
+        block_masks = []
+        start = 0
+        for block in range(blocks):
+            block_width = width + (1 if block < extra else 0)
+            block_masks.append(((1 << block_width) - 1) << start)
+            start += block_width
+
+        # One table per combination of the blocks two near-duplicates are sure to share
+        self._masks = [sum(combination) for combination in combinations(block_masks, blocks - self.max_distance)]
+        self._tables = [{} for _ in self._masks]  # Masked fingerprint -> list of document ids
+        self._fingerprints = []  # Document id -> (fingerprint, url)
+        self._lock = threading.Lock()
+        self.duplicates = 0
+
+    def _band_values(self, fingerprint):
+        return [fingerprint & mask for mask in self._masks]
+
+    def check(self, url, text):
+        """
+        Check a text against every text seen so far and index it if it is new
+
+        Args:
+            url (str): URL of the text, returned for later duplicates
+            text (str): Extracted article text
+
+        Returns:
+            str: URL of the earlier near-duplicate, or None if the text is new
+        """
+        if not text or len(text) < self.min_length:
+            return None
+
+        fingerprint = simhash(text, bits=self.bits)
+        band_values = self._band_values(fingerprint)
+
+        with self._lock:
+            checked = set()
+            for table, value in zip(self._tables, band_values):
+                for doc_id in table.get(value, ()):
+                    if doc_id in checked:
+                        continue
+                    checked.add(doc_id)
+                    other_fingerprint, other_url = self._fingerprints[doc_id]
+                    if bin(fingerprint ^ other_fingerprint).count('1') <= self.max_distance:
+                        self.duplicates += 1
+                        return other_url
+
+            doc_id = len(self._fingerprints)
+            self._fingerprints.append((fingerprint, url))
+            for table, value in zip(self._tables, band_values):
+                table.setdefault(value, []).append(doc_id)
+        return None
+
+    def __len__(self):
+        return len(self._fingerprints)
@@ -0,0 +1,79 @@
+import time
+import logging
+
+from selenium.webdriver.common.by import By
+
+# Elements of Google's sorry page and of the usual CAPTCHA widgets
+CAPTCHA_INDICATORS = [
+    "//form[@action='/sorry']",  # Google's CAPTCHA/sorry page
+    "//div[contains(text(), 'captcha')]",
+    "//input[@id='captcha']",
+    "//img[contains(@src, 'captcha')]",
+    "//div[contains(@class, 'g-recaptcha')]",
+    "//iframe[contains(@src, 'recaptcha')]",
+    "//textarea[@id='g-recaptcha-response']"
+]
+
+class CaptchaBlocked(Exception):
+    """Raised for a SERP request still answered with a CAPTCHA after every parked retry"""
+
+def detect_captcha(driver):
+    """Check if the page loaded in the driver contains a CAPTCHA"""
+    for indicator in CAPTCHA_INDICATORS:
+        try:
+            if driver.find_elements(By.XPATH, indicator):
+                return True
+        except Exception:
+            pass
+    return False
+
+class ManualCaptchaSolver:
+    """
+    Side channel letting someone solve a CAPTCHA in a browser window
+
+    `solve` blocks the calling worker thread only: it leases a browser from the shared
+    pool, opens the blocked URL and waits for the CAPTCHA to disappear, while the
+    crawl goes on with the other browsers and identities.
+    """
+
+    def __init__(self, browsers, timeout=300, poll_interval=2, logger=None):
+        """
+        Args:
+            browsers (BrowserManager): Shared browser pool
+            timeout (float): Seconds given to solve a CAPTCHA
+            poll_interval (float): Seconds between two checks of the page
+            logger: Logger instance
+        """
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+        self.browsers = browsers
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+
+    def solve(self, url):
+        """
+        Open a URL and wait until it is shown without a CAPTCHA
+
+        Returns:
+            str: Source of the page once the CAPTCHA is gone, or None on timeout
+        """
+        with self.browsers.lease(timeout=self.timeout) as driver:
+            driver.get(url)
+            if not detect_captcha(driver):
+                return driver.page_source
+
+            self.logger.warning(f"CAPTCHA waiting to be solved manually for {url}")
+            print("\n" + "="*60)
+            print("CAPTCHA DETECTED! Please solve it in the browser window.")
+            print("You have {} minutes to solve the CAPTCHA.".format(int(self.timeout) // 60))
+            print("Other keywords keep crawling in the meantime.")
+            print("="*60 + "\n")
+
+            deadline = time.time() + self.timeout
+            while time.time() < deadline:
+                time.sleep(self.poll_interval)
+                if not detect_captcha(driver):
+                    self.logger.info(f"CAPTCHA solved for {url}")
+                    return driver.page_source
+
+        self.logger.error(f"CAPTCHA not solved within {self.timeout}s for {url}")
+        return None
@@ -0,0 +1,7 @@
+from scrapy.exceptions import IgnoreRequest
+
+class PageCancelled(IgnoreRequest):
+    """Raised for a result page dropped because its keyword no longer needs it"""
+
+class RequestParked(IgnoreRequest):
+    """Raised for a blocked SERP request taken out of the crawl to be retried later"""
@@ -1,11 +1,22 @@
+import time
 import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from scrapy.crawler import CrawlerProcess
 from scrapy.utils.project import get_project_settings
 from google_crawler.spiders.google_spider import GoogleSpider
+from google_crawler.middlewares import AdaptiveThrottleMiddleware, CaptchaMiddleware
 from scrapy import signals
 from scrapy.signalmanager import dispatcher
+from twisted.internet.task import LoopingCall
 
 from utils.logger import silence_noisy_log
+from utils.work_queue import ARTICLE_TOPIC
+from utils.metrics import metrics
+
+# Extraction outcomes of a search result that are final: the URL is done
+SUCCESSFUL_STATUSES = ('extracted', 'duplicate')
 
 class GoogleCrawler:
     """
@@ -24,9 +35,31 @@ class GoogleCrawler:
         
         self._content_extractor = None
         self.content_results = []  # Store content extraction results if scraper is provided
+        self._sink = None  # Optional streaming output receiving each content result
+        self._seen_store = None  # Optional persistent store of URLs processed by previous runs
+        self._work_queue = None  # Optional queue shared with the other crawler nodes
+        self._distribute_articles = False  # Whether search results go through the shared queue
+        self._article_consumer = None  # Thread extracting the articles of the shared queue
+        self._crawl_finished = threading.Event()  # Set once the spider has closed
+        self.content_count = 0  # Number of extracted results, also counted when streamed to a sink
+        self.keyword_counts = Counter()  # Extracted results per keyword
+
+        # Content extraction runs on a worker pool so it never blocks the Twisted reactor
+        self._extraction_executor = None
+        self._results_lock = threading.Lock()
+
+        # Checkpoint state: URLs already extracted and search results waiting for extraction
+        self._checkpoint = None
+        self._checkpoint_loop = None
+        self._last_checkpoint = 0
+        self._spider_state = None
+        self.extracted_urls = set()
+        self._pending_extractions = {}
             
     def run(self, keywords=None, results_per_keyword=20, max_pages=10,
             whitelist=None, content_extractor=None, extractor_method=None, 
+            extractor_workers=4, checkpoint=None, resume=False, sink=None, seen_store=None,
+            work_queue=None, distribute_articles=False, parallel_pages=None, settings_overrides=None,
             **extractor_kwargs):
         """
     Run the Google crawler and return search results directly
@@ -38,6 +71,20 @@ class GoogleCrawler:
         whitelist (list): Optional list of domains to skip
         content_extractor: Optional object that will extract content from search results
         extractor_method (str): Name of the method to call on the content_extractor
+        extractor_workers (int): Number of threads running the extractor method concurrently
+        checkpoint (CrawlCheckpoint): Optional checkpoint saved periodically during the run
+        resume (bool): Resume from the state saved in checkpoint, skipping finished work
+        sink (ResultSink): Optional output receiving each content result as it arrives;
+            results written to the sink are not kept in memory
+        seen_store (SeenUrlStore): Optional persistent store of processed URLs; URLs in it
+            are skipped and successfully extracted URLs are added to it
+        work_queue (WorkQueue): Optional queue shared with other crawler nodes; keywords are
+            leased from it instead of taken from `keywords`
+        distribute_articles (bool): Push search results to the work queue and extract the
+            articles leased from it, so every node shares the extraction work
+        parallel_pages (bool): Request the result pages of each keyword in parallel with
+            start= offsets (default: SERP_PARALLEL_PAGES setting)
+        settings_overrides (dict): Optional Scrapy settings replacing the project settings
         **extractor_kwargs: Additional keyword arguments to pass to the extractor method
         
     Returns:
@@ -47,6 +94,13 @@ class GoogleCrawler:
         self.logger.info("Initializing Google search crawler")
         self.search_results = []  # Reset results
         self.content_results = [] # Reset content results
+        self.content_count = 0
+        self.keyword_counts = Counter()
+        self._sink = sink
+        self._seen_store = seen_store
+        self._work_queue = work_queue
+        self._distribute_articles = bool(work_queue is not None and distribute_articles)
+        self._crawl_finished.clear()
 
         # Set up processor if provided
         self._content_extractor = None
@@ -61,36 +115,96 @@ class GoogleCrawler:
             else:
                 self.logger.warning(f"Content extractor {content_extractor} does not have callable method {extractor_method}")
         
-        if not keywords:
+        if not keywords and work_queue is None:
             self.logger.warning("No keywords provided to GoogleCrawler")
-            return ([], []) if self.content_scraper else []
+            return ([], []) if self._content_extractor else []
             
-        self.logger.info(f"Starting Google crawler with {len(keywords)} keywords")
+        # Load the state of the interrupted run if resuming
+        self._checkpoint = checkpoint
+        resume_state = checkpoint.load() if (checkpoint and resume) else None
+        if resume and resume_state is None:
+            self.logger.warning("No checkpoint to resume from, starting a fresh crawl")
+        resume_state = resume_state or {}
+        self._spider_state = resume_state.get('spider')
+        self.extracted_urls = set(resume_state.get('extracted_urls', []))
+        self._pending_extractions = {}
+
+        if work_queue is not None:
+            self.logger.info("Starting Google crawler with keywords leased from the work queue")
+        else:
+            self.logger.info(f"Starting Google crawler with {len(keywords)} keywords")
         self.logger.info(f"Target: collect up to {results_per_keyword} results per keyword")
         self.logger.info(f"Maximum {max_pages} pages will be crawled per keyword")
         
         try:
             # Configure Scrapy crawler process
             settings = get_project_settings()
+            if settings_overrides:
+                settings.setdict(settings_overrides, priority='cmdline')
+            AdaptiveThrottleMiddleware.update_settings(settings)
+            CaptchaMiddleware.update_settings(settings)
+            if parallel_pages is None:
+                parallel_pages = settings.getbool('SERP_PARALLEL_PAGES', False)
+            if parallel_pages:
+                # Let the pages requested up front overlap, still paced by the throttle
+                settings.set('CONCURRENT_REQUESTS', max(settings.getint('CONCURRENT_REQUESTS'),
+                                                        settings.getint('SERP_PARALLEL_CONCURRENCY', 4)))
             process = CrawlerProcess(settings)
             silence_noisy_log()  # Silence Scrapy log output
 
+            # Start the extraction workers fed by the item_scraped signal
+            if self._content_extractor:
+                self._extraction_executor = ThreadPoolExecutor(
+                    max_workers=max(1, int(extractor_workers)),
+                    thread_name_prefix='content-extractor'
+                )
+
             # Set up the signal to collect items
             dispatcher.connect(self._item_scraped, signals.item_scraped)
+
+            # Save checkpoints periodically while the spider runs, and once more when it closes
+            if self._checkpoint:
+                dispatcher.connect(self._spider_opened, signals.spider_opened)
+                dispatcher.connect(self._spider_closed, signals.spider_closed)
+
+            # Search results that were still waiting for extraction when the previous run died
+            pending = resume_state.get('pending_extractions', [])
+            if pending and self._extraction_executor:
+                self.logger.info(f"Resubmitting {len(pending)} search results pending extraction")
+                for search_result in pending:
+                    self._submit_extraction(search_result)
             
             # Add the Google spider to the process with all parameters
             process.crawl(GoogleSpider, 
                          keywords=keywords, 
                          results_per_keyword=results_per_keyword,
                          max_pages=max_pages,
-                         whitelist=whitelist)
+                         whitelist=whitelist,
+                         resume_state=self._spider_state,
+                         seen_store=seen_store,
+                         work_queue=work_queue,
+                         parallel_pages=parallel_pages)
             
+            # Extract the articles queued by every node while the crawl runs
+            if self._distribute_articles and self._extraction_executor:
+                self._article_consumer = threading.Thread(
+                    target=self._consume_article_queue, args=(max(1, int(extractor_workers)) * 2,),
+                    name='article-queue', daemon=True
+                )
+                self._article_consumer.start()
+
             # Run the crawler
             self.logger.info(f"Starting Google search crawling (with content extractor: {self._content_extractor is not None})...")
             process.start()
             
             # Process is complete at this point
             self.logger.info(f"Google search crawling finished with {len(self.search_results)} total results")
+
+            # Keep helping with the articles queued by every node until none are left
+            self._stop_article_consumer()
+
+            # Wait for the content extraction still queued on the workers
+            self._drain_extraction_executor()
             
             # Return appropriate results
             if self._content_extractor:
@@ -101,31 +215,203 @@ class GoogleCrawler:
             self.logger.error(f"Error during Google crawling: {str(e)}")
             self.logger.exception("Exception details:")
             return ([], []) if self._content_extractor else []
+        finally:
+            self._stop_article_consumer()
+            self._drain_extraction_executor()
+
+    def _stop_article_consumer(self):
+        """Tell the article queue consumer the crawl is over and wait until it has drained the queue"""
+        self._crawl_finished.set()
+        if self._article_consumer:
+            self._article_consumer.join()
+            self._article_consumer = None
+
+    def _drain_extraction_executor(self):
+        """Block until every submitted extraction has finished, then stop the workers"""
+        if self._extraction_executor:
+            self.logger.info("Waiting for content extraction workers to finish...")
+            self._extraction_executor.shutdown(wait=True)
+            self._extraction_executor = None
+            self._save_checkpoint()
+            self.logger.info(f"Content extraction finished with {self.content_count} results")
     
+    def _collect_content(self, content_data):
+        """Stream a content result to the sink, or keep it in content_results without one"""
+        if self._sink:
+            with metrics.timer('stage_seconds', stage='output_write'):
+                self._sink.write(content_data)
+        with self._results_lock:
+            if not self._sink:
+                self.content_results.append(content_data)
+            self.content_count += 1
+            self.keyword_counts[content_data.get('keyword')] += 1
+
+    def _spider_opened(self, spider):
+        """Start the periodic checkpoint when the spider opens"""
+        self._checkpoint_loop = LoopingCall(self._checkpoint_spider, spider)
+        self._checkpoint_loop.start(self._checkpoint.interval, now=False)
+
+    def _spider_closed(self, spider):
+        """Stop the periodic checkpoint and save the final spider state"""
+        if self._checkpoint_loop and self._checkpoint_loop.running:
+            self._checkpoint_loop.stop()
+        self._checkpoint_spider(spider)
+
+    def _checkpoint_spider(self, spider):
+        """Snapshot the spider state (on the reactor thread) and save a checkpoint"""
+        self._spider_state = spider.get_state()
+        self._save_checkpoint()
+
+    def _save_checkpoint(self):
+        """Write the latest spider snapshot and the extraction state to the checkpoint"""
+        if not self._checkpoint:
+            return
+        with self._results_lock:
+            state = {
+                'spider': self._spider_state,
+                'extracted_urls': list(self.extracted_urls),
+                'pending_extractions': list(self._pending_extractions.values()),
+                'output_path': getattr(self._sink, 'path', None),
+            }
+            self._last_checkpoint = time.time()
+        try:
+            self._checkpoint.save(state)
+        except Exception as e:
+            self.logger.error(f"Error saving checkpoint: {str(e)}")
+
+    def _maybe_save_checkpoint(self):
+        """Save a checkpoint from an extraction worker if the checkpoint interval has elapsed"""
+        if self._checkpoint and time.time() - self._last_checkpoint >= self._checkpoint.interval:
+            self._save_checkpoint()
+
+    def _consume_article_queue(self, max_in_flight):
+        """
+        Extract the search results leased from the shared article queue (on its own thread)
+
+        Runs during the crawl, then until no article is left once the crawl is finished.
+
+        Args:
+            max_in_flight (int): Maximum number of leased articles waiting on the workers
+        """
+        self.logger.info("Extracting articles from the shared work queue...")
+        in_flight = threading.BoundedSemaphore(max_in_flight)
+        leased = 0
+        while True:
+            in_flight.acquire()
+            job = self._work_queue.lease(ARTICLE_TOPIC)
+            if job is None:
+                in_flight.release()
+                crawling = not self._crawl_finished.is_set()
+                if not crawling and not self._work_queue.has_unfinished(ARTICLE_TOPIC):
+                    break
+                # New articles arrive while the crawl runs; articles leased by dead nodes come back later
+                self._crawl_finished.wait(1) if crawling else time.sleep(5)
+                continue
+            leased += 1
+            search_result = job.payload
+            if search_result['link'] in self.extracted_urls:
+                self._work_queue.ack(job.id)
+                in_flight.release()
+                continue
+            with self._results_lock:
+                self._pending_extractions[search_result['link']] = search_result
+            self._extraction_executor.submit(self._extract_leased_article, job, in_flight)
+        self.logger.info(f"Article queue drained after leasing {leased} articles")
+
+    def _extract_leased_article(self, job, in_flight):
+        """
+        Extract a leased article and acknowledge it (called on an extraction worker thread)
+
+        A failed extraction is handed back to the queue for another attempt, on any node;
+        its fallback result is only written on the last attempt.
+        """
+        retry = job.attempts < getattr(self._work_queue, 'max_attempts', 1)
+        try:
+            status = self._extract_content(job.payload, retry_failures=retry)
+            if status in SUCCESSFUL_STATUSES or not retry:
+                self._work_queue.ack(job.id)
+            else:
+                self._work_queue.nack(job.id, delay=60)
+        except Exception as e:
+            self.logger.error(f"Error extracting queued article {job.payload.get('link')}: {str(e)}")
+            self._work_queue.nack(job.id, delay=60)
+        finally:
+            in_flight.release()
+
+    def _submit_extraction(self, search_result):
+        """Queue a search result on the extraction workers"""
+        with self._results_lock:
+            self._pending_extractions[search_result['link']] = search_result
+        self._extraction_executor.submit(self._extract_content, search_result)
+
     def _item_scraped(self, item, response, spider):
         """
         Callback function for scrapy signal when an item is scraped
         """
         search_result = dict(item)
-        self.search_results.append(search_result)
-        # Process with content scraper if available
-        if self._content_extractor:
-            try:
-                # Get the extractor details
-                extractor = self._content_extractor['extractor']
-                method_name = self._content_extractor['method']
-                extra_kwargs = self._content_extractor['kwargs']
-                
-                # Call the method dynamically
-                method = getattr(extractor, method_name)
+        with self._results_lock:
+            self.search_results.append(search_result)
+        # Share the result with the other nodes through the work queue
+        if self._distribute_articles:
+            self._work_queue.put(ARTICLE_TOPIC, search_result, key=search_result['link'])
+            return
+        # Hand the result over to the extraction workers if a content extractor is available
+        if self._content_extractor and self._extraction_executor:
+            if search_result['link'] in self.extracted_urls:
+                self.logger.info(f"Skipping already extracted URL: {search_result['link']}")
+                return
+            self._submit_extraction(search_result)
+
+    def _extract_content(self, search_result, retry_failures=False):
+        """
+        Run the content extractor on a search result (called on an extraction worker thread)
+
+        Args:
+            search_result (dict): Search result to extract
+            retry_failures (bool): Leave a failed result unwritten and out of extracted_urls,
+                so the URL can be extracted again
+
+        Returns:
+            str: 'extracted', 'duplicate', 'failed', 'skipped', 'empty' or 'error'
+        """
+        status = 'error'
+        try:
+            # Get the extractor details
+            extractor = self._content_extractor['extractor']
+            method_name = self._content_extractor['method']
+            extra_kwargs = self._content_extractor['kwargs']
+            
+            # Call the method dynamically
+            method = getattr(extractor, method_name)
 
-                # Call the extractor method with the search result and any additional kwargs
+            # Call the extractor method with the search result and any additional kwargs
+            with metrics.timer('stage_seconds', stage='article_total'):
                 content_data = method(search_result, **extra_kwargs)
+            
+            if content_data:
+                # Extractors without an outcome flag only return content they extracted
+                status = content_data.pop('extraction_status', 'extracted')
+                metrics.inc('articles_total', status=status)
+                if status == 'duplicate':
+                    self.logger.info(f"Dropped near-duplicate {search_result['link']} "
+                                     f"(duplicate of {content_data.get('duplicate_of')})")
+                elif status in SUCCESSFUL_STATUSES or not retry_failures:
+                    self._collect_content(content_data)
+                # Failed and skipped URLs stay eligible for a later run
+                if status in SUCCESSFUL_STATUSES and self._seen_store is not None:
+                    self._seen_store.add(search_result['link'])
+            else:
+                status = 'empty'
+                metrics.inc('articles_total', status='empty')
+                self.logger.warning(f"Failed to extract content from: {search_result['link']}")
                 
-                if content_data:
-                    self.content_results.append(content_data)
-                else:
-                    self.logger.warning(f"Failed to extract content from: {search_result['link']}")
-                    
-            except Exception as e:
-                self.logger.error(f"Error extracting content from {search_result['link']}: {str(e)}")
\ No newline at end of file
+        except Exception as e:
+            metrics.inc('articles_total', status='error')
+            self.logger.error(f"Error extracting content from {search_result['link']}: {str(e)}")
+        finally:
+            with self._results_lock:
+                self._pending_extractions.pop(search_result['link'], None)
+                if status in SUCCESSFUL_STATUSES or not retry_failures:
+                    self.extracted_urls.add(search_result['link'])
+            self._maybe_save_checkpoint()
+        return status
\ No newline at end of file
@@ -1,24 +1,52 @@
 import logging
 import time
+import random
 from importlib import import_module
+from urllib.parse import urlparse, parse_qs
 from scrapy import signals
+from scrapy.exceptions import NotConfigured, DontCloseSpider, IgnoreRequest
 from scrapy.http import HtmlResponse
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred
+from twisted.internet.threads import deferToThread
 from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
 
+from utils.selenium_utils import get_browser_manager
+from utils.response_cache import ResponseCache
+from utils.identity_pool import IdentityPool
+from utils.metrics import metrics
+from utils.readiness import PageReadiness
+from google_crawler.captcha import CaptchaBlocked, ManualCaptchaSolver, detect_captcha
+from google_crawler.serp_parser import parse_serp
+from google_crawler.exceptions import PageCancelled, RequestParked
+
 class SeleniumMiddleware:
-    """Scrapy middleware handling the requests using selenium"""
+    """
+    Scrapy middleware handling the requests using selenium
+
+    Pages are rendered on the reactor thread pool with drivers leased from the
+    process-wide BrowserManager, so other downloads keep moving while a browser renders.
+    """
 
-    def __init__(self, driver_factory, wait_time, headless):
-        """Initialize the selenium webdriver"""
+    def __init__(self, driver_factory, wait_time, headless, pool_size=1, max_pages_per_driver=50,
+                 max_memory_mb=0, readiness=('dom', 'network'), driver_options=None):
+        """Configure the shared browser pool (browsers are started lazily)"""
         self.logger = logging.getLogger(__name__)
         self.driver_factory = driver_factory
         self.headless = headless
-        self.wait_time = wait_time
-        self.driver = None
-        self.captcha_timeout = 300  # 5 minutes to solve CAPTCHA
+        self.wait_time = wait_time  # Deadline of the readiness conditions
+        self.readiness = list(readiness)  # Default readiness conditions, see utils.readiness.CONDITIONS
+        self.browsers = get_browser_manager()
+        self.browsers.configure(
+            driver_factory=driver_factory,
+            headless=headless,
+            max_browsers=pool_size,
+            max_pages=max_pages_per_driver,
+            max_memory_mb=max_memory_mb,
+            performance_log='network' in self.readiness,
+            driver_options=driver_options or {}
+        )
 
     @classmethod
     def from_crawler(cls, crawler):
@@ -36,129 +64,89 @@ class SeleniumMiddleware:
         # Get wait time from settings
         wait_time = crawler.settings.get('SELENIUM_DRIVER_WAIT_TIME', 2)
         headless = crawler.settings.getbool('SELENIUM_HEADLESS', False)  # Default to visible browser
+        pool_size = crawler.settings.getint('SELENIUM_POOL_SIZE', 1)
+        max_pages_per_driver = crawler.settings.getint('SELENIUM_MAX_PAGES_PER_DRIVER', 50)
+        max_memory_mb = crawler.settings.getint('SELENIUM_MAX_MEMORY_MB', 0)
+        readiness = crawler.settings.getlist('SELENIUM_READINESS', ['dom', 'network'])
+        driver_options = {
+            'profile': crawler.settings.get('SELENIUM_BROWSER_PROFILE', 'full'),
+            'user_data_dir': crawler.settings.get('SELENIUM_USER_DATA_DIR'),
+            'block_images': crawler.settings.getbool('SELENIUM_BLOCK_IMAGES', True),
+            'block_css': crawler.settings.getbool('SELENIUM_BLOCK_CSS', True),
+        }
         
         # Create middleware instance
-        middleware = cls(driver_factory, wait_time, headless)
-        
-        # Connect to the spider_closed signal
-        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
-        
-        return middleware
-    
-    def init_driver(self):
-        """Initialize the driver if it doesn't exist yet"""
-        if self.driver is None:
-            self.logger.info("Initializing Selenium WebDriver")
-            self.driver = self.driver_factory(headless=self.headless)
+        return cls(driver_factory, wait_time, headless, pool_size, max_pages_per_driver, max_memory_mb,
+                   readiness, driver_options)
     
-    def detect_captcha(self):
-        """Check if the current page contains a CAPTCHA"""
-        captcha_indicators = [
-            "//form[@action='/sorry']",  # Google's CAPTCHA/sorry page
-            "//div[contains(text(), 'captcha')]",
-            "//input[@id='captcha']",
-            "//img[contains(@src, 'captcha')]",
-            "//div[contains(@class, 'g-recaptcha')]",
-            "//iframe[contains(@src, 'recaptcha')]",
-            "//textarea[@id='g-recaptcha-response']"
-        ]
-        
-        for indicator in captcha_indicators:
-            try:
-                elements = self.driver.find_elements(By.XPATH, indicator)
-                if elements:
-                    return True
-            except:
-                pass
-        return False
-
-    def handle_captcha(self):
-        """Handle CAPTCHA by waiting for user to solve it manually"""
-        self.logger.warning("CAPTCHA detected! Please solve it manually.")
-        print("\n" + "="*60)
-        print("CAPTCHA DETECTED! Please solve it in the browser window.")
-        print("You have {} minutes to solve the CAPTCHA.".format(self.captcha_timeout // 60))
-        print("The crawler will continue automatically once the CAPTCHA is solved.")
-        print("="*60 + "\n")
-        
-        # Wait for the CAPTCHA to be solved (checking every 5 seconds)
-        start_time = time.time()
-        while time.time() - start_time < self.captcha_timeout:
-            if not self.detect_captcha():
-                print("\nCAPTCHA solved! Continuing crawl...\n")
-                self.logger.info("CAPTCHA solved. Continuing crawl.")
-                # Additional safety wait after CAPTCHA solution
-                time.sleep(3)
-                return True
-            time.sleep(5)
-            
-        self.logger.error("CAPTCHA not solved within timeout period.")
-        return False
-
     def process_request(self, request, spider):
-        """Process a request using the selenium driver if applicable"""
+        """Process a request using a pooled selenium driver if applicable"""
         # Skip if not selenium request
         if not request.meta.get('selenium'):
             return None
 
-        # Initialize driver if not already done
-        self.init_driver()
-        
-        # Set default headers for driver if needed (user agent)
-        if request.headers:
-            for key, value in request.headers.items():
-                key_str = key.decode('utf-8').lower()
-                if key_str == 'user-agent':
-                    # Handle various forms of header values
-                    user_agent = None
-                    if isinstance(value, list) and value:
-                        user_agent = value[0].decode('utf-8') if isinstance(value[0], bytes) else str(value[0])
-                    elif isinstance(value, bytes):
-                        user_agent = value.decode('utf-8')
-                    else:
-                        user_agent = str(value)
-                    
-                    if user_agent:
-                        self.driver.execute_cdp_cmd(
-                            'Network.setUserAgentOverride',
-                            {'userAgent': user_agent}
-                        )
-
-        # Open the URL in the browser
-        self.driver.get(request.url)
-        
-        # Wait for the specified amount of time
-        wait_time = request.meta.get('wait_time', self.wait_time)
+        # Render in a reactor worker thread; Scrapy waits on the returned Deferred
+        return deferToThread(self._render_request, request)
+
+    def _render_request(self, request):
+        """Render a request with a leased driver (runs outside the reactor thread)"""
+        with self.browsers.lease() as driver:
+            # Set default headers for driver if needed (user agent)
+            if request.headers:
+                for key, value in request.headers.items():
+                    key_str = key.decode('utf-8').lower()
+                    if key_str == 'user-agent':
+                        # Handle various forms of header values
+                        user_agent = None
+                        if isinstance(value, list) and value:
+                            user_agent = value[0].decode('utf-8') if isinstance(value[0], bytes) else str(value[0])
+                        elif isinstance(value, bytes):
+                            user_agent = value.decode('utf-8')
+                        else:
+                            user_agent = str(value)
+                        
+                        if user_agent:
+                            driver.execute_cdp_cmd(
+                                'Network.setUserAgentOverride',
+                                {'userAgent': user_agent}
+                            )
+
+            # Longest wait for the page to be usable
+            wait_time = request.meta.get('wait_time', self.wait_time)
+            readiness = None
+            if not request.meta.get('wait_until'):
+                readiness = PageReadiness.from_names(request.meta.get('readiness', self.readiness),
+                                                     timeout=wait_time, logger=self.logger)
+                readiness.prepare(driver)
+
+            # Open the URL in the browser
+            driver.get(request.url)
+                
+            # Check for wait_until condition
+            if request.meta.get('wait_until'):
+                try:
+                    WebDriverWait(driver, wait_time).until(
+                        request.meta['wait_until']
+                    )
+                except TimeoutException:
+                    self.logger.warning(f"Timeout waiting for condition at URL: {request.url}")
+            else:
+                # Return as soon as the page is usable rather than after a fixed sleep
+                states = readiness.wait(driver)
+                if 'ready' not in states.values():
+                    self.logger.warning(f"Page not ready after {wait_time}s at URL: {request.url} ({states})")
             
-        # Check for wait_until condition
-        if request.meta.get('wait_until'):
-            try:
-                WebDriverWait(self.driver, wait_time).until(
-                    request.meta['wait_until']
-                )
-            except TimeoutException:
-                self.logger.warning(f"Timeout waiting for condition at URL: {request.url}")
-        else:
-            # If no condition is specified, just wait
-            time.sleep(wait_time)
-        
-        # Check for CAPTCHA
-        if self.detect_captcha():
-            captcha_solved = self.handle_captcha()
-            if not captcha_solved:
-                self.logger.error(f"Failed to solve CAPTCHA for URL: {request.url}")
-                # Return an empty response if CAPTCHA wasn't solved
-                return HtmlResponse(
-                    request.url,
-                    body=b"<html><body><p>CAPTCHA timeout</p></body></html>",
-                    encoding='utf-8',
-                    request=request,
-                    status=403
-                )
-        
-        # Get page source and create response
-        body = self.driver.page_source.encode('utf-8')
-        current_url = self.driver.current_url
+            # A CAPTCHA page is returned as is: the CaptchaMiddleware parks the request
+            # and the throttle and identity middlewares treat it as a block signal
+            if detect_captcha(driver):
+                request.meta['captcha_detected'] = True
+                metrics.inc('captchas_total', source='selenium')
+                self.logger.warning(f"CAPTCHA in the browser for URL: {request.url}, replacing the browser")
+                self.browsers.retire(driver)
+            
+            # Get page source and create response
+            body = driver.page_source.encode('utf-8')
+            current_url = driver.current_url
         
         # Create the response
         response = HtmlResponse(
@@ -170,8 +158,638 @@ class SeleniumMiddleware:
         
         return response
 
+
+class SerpCacheMiddleware:
+    """
+    Scrapy middleware serving Google result pages from a persistent cache
+
+    Pages are keyed by keyword, page index and the hl/gl locale parameters, so a
+    keyword crawled within the freshness window is answered from disk and parse()
+    runs against the stored HTML without sending a request to Google.
+    """
+
+    def __init__(self, cache, ttl, stats=None):
+        """Initialize the middleware with a ResponseCache and a freshness window in seconds"""
+        self.logger = logging.getLogger(__name__)
+        self.cache = cache
+        self.ttl = ttl
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        """Initialize the middleware with the crawler settings"""
+        if not crawler.settings.getbool('SERP_CACHE_ENABLED'):
+            raise NotConfigured('SERP cache is disabled')
+
+        ttl = crawler.settings.getfloat('SERP_CACHE_TTL', 6 * 3600)
+        cache = ResponseCache(
+            cache_dir=crawler.settings.get('SERP_CACHE_DIR', 'cache/serp'),
+            ttl=ttl,
+            max_size_mb=crawler.settings.getfloat('SERP_CACHE_MAX_SIZE_MB', 256)
+        )
+        middleware = cls(cache, ttl, crawler.stats)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    @staticmethod
+    def make_key(request):
+        """Build the cache key of a SERP request, or None for requests that are not SERP pages"""
+        keyword = request.meta.get('keyword')
+        page = request.meta.get('page')
+        if keyword is None or page is None:
+            return None
+
+        query = parse_qs(urlparse(request.url).query)
+        hl = query.get('hl', [''])[0]
+        gl = query.get('gl', [''])[0]
+        return f"serp:{keyword}|{page}|{hl}|{gl}"
+
+    @staticmethod
+    def is_captcha_response(response):
+        """Check whether a response is Google's CAPTCHA/sorry page instead of results"""
+        return '/sorry/' in response.url or b'g-recaptcha' in response.body
+
+    def _inc_stat(self, key):
+        if self.stats:
+            self.stats.inc_value(f'serp_cache/{key}')
+        if key in ('hit', 'miss'):
+            metrics.inc('cache_requests_total', cache='serp', result=key)
+
+    def process_request(self, request, spider):
+        """Answer SERP requests from the cache when a fresh copy exists"""
+        key = self.make_key(request)
+        if key is None or request.meta.get('serp_cache_skip'):
+            return None
+
+        body = self.cache.lookup(key, ttl=self.ttl)
+        if body is None:
+            self._inc_stat('miss')
+            return None
+
+        self._inc_stat('hit')
+        self.logger.info(f"Serving page {request.meta['page'] + 1} for '{request.meta['keyword']}' from SERP cache")
+        return HtmlResponse(
+            request.url,
+            body=body.encode('utf-8'),
+            encoding='utf-8',
+            request=request,
+            flags=['serp_cache']
+        )
+
+    def process_response(self, request, response, spider):
+        """
+        Store fresh SERP pages that contain results
+
+        Consent pages, empty result pages and other answers without a result block
+        are not cached. The parsed page is kept in the request meta for parse().
+        """
+        key = self.make_key(request)
+        request.meta.pop('serp_page', None)  # Parsed from an earlier attempt of the request
+        if (key is not None and 'serp_cache' not in response.flags
+                and response.status == 200 and isinstance(response, HtmlResponse)
+                and not self.is_captcha_response(response)):
+            with metrics.timer('stage_seconds', stage='serp_parse'):
+                serp_page = parse_serp(response.body)
+            request.meta['serp_page'] = serp_page
+            if serp_page.block_count > 0:
+                self.cache.store(key, response.text)
+                self._inc_stat('store')
+            else:
+                self._inc_stat('skip_no_results')
+        return response
+
     def spider_closed(self):
-        """Shutdown the driver when spider is closed"""
-        if self.driver:
-            self.logger.info("Closing Selenium WebDriver")
-            self.driver.quit()
\ No newline at end of file
+        """Log the cache counters and close the index when spider is closed"""
+        self.logger.info(f"SERP cache: {self.cache.stats()}")
+        self.cache.close()
+
+
+class SerpPageCutoffMiddleware:
+    """
+    Scrapy middleware cancelling result pages requested up front that are no longer needed
+
+    With offset pagination every page of a keyword is queued at once. Once the keyword
+    reached its target number of results, or an earlier page came back empty, the
+    spider reports its remaining pages as obsolete and they are dropped here before
+    being sent to Google.
+    """
+
+    def __init__(self, stats=None):
+        self.logger = logging.getLogger(__name__)
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        """Initialize the middleware with the crawler stats"""
+        return cls(crawler.stats)
+
+    def process_request(self, request, spider):
+        """Drop obsolete result pages"""
+        if not request.meta.get('serp_page_cutoff') or not hasattr(spider, 'is_page_obsolete'):
+            return None
+        if spider.is_page_obsolete(request):
+            if self.stats:
+                self.stats.inc_value('serp/pages_cancelled')
+            self.logger.debug(f"Cancelling page {request.meta['page'] + 1} for '{request.meta['keyword']}'")
+            raise PageCancelled(f"Page no longer needed: {request.url}")
+        return None
+
+
+class AdaptiveThrottleMiddleware:
+    """
+    Scrapy middleware pacing Google requests with an AIMD token bucket
+
+    Requests wait for a token, refilled at `rate` tokens per second, and for a free
+    slot in a concurrency window. Every clean answer grows the rate additively and the
+    window by 1/window; a block signal (429, 403, CAPTCHA or a redirect to Google's
+    /sorry/ page) multiplies both by `decrease` and holds them there for `cooldown`
+    seconds, so a burst of blocked in-flight responses only backs off once.
+    Only SERP requests (with 'keyword' and 'page' meta) are paced; pages served
+    from the SERP cache are ignored.
+
+    The current rate and window are published in the crawler stats as
+    adaptive_throttle/rate and adaptive_throttle/concurrency.
+    """
+
+    BLOCK_STATUSES = (403, 429)
+
+    def __init__(self, start_rate=0.5, min_rate=0.05, max_rate=2.0, increase=0.02, decrease=0.5,
+                 max_concurrency=4, cooldown=30, stats=None):
+        """
+        Initialize the throttle
+
+        Args:
+            start_rate (float): Initial requests per second
+            min_rate (float): Lowest requests per second after backing off
+            max_rate (float): Highest requests per second
+            increase (float): Requests per second added after each clean answer
+            decrease (float): Factor applied to the rate and window on a block signal
+            max_concurrency (int): Largest number of SERP requests in flight
+            cooldown (float): Seconds after a back-off without any further change
+            stats: Scrapy stats collector receiving the metrics
+        """
+        self.logger = logging.getLogger(__name__)
+        self.rate = float(start_rate)
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        self.increase = float(increase)
+        self.decrease = float(decrease)
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.cooldown = float(cooldown)
+        self.stats = stats
+
+        self.window = 1.0  # Concurrency window, grown up to max_concurrency
+        self.tokens = 1.0
+        self.in_flight = 0
+        self._last_refill = time.monotonic()
+        self._hold_until = 0  # End of the cooldown after the last back-off
+        self._waiters = []  # Deferreds of the requests waiting for a token
+        self._timer = None
+        self._closed = False
+        self._publish()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        """Initialize the middleware with the crawler settings"""
+        settings = crawler.settings
+        if not settings.getbool('ADAPTIVE_THROTTLE_ENABLED'):
+            raise NotConfigured('Adaptive throttle is disabled')
+        middleware = cls(
+            start_rate=settings.getfloat('ADAPTIVE_THROTTLE_START_RATE', 0.5),
+            min_rate=settings.getfloat('ADAPTIVE_THROTTLE_MIN_RATE', 0.05),
+            max_rate=settings.getfloat('ADAPTIVE_THROTTLE_MAX_RATE', 2.0),
+            increase=settings.getfloat('ADAPTIVE_THROTTLE_INCREASE', 0.02),
+            decrease=settings.getfloat('ADAPTIVE_THROTTLE_DECREASE', 0.5),
+            max_concurrency=settings.getint('ADAPTIVE_THROTTLE_MAX_CONCURRENCY', 4),
+            cooldown=settings.getfloat('ADAPTIVE_THROTTLE_COOLDOWN', 30),
+            stats=crawler.stats
+        )
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    @staticmethod
+    def update_settings(settings):
+        """
+        Hand the pacing over to the throttle if it is enabled (before the crawler is built)
+
+        The fixed DOWNLOAD_DELAY and AutoThrottle are turned off and CONCURRENT_REQUESTS is
+        raised to the largest window. Values set with a higher priority than the project
+        settings, e.g. overrides given to GoogleCrawler.run, are kept.
+        """
+        if not settings.getbool('ADAPTIVE_THROTTLE_ENABLED'):
+            return
+        settings.set('DOWNLOAD_DELAY', 0, priority='project')
+        settings.set('AUTOTHROTTLE_ENABLED', False, priority='project')
+        settings.set('CONCURRENT_REQUESTS', max(settings.getint('CONCURRENT_REQUESTS'),
+                                                settings.getint('ADAPTIVE_THROTTLE_MAX_CONCURRENCY', 4)),
+                     priority='project')
+
+    @staticmethod
+    def is_serp_request(request):
+        return request.meta.get('keyword') is not None and request.meta.get('page') is not None
+
+    @staticmethod
+    def is_block_response(request, response):
+        """Check whether Google answered with a rate limit, a ban or a CAPTCHA"""
+        if response.status in AdaptiveThrottleMiddleware.BLOCK_STATUSES or request.meta.get('captcha_detected'):
+            return True
+        if response.status in (301, 302, 303, 307) and b'/sorry/' in response.headers.get('Location', b''):
+            return True
+        return isinstance(response, HtmlResponse) and SerpCacheMiddleware.is_captcha_response(response)
+
+    def _publish(self):
+        if self.stats:
+            self.stats.set_value('adaptive_throttle/rate', round(self.rate, 4))
+            self.stats.set_value('adaptive_throttle/concurrency', round(self.window, 2))
+
+    def _refill(self):
+        now = time.monotonic()
+        # A single token at most, so an idle period does not allow a burst
+        self.tokens = min(1.0, self.tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def _dispatch(self):
+        """Release the waiting requests allowed by the bucket and the window"""
+        self._refill()
+        while self._waiters and self.tokens >= 1 and self.in_flight < int(self.window):
+            self.tokens -= 1
+            self.in_flight += 1
+            self._waiters.pop(0).callback(None)
+
+        if self._waiters and self.tokens < 1 and self._timer is None:
+            # Wake up when the next token is available; a full window waits for a response instead
+            delay = (1 - self.tokens) / self.rate
+            self._timer = reactor.callLater(delay, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+    def process_request(self, request, spider):
+        """Make SERP requests wait for a token and a free slot"""
+        if not self.is_serp_request(request):
+            return None
+        if self._closed:
+            raise IgnoreRequest('Spider closed while waiting for the adaptive throttle')
+        request.meta['adaptive_throttle_slot'] = True
+        waiter = Deferred()
+        self._waiters.append(waiter)
+        self._dispatch()
+        return waiter
+
+    def _release(self, request):
+        if request.meta.pop('adaptive_throttle_slot', False):
+            self.in_flight = max(0, self.in_flight - 1)
+            self._dispatch()
+
+    def process_response(self, request, response, spider):
+        """Adapt the rate to the answer of a SERP request"""
+        if 'serp_cache' in response.flags or 'captcha_solved' in response.flags or not self.is_serp_request(request):
+            return response
+
+        if self.is_block_response(request, response):
+            self._back_off(request, response.status)
+        elif time.monotonic() >= self._hold_until:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+            self.window = min(self.max_concurrency, self.window + 1 / self.window)
+            self._publish()
+        self._release(request)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        """Free the slot of a request that failed"""
+        self._release(request)
+        return None
+
+    def _back_off(self, request, status):
+        """Cut the rate and window after a block signal, once per cooldown"""
+        if self.stats:
+            self.stats.inc_value('adaptive_throttle/blocked')
+        metrics.inc('block_signals_total', status=status)
+        now = time.monotonic()
+        if now < self._hold_until:
+            return
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        self.window = max(1.0, self.window * self.decrease)
+        self.tokens = min(self.tokens, 0.0)
+        self._hold_until = now + self.cooldown
+        self._publish()
+        self.logger.warning(f"Google block signal ({status}) for '{request.meta.get('keyword')}', "
+                            f"backing off to {self.rate:.3f} requests/s, {int(self.window)} in flight")
+
+    def spider_closed(self, spider):
+        """Stop the timer and drop the requests still waiting, so they do not hold up the shutdown"""
+        self._closed = True
+        if self._timer is not None and self._timer.active():
+            self._timer.cancel()
+        self._timer = None
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            waiter.errback(IgnoreRequest('Spider closed while waiting for the adaptive throttle'))
+
+
+class IdentityMiddleware:
+    """
+    Scrapy middleware sending each SERP request as one identity of an IdentityPool
+
+    The identity sets the cookie jar (meta['cookiejar']), the user agent, the proxy
+    (meta['proxy']) and the download slot (meta['download_slot']), so every identity
+    has its own cookies and its own Scrapy slot. Requests wait while every identity
+    is busy or quarantined; an identity answered with a CAPTCHA or a ban is
+    quarantined by the pool.
+    """
+
+    def __init__(self, pool, stats=None):
+        self.logger = logging.getLogger(__name__)
+        self.pool = pool
+        self.stats = stats
+        self._waiters = []  # (Deferred, request) waiting for an identity
+        self._timer = None
+        self._closed = False
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        """Initialize the middleware with the crawler settings"""
+        settings = crawler.settings
+        if not settings.getbool('IDENTITY_POOL_ENABLED'):
+            raise NotConfigured('Identity pool is disabled')
+        proxies = settings.getlist('IDENTITY_PROXIES')
+        size = settings.getint('IDENTITY_POOL_SIZE', len(proxies))
+        if size > max(1, len(set(proxies))):
+            logging.getLogger(__name__).warning(f"{size} identities share {len(set(proxies))} proxies: "
+                                                f"identities behind the same IP are easily linked")
+        pool = IdentityPool(
+            size=size,
+            proxies=proxies,
+            user_agents=settings.getlist('IDENTITY_USER_AGENTS'),
+            concurrency=settings.getint('IDENTITY_CONCURRENCY', 1),
+            cooldown=settings.getfloat('IDENTITY_QUARANTINE', 600),
+            max_cooldown=settings.getfloat('IDENTITY_MAX_QUARANTINE', 3600)
+        )
+        middleware = cls(pool, crawler.stats)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    def _assign(self, request, identity):
+        request.meta['identity'] = identity.id
+        request.meta['cookiejar'] = identity.cookiejar
+        request.meta['download_slot'] = identity.download_slot
+        if identity.proxy:
+            request.meta['proxy'] = identity.proxy
+        request.headers['User-Agent'] = identity.user_agent
+        if self.stats:
+            self.stats.inc_value(f'identity/{identity.id}/requests')
+
+    def _dispatch(self):
+        """Hand the free identities to the waiting requests"""
+        while self._waiters:
+            identity = self.pool.acquire()
+            if identity is None:
+                break
+            waiter, request = self._waiters.pop(0)
+            self._assign(request, identity)
+            waiter.callback(None)
+
+        if self._waiters and self._timer is None:
+            # Every identity busy: a response wakes us up; every identity quarantined: the timer does
+            delay = self.pool.next_available_in()
+            if delay > 0:
+                self._timer = reactor.callLater(delay, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+    def process_request(self, request, spider):
+        """Give SERP requests an identity, waiting for one if needed"""
+        if not AdaptiveThrottleMiddleware.is_serp_request(request):
+            return None
+        if self._closed:
+            raise IgnoreRequest('Spider closed while waiting for an identity')
+        request.meta.pop('identity', None)
+        identity = self.pool.acquire()
+        if identity is not None:
+            self._assign(request, identity)
+            return None
+        waiter = Deferred()
+        self._waiters.append((waiter, request))
+        self._dispatch()
+        return waiter
+
+    def _release(self, request, blocked=False):
+        identity_id = request.meta.pop('identity', None)
+        if identity_id is None:
+            return
+        self.pool.release(self.pool.identities[identity_id], blocked=blocked)
+        if blocked and self.stats:
+            self.stats.inc_value('identity/quarantined')
+            self.stats.set_value('identity/quarantined_now', self.pool.quarantined())
+        self._dispatch()
+
+    def process_response(self, request, response, spider):
+        """Quarantine the identity if Google blocked it"""
+        if 'serp_cache' not in response.flags:
+            self._release(request, blocked=AdaptiveThrottleMiddleware.is_block_response(request, response))
+        return response
+
+    def process_exception(self, request, exception, spider):
+        """Free the identity of a request that failed"""
+        self._release(request)
+        return None
+
+    def spider_closed(self, spider):
+        """Stop the timer and drop the requests still waiting, so they do not hold up the shutdown"""
+        self._closed = True
+        if self._timer is not None and self._timer.active():
+            self._timer.cancel()
+        self._timer = None
+        waiters, self._waiters = self._waiters, []
+        for waiter, _ in waiters:
+            waiter.errback(IgnoreRequest('Spider closed while waiting for an identity'))
+
+
+class CaptchaMiddleware:
+    """
+    Scrapy middleware parking SERP requests answered with a CAPTCHA or a block
+
+    Nothing waits for the CAPTCHA to go away: the request leaves the crawl and is
+    scheduled again after an exponential backoff (`retry_delay` doubled on each
+    attempt, jittered, capped at `max_delay`) while the other keywords keep crawling.
+    The identity that was blocked is quarantined by the IdentityMiddleware and a
+    blocked browser is replaced by the SeleniumMiddleware. After `max_retries`
+    parked attempts the request fails with CaptchaBlocked and the spider gives up
+    the page.
+
+    With `manual_solve`, one parked URL at a time is also opened in a browser on a
+    worker thread where someone can solve the CAPTCHA; the solved page then answers
+    the parked request straight away.
+    """
+
+    def __init__(self, crawler, retry_delay=60, max_delay=900, max_retries=5, manual_solve=False,
+                 solve_timeout=300):
+        """
+        Initialize the middleware
+
+        Args:
+            crawler: Scrapy crawler, whose engine receives the requests coming out of the park
+            retry_delay (float): Seconds before the first retry of a blocked request
+            max_delay (float): Longest delay between two retries
+            max_retries (int): Parked retries before the request fails with CaptchaBlocked
+            manual_solve (bool): Offer the blocked pages for manual solving in a browser
+            solve_timeout (float): Seconds given to solve a CAPTCHA manually
+        """
+        self.logger = logging.getLogger(__name__)
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.retry_delay = float(retry_delay)
+        self.max_delay = float(max_delay)
+        self.max_retries = int(max_retries)
+        self.solver = ManualCaptchaSolver(get_browser_manager(), timeout=solve_timeout,
+                                          logger=self.logger) if manual_solve else None
+        self._parked = {}  # Key -> [request to send again, DelayedCall of its retry or None while being solved]
+        self._next_key = 0
+        self._solving = None  # Key of the request offered for manual solving
+        self._offered = set()  # Keys already offered, each page is offered once
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        """Initialize the middleware with the crawler settings"""
+        settings = crawler.settings
+        if not settings.getbool('CAPTCHA_RETRY_ENABLED'):
+            raise NotConfigured('CAPTCHA retries are disabled')
+        manual_solve = settings.getbool('CAPTCHA_MANUAL_SOLVE', False)
+        if manual_solve and settings.getbool('SELENIUM_HEADLESS', False):
+            logging.getLogger(__name__).warning("CAPTCHA_MANUAL_SOLVE with headless browsers: "
+                                                "pages are reloaded but nobody can see them")
+        middleware = cls(
+            crawler,
+            retry_delay=settings.getfloat('CAPTCHA_RETRY_DELAY', 60),
+            max_delay=settings.getfloat('CAPTCHA_RETRY_MAX_DELAY', 900),
+            max_retries=settings.getint('CAPTCHA_MAX_RETRIES', 5),
+            manual_solve=manual_solve,
+            solve_timeout=settings.getfloat('CAPTCHA_SOLVE_TIMEOUT', 300)
+        )
+        crawler.signals.connect(middleware.spider_idle, signal=signals.spider_idle)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    @staticmethod
+    def update_settings(settings):
+        """
+        Keep the RetryMiddleware away from block statuses when blocked pages are parked
+
+        Called on the project settings before the crawler is built. Retrying a 403 or a
+        429 straight away only hits Google a second time and counts the block twice
+        against the throttle before the request is parked anyway.
+        """
+        if not settings.getbool('CAPTCHA_RETRY_ENABLED'):
+            return
+        codes = [code for code in settings.getlist('RETRY_HTTP_CODES')
+                 if int(code) not in AdaptiveThrottleMiddleware.BLOCK_STATUSES]
+        settings.set('RETRY_HTTP_CODES', codes, priority=settings.getpriority('RETRY_HTTP_CODES'))
+
+    def process_request(self, request, spider):
+        """Answer a request coming out of the park with the page solved manually, if any"""
+        body = request.meta.pop('captcha_solved_body', None)
+        if body is None:
+            return None
+        return HtmlResponse(request.url, body=body.encode('utf-8'), encoding='utf-8',
+                            request=request, flags=['captcha_solved'])
+
+    def process_response(self, request, response, spider):
+        """Park blocked SERP requests instead of passing the block page to the spider"""
+        if ('serp_cache' in response.flags or 'captcha_solved' in response.flags
+                or not AdaptiveThrottleMiddleware.is_serp_request(request)
+                or not AdaptiveThrottleMiddleware.is_block_response(request, response)):
+            return response
+
+        attempt = request.meta.get('captcha_retries', 0)
+        keyword = request.meta['keyword']
+        page = request.meta['page'] + 1
+        if self.stats:
+            self.stats.inc_value('captcha/blocked')
+        if attempt >= self.max_retries:
+            if self.stats:
+                self.stats.inc_value('captcha/given_up')
+            raise CaptchaBlocked(f"Still blocked after {attempt} retries: page {page} of '{keyword}'")
+
+        key = self._next_key
+        self._next_key += 1
+        delay = min(self.max_delay, self.retry_delay * 2 ** attempt) * random.uniform(0.8, 1.2)
+        self._parked[key] = [self._retry_request(request, attempt + 1), reactor.callLater(delay, self._resume, key)]
+        if self.stats:
+            self.stats.inc_value('captcha/parked')
+            self.stats.set_value('captcha/parked_now', len(self._parked))
+        self.logger.warning(f"Blocked on page {page} of '{keyword}' ({response.status}), "
+                            f"retrying in {delay:.0f}s; {len(self._parked)} pages parked")
+
+        if self.solver and self._solving is None:
+            self._offer_for_solving(key)
+        raise RequestParked(f"Parked after a block: {request.url}")
+
+    def _retry_request(self, request, attempt):
+        """Copy of a blocked request for its next attempt, at its original URL"""
+        meta = {key: value for key, value in request.meta.items()
+                if key not in ('captcha_detected', 'redirect_urls', 'redirect_times', 'redirect_ttl',
+                               'redirect_reasons', 'retry_times', 'download_latency', 'download_slot',
+                               'identity', 'cookiejar', 'proxy', 'adaptive_throttle_slot', 'serp_page')}
+        meta['captcha_retries'] = attempt
+        url = request.meta.get('redirect_urls', [request.url])[0]
+        return request.replace(url=url, meta=meta, dont_filter=True)
+
+    def _resume(self, key, body=None):
+        """Send a parked request back to the scheduler"""
+        entry = self._parked.pop(key, None)
+        if entry is None:
+            return
+        retry, timer = entry
+        self._offered.discard(key)
+        if timer is not None and timer.active():
+            timer.cancel()
+        if body is not None:
+            retry.meta['captcha_solved_body'] = body
+        if self.stats:
+            self.stats.set_value('captcha/parked_now', len(self._parked))
+        self.crawler.engine.crawl(retry)
+
+    def _offer_for_solving(self, key):
+        """Open a parked page for manual solving; its retry waits for the outcome"""
+        retry, timer = self._parked[key]
+        if timer.active():
+            timer.cancel()
+        self._parked[key][1] = None
+        self._solving = key
+        self._offered.add(key)
+        deferred = deferToThread(self.solver.solve, retry.url)
+        deferred.addCallbacks(lambda body: self._solved(key, body),
+                              lambda failure: self._solved(key, None, failure))
+
+    def _solved(self, key, body, failure=None):
+        self._solving = None
+        if failure is not None:
+            self.logger.error(f"Manual CAPTCHA solving failed: {failure.getErrorMessage()}")
+        entry = self._parked.get(key)
+        if entry is not None:
+            if body is not None:
+                if self.stats:
+                    self.stats.inc_value('captcha/solved')
+                self._resume(key, body)
+            else:
+                entry[1] = reactor.callLater(self.retry_delay, self._resume, key)
+        # Offer the next parked page that is still waiting for its retry
+        waiting = [parked_key for parked_key in self._parked if parked_key not in self._offered]
+        if waiting:
+            self._offer_for_solving(waiting[0])
+
+    def spider_idle(self, spider):
+        """Keep the spider open while requests are parked"""
+        if self._parked:
+            raise DontCloseSpider
+
+    def spider_closed(self, spider):
+        for _, timer in self._parked.values():
+            if timer is not None and timer.active():
+                timer.cancel()
+        if self._parked:
+            self.logger.warning(f"{len(self._parked)} blocked pages were still parked when the spider closed")
+        self._parked.clear()
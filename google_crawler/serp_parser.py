@@ -0,0 +1,151 @@
+"""
+Parser of Google's basic HTML result pages
+
+The page is parsed with lxml and walked once: result blocks, their link, title and
+description, and the Next link are collected in the same traversal. Each field has a
+list of class names tried in order, so a renamed class can be handled by adding its
+new name. When a class is missing altogether the parser falls back on the structure
+of the basic page: the first text of the result link for the title, the paging link
+ending with '>' for the Next link, and the /url?q= redirect links that every result
+uses when no result block is found.
+
+The parser does not depend on Scrapy and also runs on HTML read from the SERP cache.
+"""
+from collections import namedtuple
+from urllib.parse import unquote
+
+from lxml import html as lxml_html
+
+# Class names of each part of a result, newest layout first
+RESULT_BLOCK_CLASSES = ('ezO2md',)
+TITLE_CLASSES = ('CVA68e',)
+DESCRIPTION_CLASSES = ('FrIlee',)
+NEXT_LINK_CLASSES = ('frGj1b',)
+
+# Tags whose classes are looked at
+PARSED_TAGS = frozenset(('div', 'a', 'span'))
+
+# A search result: cleaned target link, title and description
+SerpResult = namedtuple('SerpResult', ['link', 'title', 'description', 'raw_link'])
+
+# A parsed result page: the results, the href of the Next link and the number of result blocks found
+SerpPage = namedtuple('SerpPage', ['results', 'next_link', 'block_count'])
+
+def clean_result_link(href):
+    """Turn the /url?q=<target>&... redirect of a result into the target URL"""
+    return unquote(href.split("&")[0].replace("/url?q=", ""))
+
+def _classes(element):
+    value = element.get('class')
+    return value.split() if value else ()
+
+def _matches(classes, names):
+    return any(name in classes for name in names)
+
+def _descendant_text(element, top=True):
+    """Text nodes of the descendants of an element (not its own text), like the `*::text` selector"""
+    parts = []
+    for child in element:
+        if not isinstance(child.tag, str):
+            continue  # Comments and processing instructions
+        if child.text:
+            parts.append(child.text)
+        parts.extend(_descendant_text(child, top=False))
+        # Tails of direct children are text of the element itself
+        if child.tail and not top:
+            parts.append(child.tail)
+    return parts
+
+def _first_text(element):
+    """First non-blank text of an element, e.g. the title before the breadcrumb of a result link"""
+    for text in element.itertext():
+        if text.strip():
+            return text.strip()
+    return None
+
+def _join(parts):
+    return ' '.join(part.strip() for part in parts).strip()
+
+def parse_serp(page):
+    """
+    Parse a Google result page
+
+    Args:
+        page (str or bytes): HTML of the page
+
+    Returns:
+        SerpPage: The results (with a link and a title), the Next link href or None,
+            and the number of result blocks on the page
+    """
+    if not page or not page.strip():
+        return SerpPage([], None, 0)
+    root = lxml_html.fromstring(page)
+
+    results = []
+    block_count = 0
+    next_link = next_fallback = None
+    block = None  # Element of the result block being read
+    block_last = None  # Last descendant of the block, after which the block is complete
+    anchor = link = title = description = None
+
+    # root.iter() yields the elements in document order in one C-level traversal
+    for element in root.iter():
+        tag = element.tag
+        if tag in PARSED_TAGS:
+            classes = _classes(element)
+            if block is None:
+                if tag == 'div' and _matches(classes, RESULT_BLOCK_CLASSES):
+                    block = block_last = element
+                    while len(block_last):
+                        block_last = block_last[-1]
+                    anchor = link = title = description = None
+                elif tag == 'a' and next_link is None:
+                    href = element.get('href') or ''
+                    if _matches(classes, NEXT_LINK_CLASSES):
+                        next_link = href
+                    elif (next_fallback is None and href.startswith('/search') and 'start=' in href
+                          and _join(element.itertext()).endswith('>')):
+                        next_fallback = href
+            elif tag == 'a':
+                if link is None and element.get('href'):
+                    anchor = element
+                    link = element.get('href')
+            elif tag == 'span':
+                if title is None and _matches(classes, TITLE_CLASSES) and _inside_link(element, block):
+                    title = element.text
+                elif description is None and _matches(classes, DESCRIPTION_CLASSES):
+                    description = _join(_descendant_text(element))
+
+        if element is block_last:
+            block_count += 1
+            if link and title is None:
+                title = _first_text(anchor)
+            if link and title:
+                results.append(SerpResult(clean_result_link(link), title.strip(), description or "", link))
+            block = block_last = None
+
+    if block_count == 0:
+        results = _fallback_results(root)
+        block_count = len(results)
+    return SerpPage(results, next_link or next_fallback, block_count)
+
+def _inside_link(element, block):
+    """Whether an element is inside an <a> of the result block"""
+    parent = element.getparent()
+    while parent is not None and parent is not block:
+        if parent.tag == 'a':
+            return True
+        parent = parent.getparent()
+    return False
+
+def _fallback_results(root):
+    """Results read from the /url?q= links when no known result block class is on the page"""
+    results = []
+    for anchor in root.iter('a'):
+        href = anchor.get('href') or ''
+        if not href.startswith('/url?q='):
+            continue
+        title = _first_text(anchor)
+        if title:
+            results.append(SerpResult(clean_result_link(href), title, "", href))
+    return results
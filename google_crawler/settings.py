@@ -8,11 +8,14 @@ NEWSPIDER_MODULE = 'google_crawler.spiders'
 
 # Scrapy behavior settings
 ROBOTSTXT_OBEY = False
+# Conservative pacing used without the AdaptiveThrottleMiddleware below; when it is
+# enabled, GoogleCrawler hands the pacing over to it (see its update_settings)
 DOWNLOAD_DELAY = 2
 CONCURRENT_REQUESTS = 1
 COOKIES_ENABLED = True
 DOWNLOAD_TIMEOUT = 60
 RETRY_TIMES = 1
+# 403 and 429 are left to the CaptchaMiddleware when CAPTCHA_RETRY_ENABLED (see its update_settings)
 RETRY_HTTP_CODES = [500, 502, 503, 504, 403, 408, 429]
 
 # Output encoding
@@ -22,17 +25,108 @@ FEED_EXPORT_ENCODING = 'utf-8'
 SELENIUM_HEADLESS = True
 SELENIUM_DRIVER_WAIT_TIME = 10
 
+# Conditions a rendered page must meet before its source is read (utils.readiness.CONDITIONS),
+# each given up after SELENIUM_DRIVER_WAIT_TIME or the request's wait_time seconds
+SELENIUM_READINESS = ['dom', 'network']
+
+# Shared Selenium browser pool (used by this middleware and the content scraper):
+# browsers are started lazily up to the pool size, recycled after serving the given
+# number of pages and kept under the total memory cap (0 disables it, needs psutil)
+SELENIUM_POOL_SIZE = 2
+SELENIUM_MAX_PAGES_PER_DRIVER = 50
+SELENIUM_MAX_MEMORY_MB = 2048
+
+# 'lean' browsers only download what is needed to read the HTML (no images, fonts, media,
+# ad/analytics scripts nor, with SELENIUM_BLOCK_CSS, stylesheets) and run with
+# memory-saving switches; 'full' loads pages like a desktop browser. Lean browsers keep
+# their HTTP cache in persistent profiles under SELENIUM_USER_DATA_DIR (None: throwaway profiles).
+SELENIUM_BROWSER_PROFILE = 'lean'
+SELENIUM_USER_DATA_DIR = 'cache/browser_profiles'
+SELENIUM_BLOCK_IMAGES = True
+SELENIUM_BLOCK_CSS = True
+
+# Selenium pages render on the reactor thread pool, keep room for DNS lookups
+REACTOR_THREADPOOL_MAXSIZE = 20
+
 # Tell scrapy-selenium to use our factory function
 SELENIUM_DRIVER_FACTORY = 'utils.selenium_utils.selenium_driver_factory'
 
+# Cache Google result pages on disk, keyed by keyword, page and hl/gl,
+# and serve them again while they are younger than SERP_CACHE_TTL seconds
+SERP_CACHE_ENABLED = True
+SERP_CACHE_DIR = 'cache/serp'
+SERP_CACHE_TTL = 6 * 3600
+SERP_CACHE_MAX_SIZE_MB = 256
+
+# Search engine queried by the spider; GOOGLE_CRAWLER_BASE_URL points it at a local
+# fake server for load tests (see benchmarks/loadtest.py)
+GOOGLE_BASE_URL = os.environ.get('GOOGLE_CRAWLER_BASE_URL', 'https://www.google.com')
+
+# Request all result pages of a keyword at once with start= offsets instead of
+# following the Next links one page at a time. Pages are still paced by the throttle;
+# CONCURRENT_REQUESTS is raised to SERP_PARALLEL_CONCURRENCY so their round trips overlap.
+# SERP_PAGE_SIZE is a minimum: pages are enlarged to ceil(results_per_keyword / max_pages)
+# results (at most 100) so the max_pages pages can still hold the target
+SERP_PARALLEL_PAGES = False
+SERP_PAGE_SIZE = 10
+SERP_PARALLEL_CONCURRENCY = 4
+
 # Enable the middleware
 DOWNLOADER_MIDDLEWARES = {
+    'google_crawler.middlewares.SerpPageCutoffMiddleware': 50,
+    'google_crawler.middlewares.CaptchaMiddleware': 75,  # Sees blocks after the retry and redirect middlewares
+    'google_crawler.middlewares.SerpCacheMiddleware': 100,
+    'google_crawler.middlewares.IdentityMiddleware': 640,  # Before the cookies (700) and proxy (750) middlewares
+    'google_crawler.middlewares.AdaptiveThrottleMiddleware': 650,  # Sees raw 429s/redirects before retry/redirect
     'google_crawler.middlewares.SeleniumMiddleware': 800,
     'scrapy_selenium.SeleniumMiddleware': None,  # Disable the original
      'scrapy.downloadermiddlewares.robotstxt.RobotsTxtMiddleware': None,
 }
 
-# Enable AutoThrottle
+# Pace Google requests with an AIMD token bucket reacting to 429, 403 and CAPTCHA pages:
+# the rate (requests/s) and the number of requests in flight grow while Google answers
+# cleanly and are cut by ADAPTIVE_THROTTLE_DECREASE on each block signal.
+# The increase is additive per clean answer, so recovering from MIN_RATE 0.05 back to
+# 1 request/s takes about ln(1 / 0.05) / 0.02 = 150 seconds of clean answers
+ADAPTIVE_THROTTLE_ENABLED = True
+ADAPTIVE_THROTTLE_START_RATE = 0.5
+ADAPTIVE_THROTTLE_MIN_RATE = 0.05
+ADAPTIVE_THROTTLE_MAX_RATE = 2.0
+ADAPTIVE_THROTTLE_INCREASE = 0.02
+ADAPTIVE_THROTTLE_DECREASE = 0.5
+ADAPTIVE_THROTTLE_MAX_CONCURRENCY = 4
+ADAPTIVE_THROTTLE_COOLDOWN = 30
+
+# Spread SERP requests over several identities (cookie jar, user agent, optional proxy),
+# each with its own download slot and at most IDENTITY_CONCURRENCY requests in flight.
+# Identities hitting a CAPTCHA are quarantined for IDENTITY_QUARANTINE seconds, doubled
+# on each repeat. Proxies come as a list of URLs, e.g. GOOGLE_CRAWLER_PROXIES=http://127.0.0.1:8080
+# Several identities behind a single IP are trivially linked by Google, so the pool is
+# only enabled with proxies and holds one identity per proxy by default
+IDENTITY_PROXIES = [proxy for proxy in os.environ.get('GOOGLE_CRAWLER_PROXIES', '').split(',') if proxy]
+IDENTITY_POOL_ENABLED = bool(IDENTITY_PROXIES)
+IDENTITY_POOL_SIZE = len(IDENTITY_PROXIES)
+IDENTITY_USER_AGENTS = []  # Empty: one random Lynx user agent per identity
+IDENTITY_CONCURRENCY = 1
+IDENTITY_QUARANTINE = 600
+IDENTITY_MAX_QUARANTINE = 3600
+
+# Park SERP requests answered with a CAPTCHA or a block and retry them after
+# CAPTCHA_RETRY_DELAY seconds, doubled on each attempt up to CAPTCHA_RETRY_MAX_DELAY,
+# while the other keywords keep crawling. With CAPTCHA_MANUAL_SOLVE (and visible
+# browsers) the blocked pages are also opened one at a time for solving by hand.
+CAPTCHA_RETRY_ENABLED = True
+CAPTCHA_RETRY_DELAY = 60
+CAPTCHA_RETRY_MAX_DELAY = 900
+CAPTCHA_MAX_RETRIES = 5
+CAPTCHA_MANUAL_SOLVE = False
+CAPTCHA_SOLVE_TIMEOUT = 300
+
+# Lease of a keyword taken from the shared work queue (--queue), renewed with every result
+# page; the spider adds the longest CAPTCHA back-off above so a parked page keeps its lease
+KEYWORD_LEASE_SECONDS = 600
+
+# AutoThrottle only tunes on latency; turned off when the adaptive throttle is enabled
 AUTOTHROTTLE_ENABLED = True
 AUTOTHROTTLE_START_DELAY = 2.0
 AUTOTHROTTLE_MAX_DELAY = 10.0
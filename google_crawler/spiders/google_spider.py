@@ -1,15 +1,24 @@
+import math
 import scrapy
 import logging
+from scrapy import signals
+from scrapy.exceptions import DontCloseSpider
 import urllib.parse
-from urllib.parse import unquote
 
 from utils.user_agents import get_lynx_useragent
-from utils.url import is_in_whitelist
+from utils.url import is_in_whitelist, WhitelistIndex, canonicalize_url
+from utils.work_queue import KEYWORD_TOPIC
+from google_crawler.serp_parser import parse_serp
+from google_crawler.captcha import CaptchaBlocked
+from google_crawler.exceptions import PageCancelled, RequestParked
+from utils.metrics import metrics
 
 class GoogleSpider(scrapy.Spider):
     name = "GoogleSpider" 
     
-    def __init__(self, keywords=None, results_per_keyword=20, max_pages=10, whitelist=None, *args, **kwargs):
+    def __init__(self, keywords=None, results_per_keyword=20, max_pages=10, whitelist=None,
+                 resume_state=None, seen_store=None, work_queue=None, queue_prefetch=2,
+                 parallel_pages=None, page_size=None, base_url=None, *args, **kwargs):
         """
         Initialize spider with keywords provided externally
         
@@ -18,12 +27,25 @@ class GoogleSpider(scrapy.Spider):
             results_per_keyword (int): Number of results to fetch per keyword
             max_pages (int): Maximum number of pages to crawl per keyword
             whitelist (list): List of domains to skip (whitelist)
+            resume_state (dict): State returned by get_state() in a previous run, to resume from
+            seen_store (SeenUrlStore): Optional store of URLs processed by previous runs, which are skipped
+            work_queue (WorkQueue): Optional shared queue; keywords are then leased from its
+                'keywords' topic instead of taken from `keywords`
+            queue_prefetch (int): Number of keywords leased from the work queue at a time
+            parallel_pages (bool): Request all result pages of a keyword up front with `start=`
+                offsets instead of following the Next links (default: SERP_PARALLEL_PAGES setting)
+            page_size (int): Minimum number of results per page used to compute the offsets
+                (default: SERP_PAGE_SIZE setting); raised so that max_pages pages can hold
+                results_per_keyword results, up to the 100 results Google serves per page
+            base_url (str): Scheme and host of the search engine (default: GOOGLE_BASE_URL setting)
         """
         super(GoogleSpider, self).__init__(*args, **kwargs)
         self.keywords = keywords or []
         self.results_per_keyword = int(results_per_keyword)  # Ensure it's an integer
         self.max_pages = int(max_pages)  # Ensure it's an integer
         self.whitelist = whitelist or []
+        # Index the whitelist once instead of scanning it for every result
+        self.whitelist_index = WhitelistIndex(self.whitelist)
 
         self.logger.info(f"Spider initialized with {len(self.keywords)} keywords")
         self.logger.info(f"Target: {self.results_per_keyword} results per keyword, max {self.max_pages} pages per keyword")
@@ -33,47 +55,244 @@ class GoogleSpider(scrapy.Spider):
         # Dictionary to track count of results per keyword
         self.results_count = {keyword: 0 for keyword in self.keywords}
         
-        # Track already visited keywords to avoid duplicates
+        # Track already visited URLs (canonical form) to avoid duplicates
         self.visited_urls = set()
+        self.seen_store = seen_store
+
+        # Progress of each keyword: page to fetch next, its URL, and whether the keyword is finished
+        self.keyword_state = {keyword: {'page': 0, 'next_url': None, 'done': False} for keyword in self.keywords}
+
+        if resume_state:
+            self._restore_state(resume_state)
+
+        # Distributed mode: keywords leased from the shared queue, and the lease of each keyword
+        self.work_queue = work_queue
+        self.queue_prefetch = max(1, int(queue_prefetch))
+        self.keyword_jobs = {}
+        self.keyword_lease = None  # Lease of a keyword in seconds, set in from_crawler
+
+        # Offset pagination mode, completed from the settings in from_crawler
+        self.parallel_pages = parallel_pages
+        self.page_size = page_size
+        self.base_url = base_url or 'https://www.google.com'
 
         self.cookies = {
             'CONSENT': 'PENDING+987',  # Bypasses the consent page
             'SOCS': 'CAESHAgBEhIaAB',
         }
     
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        """Create the spider and keep it open while the work queue has keywords left"""
+        spider = super(GoogleSpider, cls).from_crawler(crawler, *args, **kwargs)
+        if spider.parallel_pages is None:
+            spider.parallel_pages = crawler.settings.getbool('SERP_PARALLEL_PAGES', False)
+        spider.parallel_pages = bool(spider.parallel_pages)
+        spider.page_size = int(spider.page_size or crawler.settings.getint('SERP_PAGE_SIZE', 10))
+        # max_pages pages of SERP_PAGE_SIZE results could not reach the target
+        spider.page_size = min(100, max(spider.page_size, math.ceil(spider.results_per_keyword / spider.max_pages)))
+        if not kwargs.get('base_url'):
+            spider.base_url = crawler.settings.get('GOOGLE_BASE_URL', spider.base_url)
+        spider.base_url = spider.base_url.rstrip('/')
+        if spider.parallel_pages:
+            spider.logger.info(f"Requesting result pages in parallel ({spider.page_size} results per page)")
+        spider.keyword_lease = cls.keyword_lease_seconds(crawler.settings)
+        crawler.signals.connect(spider.spider_idle, signal=signals.spider_idle)
+        return spider
+
+    @staticmethod
+    def keyword_lease_seconds(settings):
+        """
+        Lease of a queued keyword: KEYWORD_LEASE_SECONDS plus the longest CAPTCHA back-off
+
+        The lease is extended with every result page; a page parked by the CaptchaMiddleware
+        produces none until its last retry, so the lease must outlast the whole back-off
+        or another node would crawl the keyword again.
+        """
+        lease = settings.getfloat('KEYWORD_LEASE_SECONDS', 600)
+        if settings.getbool('CAPTCHA_RETRY_ENABLED'):
+            delay = settings.getfloat('CAPTCHA_RETRY_DELAY', 60)
+            max_delay = settings.getfloat('CAPTCHA_RETRY_MAX_DELAY', 900)
+            retries = settings.getint('CAPTCHA_MAX_RETRIES', 5)
+            # Delays are jittered by up to 20%
+            lease += 1.2 * sum(min(max_delay, delay * 2 ** attempt) for attempt in range(retries))
+        return lease
+
+    def _restore_state(self, state):
+        """Restore the progress saved by get_state() in a previous run"""
+        self.visited_urls.update(state.get('visited_urls', []))
+        for keyword, count in state.get('results_count', {}).items():
+            if keyword in self.results_count:
+                self.results_count[keyword] = count
+        for keyword, keyword_state in state.get('keywords', {}).items():
+            if keyword in self.keyword_state:
+                self.keyword_state[keyword].update(keyword_state)
+
+        finished = sum(1 for keyword_state in self.keyword_state.values() if keyword_state['done'])
+        self.logger.info(f"Resuming crawl: {finished}/{len(self.keywords)} keywords finished, "
+                         f"{len(self.visited_urls)} URLs already visited")
+
+    def get_state(self):
+        """Return a JSON-serializable snapshot of the crawl progress for checkpointing"""
+        return {
+            'visited_urls': list(self.visited_urls),
+            'results_count': dict(self.results_count),
+            'keywords': {keyword: dict(keyword_state) for keyword, keyword_state in self.keyword_state.items()},
+        }
+
     def get_random_user_agent(self):
         """Get a random user agent string"""
         return get_lynx_useragent()
     
     def start_requests(self):
         """Generate initial search requests for each keyword"""
+        if self.work_queue is not None:
+            self.logger.info("Leasing keywords from the shared work queue")
+            yield from self._lease_keywords(self.queue_prefetch)
+            return
+
         self.logger.info(f"Starting requests for keywords: {self.keywords}")
         
-        # Let Scrapy handle throttling and concurrency through its AutoThrottle extension
+        # Let Scrapy handle throttling and concurrency through the adaptive throttle middleware
         for keyword in self.keywords:
+            yield from self._keyword_requests(keyword)
+
+    def _keyword_requests(self, keyword):
+        """Build the requests resuming a keyword, an empty list if the keyword is finished"""
+        if self.keyword_state[keyword]['done']:
+            self.logger.info(f"Skipping finished keyword: '{keyword}'")
+            return []
+        if self.parallel_pages:
+            return self._offset_requests(keyword)
+        return [self._keyword_request(keyword)]
+
+    def _offset_requests(self, keyword):
+        """Build the requests of every result page of a keyword not fetched yet, using start= offsets"""
+        keyword_state = self.keyword_state[keyword]
+        pages_done = set(keyword_state.setdefault('pages_done', []))
+        # Pages holding the target number of results, plus one to make up for filtered results
+        page_count = min(self.max_pages, math.ceil(self.results_per_keyword / self.page_size) + 1)
+        page_limit = min(page_count, keyword_state.get('page_limit', page_count))
+        keyword_state['page_limit'] = page_limit
+
+        encoded_keyword = urllib.parse.quote(keyword)
+        self.logger.info(f"Starting search for: '{keyword}' ({page_limit - len(pages_done)} pages in parallel)")
+        requests = []
+        for page in range(page_limit):
+            if page in pages_done:
+                continue
+            url = (f"{self.base_url}/search?q={encoded_keyword}&num={self.page_size}"
+                   f"&start={page * self.page_size}&hl=vi&gl=vn&pws=0")
+            # Earlier pages first, so the target is usually reached with the first pages
+            requests.append(self._page_request(keyword, page, url, priority=-page,
+                                               extra_meta={'serp_page_cutoff': True}))
+        return requests
+
+    def _page_request(self, keyword, page, url, priority=0, extra_meta=None):
+        """Build the request of a result page"""
+        # Use random user agent for each request
+        user_agent = self.get_random_user_agent()
+        return scrapy.Request(
+            url=url,
+            callback=self.parse,
+            meta={
+                "keyword": keyword,
+                "page": page,
+                "selenium": False,  # Default to regular requests
+                "dont_merge_cookies": False,
+                "wait_time": 3,  # Wait up to 3 seconds for the page to load if use selenium
+                "readiness": ["serp"],  # Done as soon as a result block or a CAPTCHA is rendered
+                **(extra_meta or {}),
+            },
+            headers={"User-Agent": user_agent, "Accept": "*/*"},
+            cookies=self.cookies,  # Add cookies to bypass consent page
+            priority=priority,
+            errback=self.errback_request  # Handle errors
+        )
+
+    def is_page_obsolete(self, request):
+        """Whether a queued result page is no longer needed because its keyword is finished or ended earlier"""
+        keyword_state = self.keyword_state.get(request.meta.get('keyword'))
+        if keyword_state is None:
+            return False
+        return keyword_state['done'] or request.meta.get('page', 0) >= keyword_state.get('page_limit', self.max_pages)
+
+    def _keyword_request(self, keyword):
+        """Build the request resuming a keyword at its next page"""
+        keyword_state = self.keyword_state[keyword]
+        page = keyword_state['page']
+        url = keyword_state['next_url']
+        if not url:
             # Request as many results as needed on first page
             encoded_keyword = urllib.parse.quote(keyword)
             # Add num parameter to try to get more results on first page
-            url = f"https://www.google.com/search?q={encoded_keyword}&num={self.results_per_keyword}&hl=vi&gl=vn&pws=0"
-            
-            # Use random user agent for each request
-            user_agent = self.get_random_user_agent()
-            
-            self.logger.info(f"Starting search for: '{keyword}'")
-            yield scrapy.Request(
-                url=url,
-                callback=self.parse,
-                meta={
-                    "keyword": keyword,
-                    "page": 0,
-                    "selenium": False,  # Default to regular requests
-                    "dont_merge_cookies": False,
-                    "wait_time": 3,  # Wait 3 seconds for the page to load if use selenium
-                },
-                headers={"User-Agent": user_agent, "Accept": "*/*"},
-                cookies=self.cookies,  # Add cookies to bypass consent page
-                errback=self.errback_request  # Handle errors
-            )
+            url = f"{self.base_url}/search?q={encoded_keyword}&num={self.results_per_keyword}&hl=vi&gl=vn&pws=0"
+            keyword_state['next_url'] = url
+        
+        self.logger.info(f"Starting search for: '{keyword}'" + (f" from page {page + 1}" if page else ""))
+        return self._page_request(keyword, page, url)
+
+    def _add_keyword(self, keyword):
+        """Start tracking a keyword received from the work queue"""
+        if keyword not in self.keyword_state:
+            self.keywords.append(keyword)
+            self.results_count[keyword] = 0
+            self.keyword_state[keyword] = {'page': 0, 'next_url': None, 'done': False}
+
+    def _lease_keywords(self, limit):
+        """Lease up to `limit` keywords from the work queue and yield their first requests"""
+        leased = 0
+        while leased < limit:
+            job = self.work_queue.lease(KEYWORD_TOPIC, lease_seconds=self.keyword_lease)
+            if job is None:
+                return
+            keyword = job.payload['keyword']
+            self._add_keyword(keyword)
+            self.keyword_jobs[keyword] = job.id
+            requests = self._keyword_requests(keyword)
+            if not requests:
+                # Already finished before (e.g. resumed from a checkpoint)
+                self._finish_keyword(keyword)
+                continue
+            leased += 1
+            yield from requests
+
+    def _schedule_keywords(self, limit):
+        """Lease more keywords and schedule their requests. Returns the number of requests scheduled"""
+        scheduled = 0
+        for request in self._lease_keywords(limit):
+            self.crawler.engine.crawl(request)
+            scheduled += 1
+        return scheduled
+
+    def _finish_keyword(self, keyword):
+        """Mark a keyword as finished and acknowledge it on the work queue"""
+        self.keyword_state[keyword]['done'] = True
+        job_id = self.keyword_jobs.pop(keyword, None)
+        if job_id is not None:
+            self.work_queue.ack(job_id)
+            # Keep the pipeline full with the next keyword from the queue
+            self._schedule_keywords(1)
+
+    def _abandon_keyword(self, keyword):
+        """Give a failed keyword back to the work queue so any node, this one included, can retry it"""
+        job_id = self.keyword_jobs.pop(keyword, None)
+        if job_id is not None:
+            # A retry starts over from the first page; visited_urls keeps the results found so far unique
+            self.keyword_state[keyword] = {'page': 0, 'next_url': None, 'done': False}
+            self.work_queue.nack(job_id, delay=60)
+            self._schedule_keywords(1)
+
+    def spider_idle(self):
+        """Lease more keywords when idle, and wait while other nodes still hold unfinished keywords"""
+        if self.work_queue is None:
+            return
+        if self._schedule_keywords(self.queue_prefetch):
+            raise DontCloseSpider
+        if self.work_queue.has_unfinished(KEYWORD_TOPIC):
+            # Leases held by other nodes may expire and come back to the queue
+            self.logger.info("Waiting for keywords leased by other nodes")
+            raise DontCloseSpider
 
     def errback_request(self, failure):
         """
@@ -83,6 +302,18 @@ class GoogleSpider(scrapy.Spider):
         request = failure.request
         keyword = request.meta.get('keyword', 'unknown')
         current_page = request.meta.get('page', 'unknown')
+
+        # Result pages cancelled because their keyword finished early, or parked after a block.
+        # Other IgnoreRequest subclasses such as HttpError are real failures.
+        if failure.check(PageCancelled, RequestParked):
+            return
+        metrics.inc('serp_failures_total', selenium=bool(request.meta.get('selenium')))
+
+        # Blocked on every parked retry by the CaptchaMiddleware, a browser would be blocked too
+        if failure.check(CaptchaBlocked):
+            self.logger.error(f"'{keyword}' on page {current_page+1} is still blocked by a CAPTCHA. Giving up.")
+            self._give_up_page(keyword, current_page)
+            return
         
         # Only retry with Selenium if not already using it
         if not request.meta.get("selenium", False):
@@ -94,97 +325,140 @@ class GoogleSpider(scrapy.Spider):
             )
         else:
             self.logger.error(f"Selenium request for '{keyword}' on page {current_page+1} also failed. Giving up.")
+            self._give_up_page(keyword, current_page)
+
+    def _give_up_page(self, keyword, page):
+        """
+        Stop retrying a result page, handing a queued keyword back to the work queue
+
+        In parallel mode the keyword is only handed back by _page_finished once none of
+        its other pages is in flight, since they may still produce results.
+        """
+        if not self.parallel_pages:
+            self._abandon_keyword(keyword)
+        elif keyword in self.keyword_state:
+            self.keyword_state[keyword].setdefault('pages_failed', []).append(page)
+            self._page_finished(keyword, page, had_results=True)
+
+    def _page_finished(self, keyword, page, had_results):
+        """
+        Record a result page fetched in parallel mode and finish the keyword when possible
+
+        An empty page ends the keyword at that page: later pages still queued are
+        cancelled, while earlier pages in flight are still processed.
+        """
+        keyword_state = self.keyword_state[keyword]
+        if keyword_state['done']:
+            return
+        keyword_state.setdefault('pages_done', []).append(page)
+        if not had_results:
+            keyword_state['page_limit'] = min(keyword_state.get('page_limit', self.max_pages), page)
+
+        page_limit = keyword_state.get('page_limit', self.max_pages)
+        pages_done = set(keyword_state['pages_done'])
+        if self.results_count[keyword] >= self.results_per_keyword:
+            self._finish_keyword(keyword)
+            self.logger.info(f"✓ Reached target of {self.results_per_keyword} results for '{keyword}'")
+        elif all(page in pages_done for page in range(page_limit)):
+            if keyword_state.get('pages_failed') and keyword in self.keyword_jobs:
+                self.logger.warning(f"Handing '{keyword}' back to the work queue after "
+                                    f"{len(keyword_state['pages_failed'])} failed pages")
+                self._abandon_keyword(keyword)
+                return
+            self._finish_keyword(keyword)
+            self.logger.warning(f"⚠ No more result pages for '{keyword}' after {self.results_count[keyword]} results")
 
     def parse(self, response):
         keyword = response.meta["keyword"]
         current_page = response.meta["page"]
+
+        # Keep the lease of a queued keyword alive while its pages are crawled
+        if keyword in self.keyword_jobs:
+            self.work_queue.extend(self.keyword_jobs[keyword], lease_seconds=self.keyword_lease)
                 
         self.logger.info(f"Processing page {current_page+1} for keyword: '{keyword}'")
 
-        result_blocks = response.css("div.ezO2md")
+        if 'serp_cache' in response.flags:
+            metrics.inc('serp_pages_total', source='cache')
+        else:
+            metrics.inc('serp_pages_total', source='selenium' if response.meta.get('selenium') else 'network')
+            if 'download_latency' in response.meta:
+                metrics.observe('stage_seconds', response.meta['download_latency'], stage='serp_fetch')
+
+        # Walk the page once for the result blocks and the Next link, unless the SERP cache already did
+        serp_page = response.meta.pop('serp_page', None)
+        if serp_page is None:
+            with metrics.timer('stage_seconds', stage='serp_parse'):
+                serp_page = parse_serp(response.body)
         
-        self.logger.info(f"Found {len(result_blocks)} raw results on page {current_page+1} for '{keyword}'")
+        self.logger.info(f"Found {serp_page.block_count} raw results on page {current_page+1} for '{keyword}'")
         
         # Process search results
         results_on_page = 0
         
-        for result in result_blocks:
-            # Extract link - find <a> tag inside the result block
-            link_raw = result.css("a::attr(href)").get()
-            
-            # Extract title - find <span class="CVA68e"> inside the <a> tag
-            title = result.css("a span.CVA68e::text").get()
-            
-            # Extract description - find <span class="FrIlee"> 
-            description_parts = result.css("span.FrIlee *::text").getall()
-            description = ' '.join([part.strip() for part in description_parts]).strip() if description_parts else ""
+        for result in serp_page.results:
+            # Pages fetched in parallel stop at the target instead of overshooting it
+            if self.parallel_pages and self.results_count[keyword] >= self.results_per_keyword:
+                break
+
+            link = result.link
             
-            # Process link if it exists
-            if link_raw and title:
-                # Clean and decode the link URL
-                link = unquote(link_raw.split("&")[0].replace("/url?q=", ""))
+            # Check if it's a valid link, not already visited, and not in whitelist
+            if not link.startswith('http') or 'google.com/search' in link:
+                continue
+            canonical_link = canonicalize_url(link)
+            if (canonical_link not in self.visited_urls
+                and not is_in_whitelist(link, self.whitelist_index)
+                and not (self.seen_store is not None and canonical_link in self.seen_store)):
+                # Mark as visited
+                self.visited_urls.add(canonical_link)
                 
-                # Check if it's a valid link, not already visited, and not in whitelist
-                if (link.startswith('http') and 'google.com/search' not in link 
-                    and link not in self.visited_urls
-                    and not is_in_whitelist(link, self.whitelist)):
-                    # Mark as visited
-                    self.visited_urls.add(link)
-                    
-                    # Create and yield the result item
-                    item = {
-                        'keyword': keyword,
-                        'title': title.strip(),
-                        'link': link,
-                        'description': description.strip() if description else ""
-                    }
-                    results_on_page += 1
-                    self.results_count[keyword] += 1
-                    yield item
+                # Create and yield the result item
+                item = {
+                    'keyword': keyword,
+                    'title': result.title,
+                    'link': link,
+                    'description': result.description
+                }
+                results_on_page += 1
+                self.results_count[keyword] += 1
+                yield item
         
         self.logger.info(f"Extracted {results_on_page} valid results from page {current_page+1} for '{keyword}'")
         self.logger.info(f"Total results for '{keyword}': {self.results_count[keyword]}/{self.results_per_keyword}")
+
+        if self.parallel_pages:
+            # The other pages of the keyword are already requested
+            self._page_finished(keyword, current_page, had_results=serp_page.block_count > 0)
+            return
         
         # Check if we need to fetch the next page for this keyword
         should_continue = (
             self.results_count[keyword] < self.results_per_keyword and  # Haven't found enough results
             current_page < self.max_pages - 1 and  # Haven't visited too many pages
-            len(result_blocks) > 0  # Current page had results
+            serp_page.block_count > 0  # Current page had results
         )
         
         if should_continue:
             # Look for the "Next" button link
-            next_page_link = response.css("a.frGj1b::attr(href)").get()
+            next_page_link = serp_page.next_link
             
             if next_page_link:
-                next_url = f"https://www.google.com{next_page_link}"
+                next_url = f"{self.base_url}{next_page_link}"
+                self.keyword_state[keyword].update(page=current_page + 1, next_url=next_url)
                 
                 self.logger.info(f"Moving to next page for '{keyword}' to get more results")
                 
-                # Use random user agent for each request
-                user_agent = self.get_random_user_agent()
-                                
-                # Let Scrapy's AutoThrottle handle the timing
-                yield scrapy.Request(
-                    url=next_url,
-                    callback=self.parse,
-                    meta={
-                        "keyword": keyword,
-                        "page": current_page + 1,  # Increment page counter
-                        "selenium": False,
-                        "dont_merge_cookies": False,
-                        "wait_time": 3
-                    },
-                    headers={"User-Agent": user_agent, "Accept": "*/*"},
-                    cookies=self.cookies,  # Add cookies to bypass consent page
-                    errback=self.errback_request  # Handle errors
-                )
+                # Let the adaptive throttle handle the timing
+                yield self._page_request(keyword, current_page + 1, next_url)
             else:
+                self._finish_keyword(keyword)
                 self.logger.warning(f"⚠ No 'Next' button found for '{keyword}' after {self.results_count[keyword]} results")
         else:
+            self._finish_keyword(keyword)
             if self.results_count[keyword] >= self.results_per_keyword:
                 self.logger.info(f"✓ Reached target of {self.results_per_keyword} results for '{keyword}'")
             elif current_page >= self.max_pages - 1:
                 self.logger.warning(f"⚠ Reached max page limit ({self.max_pages} pages) for '{keyword}' with only {self.results_count[keyword]} results")
-            elif not result_blocks:
+            elif not serp_page.block_count:
                 self.logger.warning(f"⚠ No more results found for '{keyword}' after {self.results_count[keyword]} results")
\ No newline at end of file
@@ -1,85 +1,240 @@
 import os
 import time
-import pandas as pd
+import argparse
 from pathlib import Path
 from datetime import datetime
 from google_crawler.google_crawler import GoogleCrawler
 from content_scraper.content_scraper import ContentScraper
+from content_scraper.dedup import NearDuplicateDetector
 from utils.logger import setup_logging
 from utils.load_files import load_keywords, load_whitelist
+from utils.selenium_utils import shutdown_browsers
+from utils.response_cache import ResponseCache
+from utils.fetch_strategy import FetchStrategyStore
+from utils.checkpoint import CrawlCheckpoint
+from utils.sinks import create_sink, SINK_TYPES, APPENDABLE_FORMATS
+from utils.seen_store import SeenUrlStore
+from utils.work_queue import SQLiteWorkQueue, KEYWORD_TOPIC
+from utils.metrics import metrics, MetricsServer
+from utils.profiling import SampledProfiler
+from google_crawler.spiders.google_spider import GoogleSpider
 
-def main():
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Google search crawler and content extractor")
+    parser.add_argument('--resume', action='store_true',
+                        help="Resume the interrupted run saved in the checkpoint file")
+    parser.add_argument('--checkpoint', default='checkpoints/crawl_state.json',
+                        help="Checkpoint file used to save progress and resume")
+    parser.add_argument('--checkpoint-interval', type=float, default=30,
+                        help="Seconds between checkpoint saves")
+    parser.add_argument('--output-format', default='.xlsx', choices=sorted(SINK_TYPES),
+                        help="Format of the results file; .xlsx, .jsonl.gz and .parquet are only complete "
+                             "once the run ends, use --output-format .jsonl for crash-safe, resumable runs")
+    parser.add_argument('--output', default=None,
+                        help="Results file (default: outputs/search_results_<timestamp><format>)")
+    parser.add_argument('--partition-by', default=None, choices=['keyword', 'date'],
+                        help="Partition Parquet output into one directory per keyword or crawl date")
+    parser.add_argument('--dedup', default='flag', choices=['off', 'flag', 'drop'],
+                        help="Near-duplicate articles: keep all, flag them in 'duplicate_of', or drop them")
+    parser.add_argument('--skip-seen', action='store_true',
+                        help="Skip URLs already extracted by previous runs (persistent seen-URL store)")
+    parser.add_argument('--seen-store', default='cache/seen_urls',
+                        help="Directory of the persistent seen-URL store")
+    parser.add_argument('--response-cache', action='store_true',
+                        help="Reuse article pages downloaded by previous runs (cache/responses, kept 7 days)")
+    parser.add_argument('--learn-fetch-strategy', action='store_true',
+                        help="Route article URLs by the fetch outcomes of their domain in previous runs, "
+                             "going straight to Selenium or skipping domains where static fetches keep failing")
+    parser.add_argument('--queue', default=None,
+                        help="Shared work queue database; keywords are leased from it so several nodes can split a crawl")
+    parser.add_argument('--enqueue', action='store_true',
+                        help="Add the keywords of the keywords file to the work queue and exit")
+    parser.add_argument('--distribute-articles', action='store_true',
+                        help="Also share article extraction between the nodes through the work queue")
+    parser.add_argument('--parallel-pages', action='store_true', default=None,
+                        help="Request the result pages of each keyword in parallel using start= offsets, "
+                             "sized so the maximum pages per keyword can hold the target results")
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="Serve live metrics in the Prometheus format on this port during the run")
+    parser.add_argument('--metrics-host', default='127.0.0.1',
+                        help="Address the metrics endpoint listens on; use 0.0.0.0 to expose it to other hosts")
+    parser.add_argument('--profile', action='store_true',
+                        help="Profile CPU time and allocations of the crawl and extraction hot paths into logs/")
+    parser.add_argument('--profile-rate', type=float, default=0.1,
+                        help="Fraction of the calls profiled with --profile")
+    return parser.parse_args()
+
+def resolve_output_path(args, checkpoint):
+    """Pick the results file, reusing the one of the interrupted run when resuming"""
+    if args.output:
+        return args.output
+
+    if args.resume and args.output_format in APPENDABLE_FORMATS:
+        state = checkpoint.load() or {}
+        if state.get('output_path'):
+            return state['output_path']
+
+    # Generate filename with timestamp
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return f"outputs/search_results_{timestamp}{args.output_format}"
+
+def log_metrics_summary(logger, time_start):
+    """Save the per-stage metrics of the run as JSON and log where the time went"""
+    os.makedirs('logs', exist_ok=True)
+    metrics_file = f"logs/metrics_{time_start.strftime('%Y%m%d_%H%M%S')}.json"
+    summary = metrics.write_summary(metrics_file)
+
+    logger.info("===== Stage Metrics =====")
+    stages = sorted(summary['histograms'].items(), key=lambda item: -item[1]['total_s'])
+    for name, stage in stages:
+        logger.info(f"{name}: {stage['count']} calls, {stage['total_s']}s total, "
+                    f"p50 {stage['p50']} ms, p95 {stage['p95']} ms, p99 {stage['p99']} ms")
+    for name, value in summary['counters'].items():
+        logger.info(f"{name}: {value}")
+    logger.info(f"Metrics saved to {metrics_file}")
+
+def start_profiler(args, logger):
+    """Instrument the crawl and extraction hot paths when --profile is set"""
+    if not args.profile:
+        return None
+    profiler = SampledProfiler(sample_rate=args.profile_rate, logger=logger)
+    profiler.instrument(GoogleSpider, 'parse')
+    profiler.instrument(ContentScraper, 'scrape')
+    profiler.instrument(ContentScraper, '_try_selenium_scrape')
+    profiler.instrument(ContentScraper, '_process_extracted_content')
+    profiler.start()
+    return profiler
+
+def main(args):
     """Main function to run the crawler and scraper workflow"""
     # Setup logging
     logger = setup_logging()
     logger.info("Starting Google search and content extraction workflow")
     
     time_start = datetime.now()
+    metrics.reset()
+    metrics_server = MetricsServer(metrics, port=args.metrics_port, host=args.metrics_host,
+                                   logger=logger) if args.metrics_port else None
+    profiler = start_profiler(args, logger)
     try:
+        work_queue = SQLiteWorkQueue(args.queue, logger=logger) if args.queue else None
+
         # Step 1: Load keywords from file
         logger.info("Loading keywords from file...")
         keywords = load_keywords()
     
-        if not keywords:
+        if not keywords and work_queue is None:
             logger.error("No valid keywords provided. Exiting.")
             return
+
+        if args.enqueue:
+            if work_queue is None:
+                logger.error("--enqueue requires --queue. Exiting.")
+                return
+            added = work_queue.put_many(KEYWORD_TOPIC, [{'keyword': keyword} for keyword in keywords],
+                                        key_func=lambda payload: payload['keyword'])
+            logger.info(f"Queued {added} new keywords, {work_queue.counts(KEYWORD_TOPIC)}")
+            work_queue.close()
+            return
         
         # Configure crawler parameters
         results_per_keyword = 100  # Target number of results per keyword
         max_pages = 4  # Maximum pages to check per keyword
+        extractor_workers = 8  # Threads downloading articles while the crawl is running
+        extraction_processes = 2  # Processes running trafilatura's extraction
         whitelist = load_whitelist()
 
+        # The checkpoint only lists the extracted URLs: their rows must already be in the results file
+        checkpoint = CrawlCheckpoint(args.checkpoint, interval=args.checkpoint_interval, logger=logger)
+        output_file = resolve_output_path(args, checkpoint)
+        if args.resume and checkpoint.exists() and not output_file.endswith(APPENDABLE_FORMATS):
+            logger.error(f"Cannot resume into {output_file}: the URLs extracted before the interruption would be "
+                         f"skipped and their content lost. Resume with a {' or '.join(APPENDABLE_FORMATS)} "
+                         f"output. Exiting.")
+            return
+
         # Step 2: Initialize content scraper
         logger.info("Initializing content scraper...")
-        content_scraper = ContentScraper(logger=logger, selenium_headless=True)
+        response_cache = ResponseCache(logger=logger) if args.response_cache else None
+        dedup = NearDuplicateDetector(mode=args.dedup, logger=logger) if args.dedup != 'off' else None
+        fetch_strategy = FetchStrategyStore(logger=logger) if args.learn_fetch_strategy else None
+        content_scraper = ContentScraper(logger=logger, selenium_headless=True,
+                                         extraction_processes=extraction_processes,
+                                         fetch_workers=extractor_workers,
+                                         cache=response_cache,
+                                         dedup=dedup,
+                                         fetch_strategy=fetch_strategy)
         
-        # Step 3: Run Google crawler with immediate content extraction
+        # Step 3: Open the results file, written as each result arrives
+        logger.info(f"Writing results to {output_file}")
+        sink_options = {'partition_by': args.partition_by} if output_file.endswith('.parquet') else {}
+        sink = create_sink(output_file, logger=logger, **sink_options)
+
+        # Step 4: Run Google crawler with immediate content extraction
         logger.info("Starting Google search crawler with immediate content extraction...")
+        seen_store = SeenUrlStore(args.seen_store, logger=logger) if args.skip_seen else None
         google_crawler = GoogleCrawler(logger=logger)
-        search_results, content_results = google_crawler.run(
-            keywords=keywords, 
-            results_per_keyword=results_per_keyword,
-            max_pages=max_pages,
-            whitelist=whitelist,
-            content_extractor=content_scraper,
-            extractor_method='scrape'  # Method name to call on content_scraper
-        )
+        try:
+            search_results, _ = google_crawler.run(
+                keywords=keywords, 
+                results_per_keyword=results_per_keyword,
+                max_pages=max_pages,
+                whitelist=whitelist,
+                content_extractor=content_scraper,
+                extractor_method='scrape',  # Method name to call on content_scraper
+                extractor_workers=extractor_workers,
+                checkpoint=checkpoint,
+                resume=args.resume,
+                sink=sink,
+                seen_store=seen_store,
+                work_queue=work_queue,
+                distribute_articles=args.distribute_articles,
+                parallel_pages=args.parallel_pages
+            )
+        finally:
+            sink.close()
+            if seen_store:
+                seen_store.close()
+            if work_queue:
+                work_queue.close()
         content_scraper.close()
+        shutdown_browsers()  # Quit the browsers shared by the crawler and the scraper
+        if response_cache:
+            logger.info(f"Response cache: {response_cache.stats()}")
+            response_cache.close()
+        if fetch_strategy:
+            logger.info(f"Fetch strategies: {fetch_strategy.stats()}")
+            fetch_strategy.close()
 
-        # Step 4: Log results summary
+        # Step 5: Log results summary
         logger.info("===== Workflow Summary =====")
         logger.info(f"Google search found {len(search_results)} total results")
-        logger.info(f"Successfully extracted content from {len(content_results)} URLs")
-        
-        # Step 5: Save results to Excel
-        if content_results:
-            # Create output dir if needed
-            if not os.path.exists('outputs'):
-                os.makedirs('outputs')
-                
-            # Generate filename with timestamp
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            output_file = f"outputs/search_results_{timestamp}.xlsx"
-            
-            # Save to Excel
-            df = pd.DataFrame(content_results)
-
-            # count results per keyword
-            keyword_counts = df['keyword'].value_counts().to_dict()
-            logger.info(f"Results per keyword: {keyword_counts}")
-
-            df.to_excel(output_file, index=False)
-            logger.info(f"Saved {len(content_results)} results to {output_file}")
+        logger.info(f"Successfully extracted content from {google_crawler.content_count} URLs")
+        if google_crawler.content_count:
+            logger.info(f"Results per keyword: {dict(google_crawler.keyword_counts)}")
         else:
-            logger.warning("No content was extracted. Excel file not created.")
+            logger.warning("No content was extracted.")
+        if dedup:
+            logger.info(f"Near-duplicate articles {'dropped' if dedup.mode == 'drop' else 'flagged'}: {dedup.duplicates}")
+
+        # The run completed, the next one starts from scratch
+        checkpoint.clear()
             
     except Exception as e:
         logger.error(f"Error in main workflow: {str(e)}")
         logger.exception("Exception details:")
     
+    log_metrics_summary(logger, time_start)
+    if profiler:
+        profiler.dump('logs')
+        profiler.restore()
+    if metrics_server:
+        metrics_server.close()
+
     time_end = datetime.now()
     time_elapsed = time_end - time_start
     logger.info(f"Workflow completed in {time_elapsed}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(parse_args())
\ No newline at end of file
@@ -0,0 +1,151 @@
+import pytest
+from scrapy import Request
+from scrapy.http import HtmlResponse
+from scrapy.exceptions import IgnoreRequest
+
+from google_crawler import middlewares
+from google_crawler.middlewares import AdaptiveThrottleMiddleware
+
+class FakeClock:
+    """Stands in for the time module of the middlewares, so tests control the token refill"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(middlewares, 'time', clock)
+    return clock
+
+@pytest.fixture
+def throttle(clock):
+    throttle = AdaptiveThrottleMiddleware(start_rate=1.0, min_rate=0.05, max_rate=2.0, increase=0.1,
+                                          decrease=0.5, max_concurrency=4, cooldown=30)
+    yield throttle
+    throttle.spider_closed(None)  # Cancel any wake-up timer left on the reactor
+
+def serp_request(page=0):
+    return Request(f'https://www.google.com/search?q=test&start={page * 10}', meta={'keyword': 'test', 'page': page})
+
+def answer(request, status=200, body=b'<html><body><div class="ezO2md">result</div></body></html>', **kwargs):
+    return HtmlResponse(request.url, status=status, body=body, request=request, **kwargs)
+
+def send(throttle, request):
+    """Run process_request and return whether the request went out right away"""
+    waiter = throttle.process_request(request, None)
+    return waiter.called
+
+def test_clean_answers_grow_rate_and_window(throttle):
+    request = serp_request()
+    assert send(throttle, request)
+    throttle.process_response(request, answer(request), None)
+    assert throttle.rate == pytest.approx(1.1)
+    assert throttle.window == pytest.approx(2.0)
+    assert throttle.in_flight == 0
+
+def test_rate_and_window_are_capped(throttle, clock):
+    for _ in range(50):
+        clock.now += 10
+        request = serp_request()
+        send(throttle, request)
+        throttle.process_response(request, answer(request), None)
+    assert throttle.rate == throttle.max_rate
+    assert throttle.window == throttle.max_concurrency
+
+@pytest.mark.parametrize('status, headers, body', [
+    (429, None, b''),
+    (403, None, b''),
+    (302, {'Location': 'https://www.google.com/sorry/index?continue=x'}, b''),
+    (200, None, b'<html><body><div class="g-recaptcha"></div></body></html>'),
+])
+def test_block_signals_back_off(throttle, status, headers, body):
+    throttle.window = 4.0
+    request = serp_request()
+    send(throttle, request)
+    throttle.process_response(request, answer(request, status=status, headers=headers, body=body), None)
+    assert throttle.rate == pytest.approx(0.5)
+    assert throttle.window == pytest.approx(2.0)
+    assert throttle.tokens <= 0
+
+def test_back_off_once_per_cooldown(throttle, clock):
+    requests = [serp_request(page) for page in range(3)]
+    throttle.window = 4.0
+    for request in requests:
+        clock.now += 1
+        assert send(throttle, request)
+
+    # A burst of blocked in-flight answers only backs off once
+    for request in requests[:2]:
+        throttle.process_response(request, answer(request, status=429), None)
+    assert throttle.rate == pytest.approx(0.5)
+
+    # Clean answers do not grow the rate during the cooldown
+    throttle.process_response(requests[2], answer(requests[2]), None)
+    assert throttle.rate == pytest.approx(0.5)
+
+    clock.now += 31
+    request = serp_request()
+    throttle.process_response(request, answer(request, status=429), None)
+    assert throttle.rate == pytest.approx(0.25)
+
+def test_rate_never_drops_below_min_rate(throttle, clock):
+    for _ in range(10):
+        clock.now += 31
+        request = serp_request()
+        throttle.process_response(request, answer(request, status=429), None)
+    assert throttle.rate == throttle.min_rate
+    assert throttle.window == 1.0
+
+def test_window_holds_requests_until_an_answer(throttle, clock):
+    first, second = serp_request(0), serp_request(1)
+    assert send(throttle, first)
+    clock.now += 10  # Plenty of tokens: only the window of one request holds the second one
+    waiter = throttle.process_request(second, None)
+    assert not waiter.called
+    throttle.process_response(first, answer(first), None)
+    assert waiter.called
+    assert throttle.in_flight == 1
+
+def test_tokens_pace_requests(throttle, clock):
+    throttle.window = 4.0
+    first, second = serp_request(0), serp_request(1)
+    assert send(throttle, first)
+    waiter = throttle.process_request(second, None)
+    assert not waiter.called  # The single token was spent
+    timer = throttle._timer
+    assert timer is not None and timer.getTime() - timer.seconds() == pytest.approx(1.0, abs=0.1)
+    timer.cancel()  # The reactor is not running: fire the wake-up by hand
+    clock.now += 1
+    throttle._on_timer()
+    assert waiter.called
+
+def test_failed_requests_free_their_slot(throttle, clock):
+    first, second = serp_request(0), serp_request(1)
+    send(throttle, first)
+    clock.now += 10
+    waiter = throttle.process_request(second, None)
+    throttle.process_exception(first, TimeoutError(), None)
+    assert waiter.called
+
+def test_other_requests_and_cached_pages_are_ignored(throttle):
+    assert throttle.process_request(Request('https://news.example/article'), None) is None
+    request = serp_request()
+    send(throttle, request)
+    throttle.process_response(request, answer(request, status=429, flags=['serp_cache']), None)
+    assert throttle.rate == pytest.approx(1.0)
+
+def test_spider_closed_drops_waiting_requests(throttle, clock):
+    first, second = serp_request(0), serp_request(1)
+    send(throttle, first)
+    waiter = throttle.process_request(second, None)
+    failures = []
+    waiter.addErrback(failures.append)
+    throttle.spider_closed(None)
+    assert failures and failures[0].check(IgnoreRequest)
+    assert throttle._timer is None
+    with pytest.raises(IgnoreRequest):
+        throttle.process_request(serp_request(2), None)
@@ -0,0 +1,72 @@
+import random
+
+import pytest
+
+from content_scraper.dedup import NearDuplicateDetector, simhash
+
+WORDS = ['thị', 'trường', 'giá', 'vàng', 'hôm', 'nay', 'tăng', 'giảm', 'ngân', 'hàng', 'lãi', 'suất',
+         'market', 'price', 'report', 'growth', 'quarter', 'export', 'energy', 'policy']
+
+def article(seed, length=300):
+    rng = random.Random(seed)
+    return ' '.join(rng.choice(WORDS) for _ in range(length))
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+def test_simhash_is_stable_and_case_insensitive():
+    text = article(1)
+    assert simhash(text) == simhash(text)
+    assert simhash(text) == simhash(text.upper())
+
+def test_simhash_close_for_small_edits_far_for_other_texts():
+    text = article(1)
+    edited = text.replace(text.split()[150], 'changed', 1)
+    assert hamming(simhash(text), simhash(edited)) <= 6
+    assert hamming(simhash(text), simhash(article(2))) > 6
+
+def test_exact_duplicate_returns_first_url():
+    detector = NearDuplicateDetector()
+    text = article(1)
+    assert detector.check('https://a.example/1', text) is None
+    assert detector.check('https://b.example/1', text) == 'https://a.example/1'
+    assert detector.duplicates == 1
+    assert len(detector) == 1  # Duplicates are not indexed
+
+def test_near_duplicate_is_flagged():
+    detector = NearDuplicateDetector()
+    text = article(1)
+    words = text.split()
+    words[10] = 'syndicated'
+    words[-1] = 'copy'
+    assert detector.check('https://a.example/1', text) is None
+    assert detector.check('https://b.example/1', ' '.join(words)) == 'https://a.example/1'
+
+def test_different_texts_are_kept():
+    detector = NearDuplicateDetector()
+    for seed in range(50):
+        assert detector.check(f'https://a.example/{seed}', article(seed)) is None
+    assert len(detector) == 50
+    assert detector.duplicates == 0
+
+def test_short_texts_are_never_flagged():
+    detector = NearDuplicateDetector(min_length=200)
+    assert detector.check('https://a.example/1', 'short text') is None
+    assert detector.check('https://b.example/1', 'short text') is None
+    assert detector.check('https://c.example/1', '') is None
+    assert len(detector) == 0
+
+def test_lsh_finds_every_pair_within_max_distance():
+    # Two fingerprints differing in max_distance bits spread over different blocks must collide
+    detector = NearDuplicateDetector(max_distance=6)
+    fingerprint = simhash(article(1))
+    flipped = fingerprint
+    for bit in (0, 9, 18, 27, 36, 45):
+        flipped ^= 1 << bit
+    assert any(a == b for a, b in zip(detector._band_values(fingerprint), detector._band_values(flipped)))
+
+def test_invalid_settings():
+    with pytest.raises(ValueError):
+        NearDuplicateDetector(mode='delete')
+    with pytest.raises(ValueError):
+        NearDuplicateDetector(max_distance=6, blocks=6)
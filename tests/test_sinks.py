@@ -0,0 +1,148 @@
+import os
+import gzip
+import json
+
+import pytest
+
+from utils.sinks import (create_sink, JsonlSink, GzipJsonlSink, XlsxSink, ParquetSink,
+                         SINK_TYPES, APPENDABLE_FORMATS)
+from utils.checkpoint import CrawlCheckpoint
+
+def result(index, keyword='giá vàng'):
+    return {'title': f'Bài {index}', 'url': f'https://news.example/{index}', 'description': '',
+            'content': f'Nội dung {index}', 'date': '2024-05-01', 'main_image': None,
+            'images': [f'https://news.example/{index}.jpg'], 'author': None, 'site': 'news.example',
+            'keyword': keyword}
+
+def read_jsonl(path):
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+@pytest.mark.parametrize('extension, sink_class', [
+    ('.jsonl', JsonlSink), ('.jsonl.gz', GzipJsonlSink), ('.xlsx', XlsxSink), ('.parquet', ParquetSink)])
+def test_create_sink_by_extension(tmp_path, extension, sink_class):
+    if sink_class is ParquetSink:
+        pytest.importorskip('pyarrow')
+    sink = create_sink(str(tmp_path / f'results{extension}'))
+    try:
+        assert type(sink) is sink_class
+    finally:
+        sink.close()
+
+def test_create_sink_rejects_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        create_sink(str(tmp_path / 'results.csv'))
+
+def test_jsonl_rows_are_on_disk_before_close(tmp_path):
+    path = str(tmp_path / 'out' / 'results.jsonl')
+    sink = JsonlSink(path)
+    sink.write(result(1))
+    sink.write(result(2))
+    # Flushed after every row, so a crash keeps them
+    assert [row['url'] for row in read_jsonl(path)] == ['https://news.example/1', 'https://news.example/2']
+    sink.close()
+    assert sink.count == 2
+    with pytest.raises(ValueError):
+        sink.write(result(3))
+
+def test_jsonl_resume_appends(tmp_path):
+    path = str(tmp_path / 'results.jsonl')
+    with JsonlSink(path) as sink:
+        sink.write(result(1))
+    with JsonlSink(path) as sink:
+        sink.write(result(2))
+    rows = read_jsonl(path)
+    assert [row['url'] for row in rows] == ['https://news.example/1', 'https://news.example/2']
+    assert rows[0]['keyword'] == 'giá vàng'
+
+def test_gzip_jsonl_appends_members(tmp_path):
+    path = str(tmp_path / 'results.jsonl.gz')
+    with GzipJsonlSink(path, flush_every=1) as sink:
+        sink.write(result(1))
+    with GzipJsonlSink(path) as sink:
+        sink.write(result(2))
+    assert [row['url'] for row in read_jsonl(path)] == ['https://news.example/1', 'https://news.example/2']
+
+def test_only_crash_safe_formats_are_appendable():
+    assert set(APPENDABLE_FORMATS) <= set(SINK_TYPES)
+    assert '.jsonl' in APPENDABLE_FORMATS
+    for extension in ('.jsonl.gz', '.xlsx', '.parquet'):
+        assert not f'results{extension}'.endswith(APPENDABLE_FORMATS)
+
+def test_xlsx_header_and_rows(tmp_path):
+    openpyxl = pytest.importorskip('openpyxl')
+    path = str(tmp_path / 'results.xlsx')
+    with XlsxSink(path) as sink:
+        sink.write(result(1))
+        sink.write(result(2))
+    rows = list(openpyxl.load_workbook(path).active.values)
+    assert list(rows[0]) == list(result(1))
+    assert [row[1] for row in rows[1:]] == ['https://news.example/1', 'https://news.example/2']
+    assert rows[1][6] == str(result(1)['images'])
+
+def test_parquet_row_groups(tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    path = str(tmp_path / 'results.parquet')
+    with ParquetSink(path, row_group_size=2) as sink:
+        for index in range(5):
+            sink.write(result(index))
+    parquet_file = pq.ParquetFile(path)
+    assert parquet_file.metadata.num_rows == 5
+    assert parquet_file.metadata.num_row_groups == 3
+    table = parquet_file.read()
+    assert table.column('images').to_pylist()[0] == ['https://news.example/0.jpg']
+    assert table.column('url').to_pylist() == [f'https://news.example/{index}' for index in range(5)]
+
+def test_parquet_keyword_partitions(tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    path = str(tmp_path / 'results.parquet')
+    with ParquetSink(path, partition_by='keyword') as sink:
+        sink.write(result(1, keyword='giá vàng'))
+        sink.write(result(2, keyword='lãi suất/ngân hàng'))
+        sink.write(result(3, keyword='giá vàng'))
+    assert sorted(os.listdir(path)) == ['keyword=gi%C3%A1%20v%C3%A0ng',
+                                        'keyword=l%C3%A3i%20su%E1%BA%A5t%2Fng%C3%A2n%20h%C3%A0ng']
+    table = pq.read_table(os.path.join(path, 'keyword=gi%C3%A1%20v%C3%A0ng', 'part-0.parquet'))
+    assert table.column('url').to_pylist() == ['https://news.example/1', 'https://news.example/3']
+
+def test_parquet_closes_least_recently_used_writers(tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    path = str(tmp_path / 'results.parquet')
+    sink = ParquetSink(path, row_group_size=1, partition_by='keyword', max_open_writers=2)
+    for index in range(12):
+        sink.write(result(index, keyword=f'k{index % 3}'))
+        assert len(sink._writers) <= 2
+    sink.close()
+
+    files = sorted(os.path.join(directory, name) for directory, _, names in os.walk(path) for name in names)
+    assert 'part-1.parquet' in {os.path.basename(name) for name in files}
+    urls = [url for name in files for url in pq.read_table(name).column('url').to_pylist()]
+    assert sorted(urls) == sorted(f'https://news.example/{index}' for index in range(12))
+
+def test_parquet_rejects_unknown_partition(tmp_path):
+    pytest.importorskip('pyarrow')
+    with pytest.raises(ValueError):
+        ParquetSink(str(tmp_path / 'results.parquet'), partition_by='site')
+
+def test_checkpoint_round_trip(tmp_path):
+    checkpoint = CrawlCheckpoint(str(tmp_path / 'state' / 'crawl.json'))
+    assert not checkpoint.exists()
+    assert checkpoint.load() is None
+
+    checkpoint.save({'extracted_urls': ['https://news.example/1'], 'pending': []})
+    state = checkpoint.load()
+    assert state['extracted_urls'] == ['https://news.example/1']
+    assert state['version'] == CrawlCheckpoint.VERSION
+    assert not os.path.exists(checkpoint.path + '.tmp')
+
+    checkpoint.clear()
+    assert not checkpoint.exists()
+
+def test_checkpoint_ignores_other_versions_and_corrupt_files(tmp_path):
+    path = tmp_path / 'crawl.json'
+    checkpoint = CrawlCheckpoint(str(path))
+    path.write_text(json.dumps({'version': CrawlCheckpoint.VERSION + 1}), encoding='utf-8')
+    assert checkpoint.load() is None
+    path.write_text('{"version": 1, "extracted_', encoding='utf-8')
+    assert checkpoint.load() is None
@@ -0,0 +1,109 @@
+import time
+
+import pytest
+
+from utils.work_queue import SQLiteWorkQueue, KEYWORD_TOPIC, ARTICLE_TOPIC
+
+@pytest.fixture
+def queue_path(tmp_path):
+    return str(tmp_path / 'jobs.sqlite3')
+
+@pytest.fixture
+def queue(queue_path):
+    queue = SQLiteWorkQueue(queue_path, lease_seconds=60, max_attempts=3, worker_id='node-a')
+    yield queue
+    queue.close()
+
+def test_put_deduplicates_on_key(queue):
+    assert queue.put(KEYWORD_TOPIC, {'keyword': 'giá vàng'}, key='giá vàng')
+    assert not queue.put(KEYWORD_TOPIC, {'keyword': 'giá vàng', 'again': True}, key='giá vàng')
+    assert queue.put_many(KEYWORD_TOPIC, [{'keyword': 'a'}, {'keyword': 'b'}, {'keyword': 'a'}],
+                          key_func=lambda payload: payload['keyword']) == 2
+    assert queue.counts(KEYWORD_TOPIC) == {'queued': 3}
+
+def test_topics_are_separate(queue):
+    queue.put(KEYWORD_TOPIC, {'keyword': 'a'})
+    assert queue.lease(ARTICLE_TOPIC) is None
+    assert queue.lease(KEYWORD_TOPIC).payload == {'keyword': 'a'}
+
+def test_lease_is_exclusive_and_ack_finishes(queue):
+    queue.put(KEYWORD_TOPIC, {'keyword': 'a'})
+    job = queue.lease(KEYWORD_TOPIC)
+    assert job.payload == {'keyword': 'a'}
+    assert job.attempts == 1
+    assert queue.lease(KEYWORD_TOPIC) is None
+    assert queue.has_unfinished(KEYWORD_TOPIC)
+
+    queue.ack(job.id)
+    assert queue.counts(KEYWORD_TOPIC) == {'done': 1}
+    assert not queue.has_unfinished(KEYWORD_TOPIC)
+    assert queue.lease(KEYWORD_TOPIC) is None
+
+def test_lease_in_queue_order(queue):
+    for keyword in ('a', 'b', 'c'):
+        queue.put(KEYWORD_TOPIC, {'keyword': keyword})
+    assert [queue.lease(KEYWORD_TOPIC).payload['keyword'] for _ in range(3)] == ['a', 'b', 'c']
+
+def test_nack_requeues_after_delay(queue):
+    queue.put(KEYWORD_TOPIC, {'keyword': 'a'})
+    job = queue.lease(KEYWORD_TOPIC)
+    queue.nack(job.id, delay=60)
+    assert queue.counts(KEYWORD_TOPIC) == {'queued': 1}
+    assert queue.lease(KEYWORD_TOPIC) is None  # Not available before the delay
+
+    queue.nack(job.id, delay=0)
+    again = queue.lease(KEYWORD_TOPIC)
+    assert again.id == job.id
+    assert again.attempts == 2
+
+def test_nack_after_max_attempts_fails(queue):
+    queue.put(KEYWORD_TOPIC, {'keyword': 'a'})
+    for attempt in range(1, 4):
+        job = queue.lease(KEYWORD_TOPIC)
+        assert job.attempts == attempt
+        queue.nack(job.id)
+    assert queue.counts(KEYWORD_TOPIC) == {'failed': 1}
+    assert queue.lease(KEYWORD_TOPIC) is None
+    assert not queue.has_unfinished(KEYWORD_TOPIC)
+
+def test_expired_lease_is_taken_over_by_another_node(queue, queue_path):
+    other = SQLiteWorkQueue(queue_path, max_attempts=3, worker_id='node-b')
+    try:
+        queue.put(KEYWORD_TOPIC, {'keyword': 'a'})
+        job = queue.lease(KEYWORD_TOPIC, lease_seconds=0.05)
+        assert other.lease(KEYWORD_TOPIC) is None
+        time.sleep(0.1)
+        assert queue.counts(KEYWORD_TOPIC) == {'queued': 1}  # Expired leases count as queued
+
+        taken = other.lease(KEYWORD_TOPIC, lease_seconds=0.05)
+        assert taken.id == job.id
+        assert taken.attempts == 2
+
+        # A late extension by the first node does not touch the new owner's lease
+        queue.extend(job.id, lease_seconds=60)
+        time.sleep(0.1)
+        assert queue.counts(KEYWORD_TOPIC) == {'queued': 1}
+        other.ack(taken.id)
+        assert other.counts(KEYWORD_TOPIC) == {'done': 1}
+    finally:
+        other.close()
+
+def test_extend_keeps_the_lease(queue):
+    queue.put(KEYWORD_TOPIC, {'keyword': 'a'})
+    job = queue.lease(KEYWORD_TOPIC, lease_seconds=0.05)
+    queue.extend(job.id, lease_seconds=60)
+    time.sleep(0.1)
+    assert queue.lease(KEYWORD_TOPIC) is None
+    assert queue.counts(KEYWORD_TOPIC) == {'leased': 1}
+
+def test_lease_expiring_too_often_fails(queue_path):
+    queue = SQLiteWorkQueue(queue_path, max_attempts=2, worker_id='node-a')
+    try:
+        queue.put(KEYWORD_TOPIC, {'keyword': 'a'})
+        for _ in range(2):
+            assert queue.lease(KEYWORD_TOPIC, lease_seconds=0.01) is not None
+            time.sleep(0.05)
+        assert queue.lease(KEYWORD_TOPIC) is None
+        assert queue.counts(KEYWORD_TOPIC) == {'failed': 1}
+    finally:
+        queue.close()
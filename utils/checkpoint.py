@@ -0,0 +1,85 @@
+import os
+import json
+import time
+import logging
+import threading
+
+class CrawlCheckpoint:
+    """
+    Periodic on-disk checkpoint of a crawl, used to resume a run that died halfway
+
+    The checkpoint is a single JSON document holding the spider state (visited URLs,
+    per-keyword result counts, current page and next page URL) and the extraction
+    state (URLs already extracted and search results still waiting for extraction).
+    It is written to a temporary file and renamed, so a crash while saving never
+    leaves a truncated checkpoint behind.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path='checkpoints/crawl_state.json', interval=30, logger=None):
+        """
+        Initialize the checkpoint
+
+        Args:
+            path (str): Location of the checkpoint file
+            interval (float): Seconds between periodic saves
+            logger: Logger instance
+        """
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+        self.path = path
+        self.interval = interval
+        self._lock = threading.Lock()
+
+    def exists(self):
+        """Whether a checkpoint file is present"""
+        return os.path.exists(self.path)
+
+    def load(self):
+        """
+        Load the saved state
+
+        Returns:
+            dict: The saved state, or None if there is no usable checkpoint
+        """
+        if not self.exists():
+            return None
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.error(f"Could not read checkpoint {self.path}: {str(e)}")
+            return None
+
+        if state.get('version') != self.VERSION:
+            self.logger.warning(f"Ignoring checkpoint {self.path} with unsupported version {state.get('version')}")
+            return None
+
+        self.logger.info(f"Loaded checkpoint from {self.path} saved at {time.ctime(state.get('saved_at', 0))}")
+        return state
+
+    def save(self, state):
+        """
+        Atomically write the state to disk
+
+        Args:
+            state (dict): JSON-serializable crawl state
+        """
+        state = {**state, 'version': self.VERSION, 'saved_at': time.time()}
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        self.logger.debug(f"Checkpoint saved to {self.path}")
+
+    def clear(self):
+        """Remove the checkpoint file, e.g. after a run finished"""
+        with self._lock:
+            if self.exists():
+                os.remove(self.path)
+                self.logger.info(f"Removed checkpoint {self.path}")
@@ -0,0 +1,203 @@
+import os
+import time
+import random
+import sqlite3
+import logging
+import threading
+from urllib.parse import urlparse
+
+# Ways of fetching an article page
+STATIC = 'static'  # trafilatura.fetch_url, falling back to Selenium
+SELENIUM = 'selenium'  # Straight to the browser
+SKIP = 'skip'  # Nothing worked on this domain recently, return the search result only
+
+class FetchStrategyStore:
+    """
+    Persistent per-domain statistics of the fetch strategies, used to route new URLs
+
+    Every static fetch and Selenium render records whether content was extracted.
+    Counts decay by `decay` on each new outcome, so a domain that changes its setup
+    is re-learned after a few dozen pages. Once the decayed count of static attempts
+    of a domain reaches `min_samples`:
+      - static stays the route while its success rate is at least `static_threshold`;
+      - otherwise URLs go straight to Selenium, skipping the doomed static fetch;
+      - when Selenium also fails at least `skip_threshold` of the time, the domain is skipped.
+    Domains routed away from static are re-probed with the full static path at most
+    once every `reprobe_interval` seconds, so recovered sites are noticed.
+
+    Statistics are kept in memory and written to a SQLite file every `flush_every`
+    outcomes and on close.
+    """
+
+    def __init__(self, path='cache/fetch_strategy.sqlite3', min_samples=3, static_threshold=0.3,
+                 skip_threshold=0.9, reprobe_interval=6 * 3600, decay=0.95, flush_every=50, logger=None):
+        """
+        Open or create the store
+
+        Args:
+            path (str): SQLite file
+            min_samples (float): Decayed attempts of a strategy before its success rate is trusted
+            static_threshold (float): Minimum static success rate to keep fetching statically
+            skip_threshold (float): Selenium failure rate from which a domain is skipped
+            reprobe_interval (float): Seconds between two static probes of a rerouted domain
+            decay (float): Weight kept by the previous counts when an outcome is recorded
+            flush_every (int): Outcomes recorded between two writes to disk
+            logger: Logger instance
+        """
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+        self.path = path
+        self.min_samples = min_samples
+        self.static_threshold = static_threshold
+        self.skip_threshold = skip_threshold
+        self.reprobe_interval = reprobe_interval
+        self.decay = decay
+        self.flush_every = flush_every
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS domains (
+                domain TEXT PRIMARY KEY,
+                static_attempts REAL NOT NULL,
+                static_successes REAL NOT NULL,
+                selenium_attempts REAL NOT NULL,
+                selenium_successes REAL NOT NULL,
+                last_probe REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+        """)
+        self._domains = {
+            row[0]: {
+                'static_attempts': row[1],
+                'static_successes': row[2],
+                'selenium_attempts': row[3],
+                'selenium_successes': row[4],
+                'last_probe': row[5],
+                'updated_at': row[6],
+            }
+            for row in self._db.execute("SELECT * FROM domains")
+        }
+        self._dirty = set()
+        self._unsaved = 0
+        self.routed = {STATIC: 0, SELENIUM: 0, SKIP: 0}
+        self.probes = 0
+        self.logger.info(f"Loaded fetch statistics of {len(self._domains)} domains from {path}")
+
+    @staticmethod
+    def domain_of(url):
+        """Statistics key of a URL: its lowercase host without www."""
+        host = (urlparse(url).hostname or '').lower()
+        return host[4:] if host.startswith('www.') else host
+
+    @staticmethod
+    def _rate(successes, attempts):
+        return successes / attempts if attempts else None
+
+    def _route(self, stats):
+        """Strategy of a domain from its statistics alone"""
+        if stats['static_attempts'] < self.min_samples:
+            return STATIC
+        if self._rate(stats['static_successes'], stats['static_attempts']) >= self.static_threshold:
+            return STATIC
+        if stats['selenium_attempts'] < self.min_samples:
+            return SELENIUM
+        if 1 - self._rate(stats['selenium_successes'], stats['selenium_attempts']) >= self.skip_threshold:
+            return SKIP
+        return SELENIUM
+
+    def choose(self, url):
+        """
+        Pick the fetch strategy of a URL
+
+        Args:
+            url (str): Article URL
+
+        Returns:
+            str: STATIC, SELENIUM or SKIP
+        """
+        domain = self.domain_of(url)
+        with self._lock:
+            stats = self._domains.get(domain)
+            strategy = self._route(stats) if stats else STATIC
+            if strategy != STATIC:
+                now = time.time()
+                # Spread the probes of domains rerouted at the same time
+                if now - stats['last_probe'] >= self.reprobe_interval * random.uniform(0.9, 1.1):
+                    stats['last_probe'] = now
+                    self._dirty.add(domain)
+                    self.probes += 1
+                    strategy = STATIC
+            self.routed[strategy] += 1
+        return strategy
+
+    def record(self, url, strategy, success):
+        """
+        Record the outcome of a fetch strategy
+
+        Args:
+            url (str): Article URL
+            strategy (str): STATIC or SELENIUM
+            success (bool): Whether content was extracted
+        """
+        domain = self.domain_of(url)
+        prefix = 'static' if strategy == STATIC else 'selenium'
+        with self._lock:
+            stats = self._domains.get(domain)
+            if stats is None:
+                stats = self._domains[domain] = {
+                    'static_attempts': 0.0, 'static_successes': 0.0,
+                    'selenium_attempts': 0.0, 'selenium_successes': 0.0,
+                    'last_probe': 0.0, 'updated_at': 0.0,
+                }
+            stats[f'{prefix}_attempts'] = stats[f'{prefix}_attempts'] * self.decay + 1
+            stats[f'{prefix}_successes'] = stats[f'{prefix}_successes'] * self.decay + bool(success)
+            if strategy == STATIC:
+                stats['last_probe'] = time.time()  # Every static fetch tells whether the domain recovered
+            stats['updated_at'] = time.time()
+            self._dirty.add(domain)
+            self._unsaved += 1
+            if self._unsaved >= self.flush_every:
+                self._flush()
+
+    def describe(self, url):
+        """Statistics of the domain of a URL, or None if it was never fetched"""
+        with self._lock:
+            stats = self._domains.get(self.domain_of(url))
+            return dict(stats, strategy=self._route(stats)) if stats else None
+
+    def _flush(self):
+        """Write the changed domains to disk; the caller holds the lock"""
+        if not self._dirty:
+            return
+        rows = []
+        for domain in self._dirty:
+            stats = self._domains[domain]
+            rows.append((domain, stats['static_attempts'], stats['static_successes'], stats['selenium_attempts'],
+                         stats['selenium_successes'], stats['last_probe'], stats['updated_at']))
+        try:
+            with self._db:
+                self._db.executemany("INSERT OR REPLACE INTO domains VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._dirty.clear()
+            self._unsaved = 0
+        except sqlite3.Error as e:
+            self.logger.error(f"Failed to save fetch statistics to {self.path}: {str(e)}")
+
+    def stats(self):
+        with self._lock:
+            routes = [self._route(stats) for stats in self._domains.values()]
+            return {
+                'domains': len(self._domains),
+                'selenium_domains': routes.count(SELENIUM),
+                'skipped_domains': routes.count(SKIP),
+                'routed': dict(self.routed),
+                'probes': self.probes,
+            }
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._db.close()
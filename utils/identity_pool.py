@@ -0,0 +1,131 @@
+import time
+import logging
+import threading
+
+from utils.user_agents import get_lynx_useragent
+
+class Identity:
+    """
+    One client presented to Google: a cookie jar, a user agent and an optional proxy
+
+    The cookie jar is named by `cookiejar`, the key given to Scrapy's cookies
+    middleware; it changes after each quarantine so the identity comes back with
+    fresh cookies.
+    """
+
+    def __init__(self, identity_id, user_agent, proxy=None):
+        self.id = identity_id
+        self.user_agent = user_agent
+        self.proxy = proxy
+        self.generation = 0
+        self.in_flight = 0
+        self.requests = 0
+        self.strikes = 0  # Consecutive quarantines
+        self.quarantined_until = 0
+
+    @property
+    def cookiejar(self):
+        return f"{self.id}:{self.generation}"
+
+    @property
+    def download_slot(self):
+        return f"identity-{self.id}"
+
+    def __repr__(self):
+        return f"Identity({self.id}, proxy={self.proxy})"
+
+
+class IdentityPool:
+    """
+    Pool of identities spreading the SERP requests over several clients
+
+    Each identity serves at most `concurrency` requests at a time and the least
+    busy available identity is handed out. An identity that runs into a CAPTCHA is
+    quarantined for `cooldown` seconds, doubled for each consecutive quarantine up
+    to `max_cooldown`, and returns with a new cookie jar.
+    """
+
+    def __init__(self, size=4, proxies=None, user_agents=None, concurrency=1, cooldown=600,
+                 max_cooldown=3600, logger=None):
+        """
+        Initialize the pool
+
+        Args:
+            size (int): Number of identities (at least one per proxy)
+            proxies (list): Optional proxy URLs, assigned to the identities in turn
+            user_agents (list): Optional user agents, assigned in turn (default: random Lynx user agents)
+            concurrency (int): Requests in flight per identity
+            cooldown (float): Seconds of the first quarantine
+            max_cooldown (float): Longest quarantine
+            logger: Logger instance
+        """
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+        proxies = list(proxies or [])
+        user_agents = list(user_agents or [])
+        size = max(1, int(size), len(proxies))
+        self.identities = [
+            Identity(
+                index,
+                user_agents[index % len(user_agents)] if user_agents else get_lynx_useragent(),
+                proxies[index % len(proxies)] if proxies else None
+            )
+            for index in range(size)
+        ]
+        self.concurrency = max(1, int(concurrency))
+        self.cooldown = float(cooldown)
+        self.max_cooldown = float(max_cooldown)
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take the least busy identity that is not quarantined and has a free slot
+
+        Returns:
+            Identity: The identity, or None if every identity is busy or quarantined
+        """
+        now = time.time()
+        with self._lock:
+            available = [identity for identity in self.identities
+                         if identity.quarantined_until <= now and identity.in_flight < self.concurrency]
+            if not available:
+                return None
+            identity = min(available, key=lambda identity: (identity.in_flight, identity.requests))
+            identity.in_flight += 1
+            identity.requests += 1
+            return identity
+
+    def release(self, identity, blocked=False):
+        """
+        Give an identity back after its request finished
+
+        Args:
+            identity (Identity): The identity returned by acquire()
+            blocked (bool): Whether Google answered the request with a CAPTCHA
+        """
+        with self._lock:
+            identity.in_flight = max(0, identity.in_flight - 1)
+            if blocked:
+                self._quarantine(identity)
+            elif identity.quarantined_until <= time.time():
+                identity.strikes = 0
+
+    def _quarantine(self, identity):
+        if identity.quarantined_until > time.time():
+            return  # Another request of the identity was blocked already
+        cooldown = min(self.max_cooldown, self.cooldown * 2 ** identity.strikes)
+        identity.strikes += 1
+        identity.generation += 1  # Fresh cookies after the quarantine
+        identity.quarantined_until = time.time() + cooldown
+        self.logger.warning(f"Identity {identity.id} quarantined for {cooldown:.0f}s after a CAPTCHA")
+
+    def next_available_in(self):
+        """Seconds until a quarantined identity comes back, 0 if one is available now"""
+        now = time.time()
+        with self._lock:
+            return max(0, min(identity.quarantined_until for identity in self.identities) - now)
+
+    def quarantined(self):
+        """Number of identities currently quarantined"""
+        now = time.time()
+        with self._lock:
+            return sum(1 for identity in self.identities if identity.quarantined_until > now)
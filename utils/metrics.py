@@ -0,0 +1,209 @@
+import json
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Upper bounds in seconds of the latency histogram buckets, from 1 ms to 2 minutes
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+class Histogram:
+    """
+    Latency histogram with fixed buckets, in the Prometheus cumulative layout
+
+    Memory does not grow with the number of observations; quantiles are estimated
+    by linear interpolation inside the bucket holding them.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot counts values above every bucket
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, fraction):
+        """Estimate a quantile of the observed values"""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                return min(self.max, lower + (upper - lower) * (rank - seen) / count)
+            seen += count
+        return self.max
+
+    def summary(self):
+        quantiles = {name: self.quantile(fraction) for name, fraction in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99))}
+        return {
+            'count': self.count,
+            'total_s': round(self.sum, 4),
+            'mean_ms': round(self.sum / self.count * 1000, 3) if self.count else None,
+            **{name: round(value * 1000, 3) if value is not None else None for name, value in quantiles.items()},
+            'max_ms': round(self.max * 1000, 3),
+        }
+
+
+class MetricsRegistry:
+    """
+    Thread-safe registry of the counters and latency histograms of the pipeline stages
+
+    Metrics are identified by a name and optional labels, e.g.
+    metrics.observe('stage_seconds', 0.12, stage='bare_extraction') or
+    metrics.inc('cache_requests_total', cache='serp', result='hit').
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}  # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> Histogram
+        self.started = time.time()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        """Add to a counter"""
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        """Record a duration in a histogram"""
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Time the enclosed block into a histogram"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def counter(self, name, **labels):
+        with self._lock:
+            return self._counters.get(self._key(name, labels), 0)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self.started = time.time()
+
+    @staticmethod
+    def _label_text(labels, extra=()):
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ''
+        escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+        return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+    def render_prometheus(self):
+        """Render every metric in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            typed = set()
+            for (name, labels), value in counters:
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                lines.append(f"{name}{self._label_text(labels)} {value}")
+            for (name, labels), histogram in histograms:
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{self._label_text(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_bucket{self._label_text(labels, [('le', '+Inf')])} {histogram.count}")
+                lines.append(f"{name}_sum{self._label_text(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{self._label_text(labels)} {histogram.count}")
+        lines.append(f"process_uptime_seconds {time.time() - self.started}")
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _display_name(name, labels):
+        return name + ''.join(f"[{key}={value}]" for key, value in labels)
+
+    def summary(self):
+        """Counters and histogram summaries, with rates per second of run time"""
+        elapsed = max(time.time() - self.started, 1e-9)
+        with self._lock:
+            counters = {self._display_name(name, labels): value
+                        for (name, labels), value in sorted(self._counters.items())}
+            histograms = {self._display_name(name, labels): histogram.summary()
+                          for (name, labels), histogram in sorted(self._histograms.items(), key=lambda item: item[0])}
+        for histogram in histograms.values():
+            histogram['per_s'] = round(histogram['count'] / elapsed, 3)
+        return {
+            'started': datetime.fromtimestamp(self.started).isoformat(timespec='seconds'),
+            'elapsed_s': round(elapsed, 2),
+            'counters': counters,
+            'histograms': histograms,
+        }
+
+    def write_summary(self, path):
+        """Save the summary as JSON and return it"""
+        summary = self.summary()
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        return summary
+
+
+class MetricsServer:
+    """HTTP endpoint serving a registry in the Prometheus format at /metrics"""
+
+    def __init__(self, registry, port=9108, host='127.0.0.1', logger=None):
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+        self.registry = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path.split('?')[0] not in ('/metrics', '/'):
+                    handler.send_error(404)
+                    return
+                body = registry.render_prometheus().encode('utf-8')
+                handler.send_response(200)
+                handler.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                handler.send_header('Content-Length', str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='metrics-server', daemon=True)
+        self._thread.start()
+        self.logger.info(f"Serving metrics at http://{host}:{self.httpd.server_address[1]}/metrics")
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+# Process-wide registry shared by the crawler, the scraper and main
+metrics = MetricsRegistry()
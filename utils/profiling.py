@@ -0,0 +1,241 @@
+import os
+import io
+import random
+import pstats
+import cProfile
+import inspect
+import logging
+import functools
+import threading
+import tracemalloc
+from datetime import datetime
+
+# cProfile (since Python 3.12) and tracemalloc are process-wide: one sampled call is profiled at a time
+_profiling_lock = threading.Lock()
+
+# Allocations of the profiler itself and of the import machinery, left out of the report
+TRACE_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+class SampledProfiler:
+    """
+    Opt-in cProfile and tracemalloc instrumentation of selected methods
+
+    `instrument` replaces a method on its class with a wrapper that profiles a random
+    `sample_rate` fraction of the calls; the other calls only pay for a random draw.
+    Generator methods such as Spider.parse are profiled across every resumption.
+    cProfile and tracemalloc are process-wide, so a single sampled call is profiled at
+    a time: a call sampled while another one is profiled, on any thread (scrape calling
+    _process_extracted_content, or a concurrent extraction), runs unprofiled, and so
+    does a call whose profiler fails to start, e.g. because another tool is active.
+
+    tracemalloc only runs during the profiled calls; the blocks each of them still
+    holds when it returns are added up per allocation site. Allocations made by other
+    threads during a profiled call are included. `dump` writes the merged pstats of
+    each method and the top allocation sites to a directory.
+    """
+
+    def __init__(self, sample_rate=0.1, traceback_frames=1, top=30, logger=None):
+        """
+        Initialize the profiler
+
+        Args:
+            sample_rate (float): Fraction of the calls profiled, between 0 and 1
+            traceback_frames (int): Frames stored per allocation by tracemalloc
+            top (int): Number of functions and allocation sites in the report
+            logger: Logger instance
+        """
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+        self.sample_rate = max(0.0, min(1.0, sample_rate))
+        self.traceback_frames = max(1, traceback_frames)
+        self.top = top
+        self._lock = threading.Lock()
+        self._stats = {}  # label -> merged pstats.Stats
+        self._calls = {}  # label -> [calls, profiled calls]
+        self._allocations = {}  # (filename, lineno) -> [bytes, blocks] still held after the profiled calls
+        self._peak = 0  # Highest traced memory during a profiled call
+        self._trace_allocations = True
+        self._patched = []  # (class, name, original attribute)
+
+    def start(self):
+        # Traces started by someone else (PYTHONTRACEMALLOC) cannot be split per call
+        self._trace_allocations = not tracemalloc.is_tracing()
+        if not self._trace_allocations:
+            self.logger.warning("tracemalloc is already running, allocations will not be reported")
+        self.logger.info(f"Profiling {self.sample_rate:.0%} of the calls to "
+                         f"{', '.join(self._calls) or 'no method'}")
+
+    def instrument(self, cls, name, label=None):
+        """
+        Profile the sampled calls of a method
+
+        Args:
+            cls: Class defining the method
+            name (str): Method name
+            label (str): Name used in the report (default: Class.method)
+        """
+        label = label or f"{cls.__name__}.{name}"
+        original = cls.__dict__[name]
+        wrapper = (self._wrap_generator if inspect.isgeneratorfunction(original) else self._wrap_function)(original, label)
+        self._calls[label] = [0, 0]
+        self._patched.append((cls, name, original))
+        setattr(cls, name, wrapper)
+
+    def restore(self):
+        """Put the original methods back"""
+        for cls, name, original in reversed(self._patched):
+            setattr(cls, name, original)
+        self._patched.clear()
+
+    def _should_sample(self, label):
+        with self._lock:
+            self._calls[label][0] += 1
+        return random.random() < self.sample_rate
+
+    def _enable(self, profile):
+        """
+        Start profiling the current thread
+
+        Returns:
+            bool: False if another call is being profiled or the profilers could not start
+        """
+        if not _profiling_lock.acquire(blocking=False):
+            return False
+        try:
+            if self._trace_allocations:
+                tracemalloc.start(self.traceback_frames)
+            profile.enable()
+            return True
+        except Exception as e:
+            self.logger.debug(f"Could not start profiling, running the call unprofiled: {str(e)}")
+            if self._trace_allocations:
+                tracemalloc.stop()
+            _profiling_lock.release()
+            return False
+
+    def _disable(self, profile):
+        """Stop profiling and record the blocks still held by the profiled code"""
+        snapshot = None
+        peak = 0
+        try:
+            profile.disable()
+            if self._trace_allocations:
+                peak = tracemalloc.get_traced_memory()[1]
+                snapshot = tracemalloc.take_snapshot().filter_traces(TRACE_FILTERS)
+        except Exception as e:
+            self.logger.debug(f"Could not stop profiling cleanly: {str(e)}")
+        finally:
+            if self._trace_allocations:
+                tracemalloc.stop()
+            _profiling_lock.release()
+
+        if snapshot is None:
+            return
+        statistics = snapshot.statistics('lineno')
+        with self._lock:
+            self._peak = max(self._peak, peak)
+            for statistic in statistics:
+                frame = statistic.traceback[0]
+                totals = self._allocations.setdefault((frame.filename, frame.lineno), [0, 0])
+                totals[0] += statistic.size
+                totals[1] += statistic.count
+
+    def _merge(self, label, profile):
+        try:
+            stats = pstats.Stats(profile)
+        except TypeError:
+            return  # Nothing was recorded, e.g. a generator closed before its first step
+        with self._lock:
+            self._calls[label][1] += 1
+            if label in self._stats:
+                self._stats[label].add(stats)
+            else:
+                self._stats[label] = stats
+
+    def _wrap_function(self, function, label):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not self._should_sample(label):
+                return function(*args, **kwargs)
+            profile = cProfile.Profile()
+            if not self._enable(profile):
+                return function(*args, **kwargs)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self._disable(profile)
+                self._merge(label, profile)
+        return wrapper
+
+    def _wrap_generator(self, function, label):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not self._should_sample(label):
+                yield from function(*args, **kwargs)
+                return
+            profile = cProfile.Profile()
+            profiled = False
+            generator = function(*args, **kwargs)
+            try:
+                while True:
+                    # Only the work done inside the generator is profiled, not its consumer
+                    enabled = self._enable(profile)
+                    try:
+                        item = next(generator)
+                    except StopIteration:
+                        return
+                    finally:
+                        if enabled:
+                            self._disable(profile)
+                            profiled = True
+                    yield item
+            finally:
+                generator.close()
+                if profiled:
+                    self._merge(label, profile)
+        return wrapper
+
+    def dump(self, directory='logs'):
+        """
+        Write the profiles and the allocation report
+
+        Args:
+            directory (str): Parent directory of the profile_<timestamp> directory
+
+        Returns:
+            str: The directory written
+        """
+        output_dir = os.path.join(directory, f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+        os.makedirs(output_dir, exist_ok=True)
+
+        report = io.StringIO()
+        with self._lock:
+            calls = {label: tuple(counts) for label, counts in self._calls.items()}
+            profiles = dict(self._stats)
+            allocations = sorted(self._allocations.items(), key=lambda item: -item[1][0])[:self.top]
+            peak = self._peak
+        for label, (total, sampled) in calls.items():
+            report.write(f"===== {label}: {sampled} of {total} calls profiled =====\n")
+            stats = profiles.get(label)
+            if stats is None:
+                report.write("No sampled call\n\n")
+                continue
+            stats.dump_stats(os.path.join(output_dir, f"{label}.pstats"))
+            stats.stream = report
+            stats.sort_stats('cumulative').print_stats(self.top)
+
+        if self._trace_allocations:
+            report.write(f"===== Top allocation sites of the profiled calls (blocks held when they returned, "
+                         f"peak {peak / 1024 / 1024:.1f} MB during a call) =====\n")
+            for (filename, lineno), (size, count) in allocations:
+                report.write(f"{filename}:{lineno}: size={size / 1024:.1f} KiB, count={count}\n")
+
+        report_file = os.path.join(output_dir, 'report.txt')
+        with open(report_file, 'w', encoding='utf-8') as f:
+            f.write(report.getvalue())
+        self.logger.info(f"Profiles saved to {output_dir} (open with python -m pstats {output_dir}/<method>.pstats)")
+        return output_dir
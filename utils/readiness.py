@@ -0,0 +1,232 @@
+import json
+import time
+import logging
+
+from utils.metrics import metrics
+
+# Installs a MutationObserver recording the time of the last DOM change, then reports
+# whether the document is parsed and has not changed for arguments[0] milliseconds.
+# The observer is installed again after a navigation replaced the window.
+DOM_QUIET_SCRIPT = """
+if (!window.__readiness) {
+    window.__readiness = {last: performance.now()};
+    new MutationObserver(function () { window.__readiness.last = performance.now(); })
+        .observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+}
+return document.readyState !== 'loading' && !!document.body
+    && performance.now() - window.__readiness.last >= arguments[0];
+"""
+
+# Number of finished resource loads, used when the driver has no performance log
+RESOURCE_COUNT_SCRIPT = """
+return [document.readyState, performance.getEntriesByType('resource').length];
+"""
+
+# Markers of a Google CAPTCHA page, so a blocked SERP is handed to the CAPTCHA check at once
+CAPTCHA_SELECTORS = ("form[action*='/sorry']", "#captcha-form", "iframe[src*='recaptcha']")
+
+class ReadinessCondition:
+    """
+    A condition telling when a page loaded in a driver is usable
+
+    `prepare` runs before the navigation and `check` is polled after it until it
+    returns True or `timeout` seconds have passed since the navigation ended.
+    """
+
+    name = 'condition'
+
+    def __init__(self, timeout=10):
+        self.timeout = timeout
+
+    def prepare(self, driver):
+        """Reset any state kept from the previous page"""
+
+    def check(self, driver):
+        raise NotImplementedError
+
+
+class ElementPresent(ReadinessCondition):
+    """Ready once an element matches any of the CSS selectors"""
+
+    name = 'element'
+
+    def __init__(self, *selectors, timeout=10, name=None):
+        super().__init__(timeout)
+        self.selectors = selectors
+        self.script = f"return !!document.querySelector({json.dumps(', '.join(selectors))});"
+        if name:
+            self.name = name
+
+    def check(self, driver):
+        return bool(driver.execute_script(self.script))
+
+
+class DomQuiescence(ReadinessCondition):
+    """Ready once the document is parsed and its DOM has not changed for `quiet_time` seconds"""
+
+    name = 'dom'
+
+    def __init__(self, quiet_time=0.5, timeout=10):
+        super().__init__(timeout)
+        self.quiet_ms = quiet_time * 1000
+
+    def check(self, driver):
+        return bool(driver.execute_script(DOM_QUIET_SCRIPT, self.quiet_ms))
+
+
+class NetworkIdle(ReadinessCondition):
+    """
+    Ready once no request has been in flight for `idle_time` seconds
+
+    Requests are followed through the Chrome DevTools Network events of the driver's
+    performance log (selenium_driver_factory's performance_log option). Drivers
+    without that log fall back to the Resource Timing API: the page is idle once it
+    is complete and no resource finished loading for `idle_time` seconds.
+    """
+
+    name = 'network'
+
+    def __init__(self, idle_time=0.5, max_in_flight=0, timeout=10):
+        super().__init__(timeout)
+        self.idle_time = idle_time
+        self.max_in_flight = max_in_flight
+        self._in_flight = set()
+        self._last_activity = 0.0
+        self._resource_count = None
+        self._use_log = True
+
+    def prepare(self, driver):
+        self._in_flight.clear()
+        self._resource_count = None
+        self._last_activity = time.monotonic()
+        if self._use_log:
+            try:
+                driver.get_log('performance')  # Drop the events of the previous page
+            except Exception:
+                self._use_log = False
+
+    def _read_log(self, driver):
+        for entry in driver.get_log('performance'):
+            try:
+                message = json.loads(entry['message'])['message']
+            except (KeyError, ValueError, TypeError):
+                continue
+            method = message.get('method', '')
+            request_id = message.get('params', {}).get('requestId')
+            if method == 'Network.requestWillBeSent':
+                self._in_flight.add(request_id)
+            elif method in ('Network.loadingFinished', 'Network.loadingFailed'):
+                self._in_flight.discard(request_id)
+            else:
+                continue
+            self._last_activity = time.monotonic()
+
+    def _read_resources(self, driver):
+        ready_state, resource_count = driver.execute_script(RESOURCE_COUNT_SCRIPT)
+        if ready_state != 'complete' or resource_count != self._resource_count:
+            self._resource_count = resource_count
+            self._last_activity = time.monotonic()
+
+    def check(self, driver):
+        if self._use_log:
+            try:
+                self._read_log(driver)
+            except Exception:
+                self._use_log = False
+        if not self._use_log:
+            self._read_resources(driver)
+        return (len(self._in_flight) <= self.max_in_flight
+                and time.monotonic() - self._last_activity >= self.idle_time)
+
+
+def serp_ready(timeout=10):
+    """Google result page condition: a result block or a CAPTCHA is on the page"""
+    return ElementPresent('div.ezO2md', *CAPTCHA_SELECTORS, timeout=timeout, name='serp')
+
+# Condition names usable in settings and request meta
+CONDITIONS = {
+    'dom': DomQuiescence,
+    'network': NetworkIdle,
+    'serp': serp_ready,
+    'body': lambda timeout=10: ElementPresent('body', timeout=timeout, name='body'),
+}
+
+class PageReadiness:
+    """
+    Waits until a page is usable instead of sleeping a fixed time
+
+    Conditions are polled together every `poll_interval` seconds after the navigation.
+    Each one stops being waited for at its own deadline; `wait` returns as soon as
+    every condition is met (require='all') or one of them is (require='any'), or when
+    every condition has met or passed its deadline.
+    """
+
+    def __init__(self, conditions, require='all', poll_interval=0.1, logger=None):
+        """
+        Args:
+            conditions (list): ReadinessCondition instances
+            require (str): 'all' or 'any'
+            poll_interval (float): Seconds between two checks
+            logger: Logger instance
+        """
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+        self.conditions = list(conditions)
+        self.require = require
+        self.poll_interval = poll_interval
+
+    @classmethod
+    def from_names(cls, names, timeout=10, **kwargs):
+        """
+        Build the conditions from their names in CONDITIONS
+
+        Args:
+            names (list): Condition names, e.g. ['dom', 'network']
+            timeout (float): Deadline of every condition in seconds
+        """
+        if isinstance(names, str):
+            names = [names]
+        unknown = [name for name in names if name not in CONDITIONS]
+        if unknown:
+            raise ValueError(f"Unknown readiness conditions {unknown}, expected some of {sorted(CONDITIONS)}")
+        return cls([CONDITIONS[name](timeout=timeout) for name in names], **kwargs)
+
+    def prepare(self, driver):
+        """Call before loading the page"""
+        for condition in self.conditions:
+            condition.prepare(driver)
+
+    def wait(self, driver):
+        """
+        Wait for the page loaded in the driver to be usable
+
+        Returns:
+            dict: Condition name -> 'ready', 'timeout' or 'error'
+        """
+        start = time.monotonic()
+        states = {}
+        pending = list(self.conditions)
+        while pending:
+            now = time.monotonic()
+            for condition in list(pending):
+                try:
+                    ready = condition.check(driver)
+                except Exception as e:
+                    self.logger.debug(f"Readiness condition {condition.name} failed: {str(e)}")
+                    states[condition.name] = 'error'
+                    pending.remove(condition)
+                    continue
+                if ready:
+                    states[condition.name] = 'ready'
+                    pending.remove(condition)
+                elif now - start >= condition.timeout:
+                    states[condition.name] = 'timeout'
+                    pending.remove(condition)
+            if self.require == 'any' and 'ready' in states.values():
+                break
+            if pending:
+                time.sleep(self.poll_interval)
+
+        metrics.observe('stage_seconds', time.monotonic() - start, stage='readiness_wait')
+        for name, state in states.items():
+            metrics.inc('readiness_total', condition=name, state=state)
+        return states
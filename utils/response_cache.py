@@ -0,0 +1,233 @@
+import os
+import time
+import zlib
+import sqlite3
+import hashlib
+import logging
+import threading
+
+from utils.url import normalize_url
+
+class ResponseCache:
+    """
+    Persistent on-disk cache of downloaded pages.
+
+    Bodies are zlib-compressed and stored once per content hash under `objects/`,
+    so identical pages reached through different URLs share one file. A SQLite index
+    maps each (namespace, normalized URL) key to its content hash. Entries expire after
+    `ttl` seconds and the least recently used entries are evicted once the stored
+    bodies exceed `max_size_mb`.
+    """
+
+    def __init__(self, cache_dir='cache/responses', ttl=7 * 24 * 3600, max_size_mb=1024,
+                 compression_level=6, logger=None):
+        """
+        Initialize the cache
+
+        Args:
+            cache_dir (str): Directory holding the index and the compressed bodies
+            ttl (float): Seconds after which an entry is stale (0 disables expiry)
+            max_size_mb (float): Maximum total size of the compressed bodies in MB (0 disables eviction)
+            compression_level (int): zlib compression level
+            logger: Logger instance
+        """
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+        self.cache_dir = cache_dir
+        self.objects_dir = os.path.join(cache_dir, 'objects')
+        self.ttl = ttl
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.compression_level = compression_level
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(cache_dir, 'index.sqlite3'), check_same_thread=False)
+        self._db.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                digest TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at);
+            CREATE INDEX IF NOT EXISTS entries_digest ON entries (digest);
+            CREATE TABLE IF NOT EXISTS blobs (
+                digest TEXT PRIMARY KEY,
+                size INTEGER NOT NULL
+            );
+        """)
+        self._db.commit()
+        self._total_size = self._stored_size()  # Running total of the blob sizes, kept by store and _delete_entry
+
+    @staticmethod
+    def make_key(url, namespace='page'):
+        """Build the index key of a URL; the namespace separates e.g. static and rendered pages"""
+        return f"{namespace}:{normalize_url(url)}"
+
+    def _blob_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def _stored_size(self):
+        return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+    def _delete_entry(self, key, digest):
+        """Remove an index entry and its body once no other entry references it (lock held)"""
+        self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+        still_used = self._db.execute("SELECT 1 FROM entries WHERE digest = ? LIMIT 1", (digest,)).fetchone()
+        if still_used:
+            return
+        row = self._db.execute("SELECT size FROM blobs WHERE digest = ?", (digest,)).fetchone()
+        if row:
+            self._total_size -= row[0]
+        self._db.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+        try:
+            os.remove(self._blob_path(digest))
+        except FileNotFoundError:
+            pass
+
+    def get(self, url, namespace='page'):
+        """
+        Look up a cached page
+
+        Args:
+            url (str): The page URL
+            namespace (str): Cache namespace
+
+        Returns:
+            str: The cached page, or None on a miss or a stale entry
+        """
+        return self.lookup(self.make_key(url, namespace))
+
+    def put(self, url, content, namespace='page'):
+        """
+        Store a page in the cache
+
+        Args:
+            url (str): The page URL
+            content (str): The downloaded page
+            namespace (str): Cache namespace
+        """
+        self.store(self.make_key(url, namespace), content)
+
+    def lookup(self, key, ttl=None):
+        """
+        Look up a cached body by its raw index key
+
+        Args:
+            key (str): Index key (see make_key)
+            ttl (float): Freshness window overriding the cache TTL for this lookup
+
+        Returns:
+            str: The cached body, or None on a miss or a stale entry
+        """
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT digest, created_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            digest, created_at = row
+            if ttl and now - created_at > ttl:
+                self._delete_entry(key, digest)
+                self._db.commit()
+                self.misses += 1
+                return None
+
+            try:
+                with open(self._blob_path(digest), 'rb') as f:
+                    content = zlib.decompress(f.read()).decode('utf-8')
+            except (OSError, zlib.error) as e:
+                self.logger.warning(f"Dropping unreadable cache entry {key}: {str(e)}")
+                self._delete_entry(key, digest)
+                self._db.commit()
+                self.misses += 1
+                return None
+
+            self._db.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self.hits += 1
+            return content
+
+    def store(self, key, content):
+        """
+        Store a body under a raw index key
+
+        Args:
+            key (str): Index key (see make_key)
+            content (str): The body to store
+        """
+        if not content:
+            return
+
+        data = content.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        now = time.time()
+
+        with self._lock:
+            known = self._db.execute("SELECT 1 FROM blobs WHERE digest = ?", (digest,)).fetchone()
+            if not known:
+                compressed = zlib.compress(data, self.compression_level)
+                path = self._blob_path(digest)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # Write to a temporary file first so a crash never leaves a truncated body
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(compressed)
+                os.replace(tmp_path, path)
+                self._db.execute("INSERT INTO blobs (digest, size) VALUES (?, ?)", (digest, len(compressed)))
+                self._total_size += len(compressed)
+
+            previous = self._db.execute("SELECT digest FROM entries WHERE key = ?", (key,)).fetchone()
+            if previous and previous[0] != digest:
+                self._delete_entry(key, previous[0])
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, digest, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, digest, now, now)
+            )
+            self._evict()
+            self._db.commit()
+
+    def _evict(self, batch_size=100):
+        """Drop least recently used entries until the bodies fit in max_size (lock held)"""
+        if not self.max_size or self._total_size <= self.max_size:
+            return
+
+        # Another process sharing the directory may have added or evicted bodies
+        self._total_size = self._stored_size()
+        while self._total_size > self.max_size:
+            # Oldest entries first, read in batches through the accessed_at index
+            oldest = self._db.execute("SELECT key, digest FROM entries ORDER BY accessed_at LIMIT ?",
+                                      (batch_size,)).fetchall()
+            if not oldest:
+                break
+            for key, digest in oldest:
+                self._delete_entry(key, digest)
+                self.evictions += 1
+                if self._total_size <= self.max_size:
+                    break
+
+    def stats(self):
+        """Return the hit/miss counters and the current size of the cache"""
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            size = self._stored_size()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': entries,
+            'size_mb': round(size / (1024 * 1024), 2),
+        }
+
+    def close(self):
+        """Close the index database"""
+        with self._lock:
+            self._db.close()
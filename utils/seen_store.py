@@ -0,0 +1,169 @@
+import os
+import math
+import mmap
+import sqlite3
+import hashlib
+import logging
+import threading
+
+from utils.url import canonicalize_url
+
+class BloomFilter:
+    """
+    Bloom filter over a memory-mapped bit array file
+
+    The bit array is sized for `capacity` items at the false positive rate `error_rate`
+    and lives in a file, so it survives across runs and is paged in lazily by the OS.
+    Positions are derived from a 16-byte digest with double hashing.
+    """
+
+    HEADER = b'BLOOM1'
+
+    def __init__(self, path, capacity=10_000_000, error_rate=0.001):
+        """
+        Open or create the filter
+
+        Args:
+            path (str): Bit array file
+            capacity (int): Expected number of items
+            error_rate (float): Target false positive rate at capacity
+        """
+        self.path = path
+        self.bit_count = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.bit_count / capacity * math.log(2)))
+        size = len(self.HEADER) + (self.bit_count + 7) // 8
+
+        self.created = not os.path.exists(path)
+        if self.created or os.path.getsize(path) != size:
+            # New filter, or sized for another capacity: start from an empty bit array
+            self.created = True
+            with open(path, 'wb') as f:
+                f.write(self.HEADER)
+                f.truncate(size)
+
+        self._file = open(path, 'r+b')
+        self._bits = mmap.mmap(self._file.fileno(), size)
+        self._offset = len(self.HEADER)
+
+    def _positions(self, digest):
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:16], 'little') | 1
+        return [(first + i * second) % self.bit_count for i in range(self.hash_count)]
+
+    def add(self, digest):
+        """Set the bits of a 16-byte digest"""
+        for position in self._positions(digest):
+            index = self._offset + (position >> 3)
+            self._bits[index] |= 1 << (position & 7)
+
+    def __contains__(self, digest):
+        bits = self._bits
+        offset = self._offset
+        return all(bits[offset + (position >> 3)] & (1 << (position & 7))
+                   for position in self._positions(digest))
+
+    def flush(self):
+        self._bits.flush()
+
+    def close(self):
+        self._bits.flush()
+        self._bits.close()
+        self._file.close()
+
+
+class SeenUrlStore:
+    """
+    Persistent set of canonical URLs already processed by previous runs
+
+    Membership is checked against a Bloom filter first, so the common "never seen"
+    answer costs no disk access. Positive answers are confirmed in an exact SQLite
+    index of 16-byte URL digests, which keeps the store exact and compact enough for
+    hundreds of millions of URLs.
+    """
+
+    def __init__(self, directory='cache/seen_urls', capacity=10_000_000, error_rate=0.001,
+                 commit_every=1000, logger=None):
+        """
+        Open or create the store
+
+        Args:
+            directory (str): Directory holding the Bloom filter and the exact index
+            capacity (int): Expected number of URLs, used to size the Bloom filter
+            error_rate (float): Bloom filter false positive rate at capacity
+            commit_every (int): Number of additions between index commits
+            logger: Logger instance
+        """
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+        os.makedirs(directory, exist_ok=True)
+        self.commit_every = max(1, int(commit_every))
+        self._uncommitted = 0
+        self._lock = threading.Lock()
+
+        self._db = sqlite3.connect(os.path.join(directory, 'seen.sqlite3'), check_same_thread=False)
+        self._db.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS seen (digest BLOB PRIMARY KEY) WITHOUT ROWID;
+        """)
+        self._bloom = BloomFilter(os.path.join(directory, 'seen.bloom'), capacity, error_rate)
+        if self._bloom.created:
+            self._rebuild_bloom()
+
+    def _rebuild_bloom(self):
+        """Fill a new Bloom filter from the exact index"""
+        count = 0
+        for (digest,) in self._db.execute("SELECT digest FROM seen"):
+            self._bloom.add(digest)
+            count += 1
+        self._bloom.flush()
+        if count:
+            self.logger.info(f"Rebuilt seen-URL Bloom filter from {count} stored URLs")
+
+    @staticmethod
+    def digest(url):
+        """16-byte digest of the canonical form of a URL"""
+        return hashlib.blake2b(canonicalize_url(url).encode('utf-8'), digest_size=16).digest()
+
+    def __contains__(self, url):
+        digest = self.digest(url)
+        with self._lock:
+            if digest not in self._bloom:
+                return False
+            return self._db.execute("SELECT 1 FROM seen WHERE digest = ?", (digest,)).fetchone() is not None
+
+    def add(self, url):
+        """
+        Record a URL as seen
+
+        Returns:
+            bool: True if the URL was not in the store yet
+        """
+        digest = self.digest(url)
+        with self._lock:
+            cursor = self._db.execute("INSERT OR IGNORE INTO seen (digest) VALUES (?)", (digest,))
+            self._bloom.add(digest)
+            self._uncommitted += 1
+            if self._uncommitted >= self.commit_every:
+                self._commit()
+            return cursor.rowcount == 1
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM seen").fetchone()[0]
+
+    def _commit(self):
+        self._db.commit()
+        self._bloom.flush()
+        self._uncommitted = 0
+
+    def flush(self):
+        """Persist pending additions"""
+        with self._lock:
+            self._commit()
+
+    def close(self):
+        """Persist pending additions and close the files"""
+        with self._lock:
+            self._commit()
+            self._bloom.close()
+            self._db.close()
@@ -1,11 +1,102 @@
+import os
+import atexit
+import logging
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
 from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
 from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
 
-def selenium_driver_factory(headless=False):
-    """Create and return a Chrome WebDriver instance compatible with Selenium 4.x"""
+try:
+    import psutil
+except ImportError:  # Installed with requirements.txt; without it the browser memory cap is disabled
+    psutil = None
+
+# Resources never needed to read a page's HTML, blocked by the lean profile through CDP
+LEAN_BLOCKED_URLS = [
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.avif', '*.svg', '*.ico', '*.bmp',
+    '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot',
+    '*.mp4', '*.webm', '*.m3u8', '*.mp3', '*.ogg', '*.wav',
+    '*doubleclick.net*', '*googlesyndication.com*', '*google-analytics.com*', '*googletagmanager.com*',
+]
+LEAN_CSS_URLS = ['*.css']
+
+# Chrome switches of the lean profile lowering the memory and background work of each browser
+LEAN_CHROME_ARGS = [
+    '--disable-gpu',
+    '--disable-extensions',
+    '--disable-background-networking',
+    '--disable-background-timer-throttling',
+    '--disable-component-update',
+    '--disable-default-apps',
+    '--disable-sync',
+    '--disable-notifications',
+    '--no-first-run',
+    '--mute-audio',
+    '--autoplay-policy=user-gesture-required',
+    '--disable-features=Translate,MediaRouter,OptimizationHints,AutofillServerCommunication',
+    '--renderer-process-limit=2',
+    '--js-flags=--max-old-space-size=256',
+    '--disk-cache-size=268435456',
+]
+
+# Persistent profile directories in use by a driver of this process
+_profile_dirs = {}
+_profile_dirs_lock = threading.Lock()
+_RESERVED = object()
+
+def _driver_running(driver):
+    process = getattr(getattr(driver, 'service', None), 'process', None)
+    return process is not None and process.poll() is None
+
+def _claim_profile_dir(root):
+    """
+    Pick a profile directory under `root` not used by a running browser of this process
+
+    Chrome locks its user data directory, so each browser of the pool gets its own
+    profile-<n> directory; a recycled browser's directory is reused by the next one.
+    """
+    with _profile_dirs_lock:
+        for index in itertools.count():
+            directory = os.path.abspath(os.path.join(root, f'profile-{index}'))
+            owner = _profile_dirs.get(directory)
+            if owner is None or (owner is not _RESERVED and not _driver_running(owner)):
+                _profile_dirs[directory] = _RESERVED
+                os.makedirs(directory, exist_ok=True)
+                return directory
+
+def _assign_profile_dir(directory, driver):
+    with _profile_dirs_lock:
+        if driver is None:
+            _profile_dirs.pop(directory, None)
+        else:
+            _profile_dirs[directory] = driver
+
+def selenium_driver_factory(headless=False, profile='full', user_data_dir=None, block_images=True, block_css=True,
+                            performance_log=False):
+    """
+    Create and return a Chrome WebDriver instance compatible with Selenium 4.x
+
+    Args:
+        headless (bool): Start Chrome without a window
+        profile (str): 'full' loads pages like a desktop browser. 'lean' only fetches what
+            is needed to read the HTML: images, fonts, media and ad/analytics scripts are
+            blocked through CDP, memory-saving switches are set, and driver.get returns
+            once the DOM is parsed (readiness is left to utils.readiness)
+        user_data_dir (str): Lean profile only: root of persistent profile directories,
+            reused across runs for the HTTP cache (cookies are cleared at startup)
+        block_images (bool): Lean profile only: block images
+        block_css (bool): Lean profile only: block stylesheets
+        performance_log (bool): Record the DevTools network events followed by the 'network'
+            readiness condition. Chrome buffers them until they are read, so leave it off when
+            that condition is not used
+    """
     # Silence Selenium WebDriver logging
-    import logging
     selenium_logger = logging.getLogger('selenium')
     selenium_logger.setLevel(logging.INFO)
     
@@ -24,15 +115,383 @@ def selenium_driver_factory(headless=False):
     options.add_argument('--window-size=1920,1080')
     options.add_experimental_option('excludeSwitches', ['enable-automation'])
     options.add_experimental_option('useAutomationExtension', False)
+
+    if performance_log:
+        # DevTools network events, followed by utils.readiness.NetworkIdle to detect idle pages
+        options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+        options.add_experimental_option('perfLoggingPrefs', {'enableNetwork': True, 'enablePage': False})
+
+    lean = profile == 'lean'
+    profile_dir = None
+    if lean:
+        options.page_load_strategy = 'eager'
+        for argument in LEAN_CHROME_ARGS:
+            options.add_argument(argument)
+        if block_images:
+            options.add_argument('--blink-settings=imagesEnabled=false')
+            options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+        if user_data_dir:
+            profile_dir = _claim_profile_dir(user_data_dir)
+            options.add_argument(f'--user-data-dir={profile_dir}')
+    elif profile != 'full':
+        raise ValueError(f"Unknown browser profile {profile!r}, expected 'full' or 'lean'")
     
     # Use Chrome driver manager to handle driver installation
     driver_path = ChromeDriverManager().install()
     service = Service(driver_path)
     
     # Create the WebDriver with service and options
-    driver = webdriver.Chrome(service=service, options=options)
+    try:
+        driver = webdriver.Chrome(service=service, options=options)
+    except Exception:
+        if profile_dir:
+            _assign_profile_dir(profile_dir, None)
+        raise
+    if profile_dir:
+        _assign_profile_dir(profile_dir, driver)
     
     # Modify navigator.webdriver property to avoid detection
     driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+
+    if lean:
+        blocked_urls = LEAN_BLOCKED_URLS + (LEAN_CSS_URLS if block_css else [])
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': blocked_urls})
+        if profile_dir:
+            # Keep the cache of the persistent profile but start every browser with a clean session
+            driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
     
-    return driver
\ No newline at end of file
+    return driver
+
+class PooledDriver:
+    """A WebDriver leased from a DriverPool, with the bookkeeping used for recycling"""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages = 0  # Number of leases served by this driver
+        self.created_at = time.time()
+        self.retired = False  # Quit on release instead of being reused
+
+
+class DriverPool:
+    """
+    Thread-safe pool of lazily started WebDriver instances.
+
+    Drivers are only created when a lease is requested and none is idle, up to `size`.
+    Idle drivers are health checked before being handed out, and a driver is recycled
+    (quit and replaced on demand) after serving `max_pages` leases to bound the memory
+    growth of long-lived browsers. When `max_memory_mb` is set, no new browser is started
+    and released browsers are recycled while the pool's total RSS is above the cap.
+    """
+
+    def __init__(self, driver_factory=selenium_driver_factory, size=1, max_pages=50,
+                 max_memory_mb=0, logger=None, **factory_kwargs):
+        """
+        Initialize the pool
+
+        Args:
+            driver_factory: Callable creating a WebDriver, called with factory_kwargs
+            size (int): Maximum number of drivers alive at the same time
+            max_pages (int): Number of leases after which a driver is recycled (0 disables recycling)
+            max_memory_mb (int): Cap on the total RSS of all browsers in MB (0 disables the cap)
+            logger: Logger instance
+            **factory_kwargs: Keyword arguments passed to driver_factory (e.g. headless)
+        """
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+        self.driver_factory = driver_factory
+        self.factory_kwargs = factory_kwargs
+        self.size = max(1, int(size))
+        self.max_pages = int(max_pages)
+        self.max_memory_mb = int(max_memory_mb)
+        if self.max_memory_mb and psutil is None:
+            self.logger.warning("psutil is not installed, browser memory cap is disabled")
+            self.max_memory_mb = 0
+
+        self._idle = deque()
+        self._all = set()  # Every live driver, leased or idle, for memory accounting
+        self._leased = {}  # id(WebDriver) -> PooledDriver, for drivers currently leased
+        self._created = 0
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def _create(self):
+        """Start a new driver (called without holding the pool lock)"""
+        self.logger.info("Starting Selenium WebDriver for pool")
+        pooled = PooledDriver(self.driver_factory(**self.factory_kwargs))
+        with self._condition:
+            self._all.add(pooled)
+        return pooled
+
+    @staticmethod
+    def _driver_rss(pooled):
+        """RSS in bytes of a driver's chromedriver process and the browser processes it spawned"""
+        try:
+            process = psutil.Process(pooled.driver.service.process.pid)
+            processes = [process] + process.children(recursive=True)
+        except Exception:
+            return 0
+
+        rss = 0
+        for proc in processes:
+            try:
+                rss += proc.memory_info().rss
+            except Exception:
+                pass
+        return rss
+
+    def memory_usage_mb(self):
+        """Total RSS of all live browsers in MB (0 if psutil is unavailable)"""
+        if psutil is None:
+            return 0
+        with self._condition:
+            drivers = list(self._all)
+        return sum(self._driver_rss(pooled) for pooled in drivers) / (1024 * 1024)
+
+    def _over_memory_budget(self):
+        """Whether the browsers of this pool use more memory than max_memory_mb"""
+        return bool(self.max_memory_mb) and self.memory_usage_mb() > self.max_memory_mb
+
+    def _quit(self, pooled):
+        """Quit a driver, ignoring errors from an already dead browser"""
+        try:
+            pooled.driver.quit()
+        except Exception as e:
+            self.logger.debug(f"Error quitting Selenium WebDriver: {str(e)}")
+        with self._condition:
+            self._all.discard(pooled)
+
+    @staticmethod
+    def is_healthy(pooled):
+        """Check that the browser behind a driver still answers commands"""
+        try:
+            pooled.driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def acquire(self, timeout=None):
+        """
+        Lease a driver, starting one if the pool is below its size
+
+        Args:
+            timeout (float): Maximum seconds to wait for a free driver (None waits forever)
+
+        Returns:
+            PooledDriver: The leased driver
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            with self._condition:
+                if self._closed:
+                    raise RuntimeError("DriverPool is closed")
+
+                pooled = self._idle.popleft() if self._idle else None
+                if pooled is None:
+                    # Wait for a running browser instead of starting one while over the memory cap
+                    can_start = self._created < self.size and not (
+                        self._created and self._over_memory_budget())
+                    if can_start:
+                        # Reserve a slot and start the browser outside the lock
+                        self._created += 1
+                    else:
+                        remaining = None if deadline is None else deadline - time.time()
+                        if remaining is not None and remaining <= 0:
+                            raise TimeoutError("Timed out waiting for a Selenium WebDriver")
+                        self._condition.wait(remaining)
+                        continue
+
+            if pooled is not None:
+                if self.is_healthy(pooled):
+                    return self._track(pooled)
+                self.logger.warning("Discarding unresponsive Selenium WebDriver")
+                self._discard(pooled)
+                continue
+
+            try:
+                return self._track(self._create())
+            except Exception:
+                with self._condition:
+                    self._created -= 1
+                    self._condition.notify()
+                raise
+
+    def _track(self, pooled):
+        with self._condition:
+            self._leased[id(pooled.driver)] = pooled
+        return pooled
+
+    def retire(self, driver):
+        """
+        Quit a leased driver when it is released instead of reusing it
+
+        Used for a browser whose session was flagged (e.g. answered with a CAPTCHA):
+        the next lease starts a fresh browser with a clean profile.
+        """
+        with self._condition:
+            pooled = self._leased.get(id(driver))
+        if pooled is not None:
+            pooled.retired = True
+
+    def _discard(self, pooled):
+        """Quit a driver and free its slot in the pool"""
+        self._quit(pooled)
+        with self._condition:
+            self._created -= 1
+            self._condition.notify()
+
+    def release(self, pooled, discard=False):
+        """
+        Return a leased driver to the pool
+
+        Args:
+            pooled (PooledDriver): The driver returned by acquire
+            discard (bool): Quit the driver instead of reusing it (e.g. after a browser error)
+        """
+        pooled.pages += 1
+        with self._condition:
+            self._leased.pop(id(pooled.driver), None)
+        if discard or pooled.retired or self._closed:
+            self._discard(pooled)
+            return
+        if self.max_pages and pooled.pages >= self.max_pages:
+            self.logger.info(f"Recycling Selenium WebDriver after {pooled.pages} pages")
+            self._discard(pooled)
+            return
+        if self._over_memory_budget():
+            self.logger.info(f"Recycling Selenium WebDriver, browsers use more than {self.max_memory_mb} MB")
+            self._discard(pooled)
+            return
+
+        with self._condition:
+            self._idle.append(pooled)
+            self._condition.notify()
+
+    @contextmanager
+    def lease(self, timeout=None):
+        """Context manager leasing a driver; the driver is discarded if the block raises a WebDriver error"""
+        pooled = self.acquire(timeout=timeout)
+        discard = False
+        try:
+            yield pooled.driver
+        except WebDriverException:
+            discard = True
+            raise
+        finally:
+            self.release(pooled, discard=discard)
+
+    def close(self):
+        """Quit every idle driver; drivers still leased are quit when released"""
+        with self._condition:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._condition.notify_all()
+
+        for pooled in idle:
+            self._discard(pooled)
+        if idle:
+            self.logger.info(f"Closed {len(idle)} Selenium WebDriver(s)")
+
+
+
+class BrowserManager:
+    """
+    Process-wide owner of the Selenium browsers.
+
+    Both the SERP SeleniumMiddleware and the ContentScraper fallback lease drivers from
+    the single DriverPool held here, so a run never holds more than `max_browsers`
+    browsers and they are all shut down from one place. Settings may be changed with
+    configure() until the first browser is started.
+    """
+
+    def __init__(self, logger=None):
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._options = {
+            'driver_factory': selenium_driver_factory,
+            'headless': True,
+            'max_browsers': 1,
+            'max_pages': 50,
+            'max_memory_mb': 0,
+            'performance_log': False,
+            'driver_options': {},
+        }
+
+    def configure(self, **options):
+        """
+        Update the browser settings before the first browser is started
+
+        Args:
+            driver_factory: Callable creating a WebDriver
+            headless (bool): Start browsers in headless mode
+            max_browsers (int): Maximum number of browsers alive at the same time
+            max_pages (int): Number of leases after which a browser is recycled
+            max_memory_mb (int): Cap on the total RSS of all browsers in MB (0 disables the cap)
+            performance_log (bool): Record the network events used by the 'network' readiness condition
+            driver_options (dict): Extra keyword arguments of driver_factory (e.g. profile='lean')
+        """
+        unknown = set(options) - set(self._options)
+        if unknown:
+            raise ValueError(f"Unknown browser options: {sorted(unknown)}")
+
+        with self._lock:
+            if self._pool is not None:
+                if any(self._options[key] != value for key, value in options.items()):
+                    self.logger.warning("Browser pool already started, ignoring new browser settings")
+                return
+            self._options.update(options)
+
+    @property
+    def pool(self):
+        """The shared DriverPool, created with the current settings on first access"""
+        with self._lock:
+            if self._pool is None:
+                options = self._options
+                self.logger.info(f"Creating shared browser pool (max {options['max_browsers']} browsers)")
+                self._pool = DriverPool(
+                    options['driver_factory'],
+                    size=options['max_browsers'],
+                    max_pages=options['max_pages'],
+                    max_memory_mb=options['max_memory_mb'],
+                    logger=self.logger,
+                    headless=options['headless'],
+                    performance_log=options['performance_log'],
+                    **options['driver_options']
+                )
+            return self._pool
+
+    def lease(self, timeout=None):
+        """Lease a driver from the shared pool (context manager yielding the WebDriver)"""
+        return self.pool.lease(timeout=timeout)
+
+    def retire(self, driver):
+        """Replace a leased driver by a fresh browser once it is released"""
+        self.pool.retire(driver)
+
+    def shutdown(self):
+        """Quit every browser; a later lease starts a fresh pool"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            self.logger.info("Shutting down shared browser pool")
+            pool.close()
+
+
+_browser_manager = None
+_browser_manager_lock = threading.Lock()
+
+def get_browser_manager():
+    """Return the process-wide BrowserManager"""
+    global _browser_manager
+    with _browser_manager_lock:
+        if _browser_manager is None:
+            _browser_manager = BrowserManager()
+        return _browser_manager
+
+def shutdown_browsers():
+    """Quit every browser started through the shared BrowserManager"""
+    if _browser_manager is not None:
+        _browser_manager.shutdown()
+
+atexit.register(shutdown_browsers)
@@ -0,0 +1,308 @@
+import os
+import gzip
+import json
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from urllib.parse import quote
+
+# Columns of the content results produced by ContentScraper
+RESULT_FIELDS = ['title', 'url', 'description', 'content', 'date', 'main_image',
+                 'images', 'author', 'site', 'keyword']
+
+class ResultSink:
+    """
+    Base class of the streaming outputs written as each content result arrives
+
+    Subclasses implement _write() and _close(); write() may be called from several
+    extraction threads, so it is serialized here.
+    """
+
+    def __init__(self, path, logger=None):
+        """
+        Initialize the sink
+
+        Args:
+            path (str): Output file
+            logger: Logger instance
+        """
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+        self.path = path
+        self.count = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def write(self, result):
+        """Write one content result"""
+        with self._lock:
+            if self._closed:
+                raise ValueError(f"Sink {self.path} is closed")
+            self._write(result)
+            self.count += 1
+
+    def close(self):
+        """Flush and close the output"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._close()
+        self.logger.info(f"Saved {self.count} results to {self.path}")
+
+    def _write(self, result):
+        raise NotImplementedError
+
+    def _close(self):
+        raise NotImplementedError
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class JsonlSink(ResultSink):
+    """Append-only JSON Lines output, flushed after every result so a crash keeps everything written"""
+
+    def __init__(self, path, logger=None):
+        super().__init__(path, logger)
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def _write(self, result):
+        self._file.write(json.dumps(result, ensure_ascii=False, default=str) + '\n')
+        self._file.flush()
+
+    def _close(self):
+        self._file.close()
+
+
+class GzipJsonlSink(ResultSink):
+    """
+    Gzip-compressed JSON Lines output
+
+    Appending adds a new gzip member, which gzip readers concatenate transparently.
+    The stream is flushed every `flush_every` results, bounding what a crash can lose
+    without giving up most of the compression.
+    """
+
+    def __init__(self, path, flush_every=100, logger=None):
+        super().__init__(path, logger)
+        self.flush_every = max(1, int(flush_every))
+        self._file = gzip.open(path, 'at', encoding='utf-8')
+
+    def _write(self, result):
+        self._file.write(json.dumps(result, ensure_ascii=False, default=str) + '\n')
+        if (self.count + 1) % self.flush_every == 0:
+            self._file.flush()
+
+    def _close(self):
+        self._file.close()
+
+
+class XlsxSink(ResultSink):
+    """
+    Excel output written with openpyxl's write-only mode
+
+    Rows are streamed to a temporary file instead of being kept as cell objects,
+    so memory stays constant in the number of results. The workbook only becomes
+    a valid file when the sink is closed.
+    """
+
+    def __init__(self, path, fields=None, logger=None):
+        super().__init__(path, logger)
+        from openpyxl import Workbook
+
+        self.fields = list(fields) if fields else None
+        self._workbook = Workbook(write_only=True)
+        self._sheet = self._workbook.create_sheet()
+
+    @staticmethod
+    def _cell(value):
+        """Convert a result value to something openpyxl can store in a cell"""
+        if value is None or isinstance(value, (str, int, float, bool)):
+            return value
+        return str(value)
+
+    def _write(self, result):
+        if self.fields is None:
+            # Take the columns from the first result
+            self.fields = list(result.keys())
+        if self.count == 0:
+            self._sheet.append(self.fields)
+        self._sheet.append([self._cell(result.get(field)) for field in self.fields])
+
+    def _close(self):
+        if self.count == 0:
+            self._sheet.append(self.fields or RESULT_FIELDS)
+        self._workbook.save(self.path)
+
+
+class ParquetSink(ResultSink):
+    """
+    Columnar Parquet output written with pyarrow in row-group batches
+
+    Results are buffered and written as one row group every `row_group_size` rows.
+    `images` is stored as a list<string> column and `keyword`/`site` are
+    dictionary-encoded. With `partition_by` set to 'keyword' or 'date' (the crawl
+    date), `path` is a directory laid out as hive partitions, e.g.
+    `path/keyword=<value>/part-0.parquet` or `path/crawl_date=<day>/part-0.parquet`
+    (not `date=`, which would clash with the publication date column when the
+    dataset is read back). Partitions share a budget of `max_buffered_rows`: when
+    it is reached, the largest buffer is written out even if it is below a full
+    row group. At most `max_open_writers` partition files are kept open: the least
+    recently written one is closed to make room, and a partition written to again
+    afterwards continues in a new file (part-1.parquet, part-2.parquet...).
+    Like XLSX, a Parquet file is only readable once the sink is closed
+    and its footer is written.
+    """
+
+    # partition_by value -> hive partition key
+    PARTITION_KEYS = {'keyword': 'keyword', 'date': 'crawl_date'}
+
+    def __init__(self, path, row_group_size=1000, partition_by=None, compression='zstd', max_buffered_rows=None,
+                 max_open_writers=32, logger=None):
+        """
+        Initialize the sink
+
+        Args:
+            path (str): Output file, or output directory when partitioned
+            row_group_size (int): Number of rows buffered per row group
+            partition_by (str): None, 'keyword' or 'date'
+            compression (str): Parquet compression codec
+            max_buffered_rows (int): Rows buffered across all partitions (default: row_group_size)
+            max_open_writers (int): Partition files kept open at the same time
+            logger: Logger instance
+        """
+        if partition_by is not None and partition_by not in self.PARTITION_KEYS:
+            raise ValueError(f"partition_by must be one of {sorted(self.PARTITION_KEYS)}, got {partition_by}")
+        super().__init__(path, logger)
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self._pq = pq
+        self.row_group_size = max(1, int(row_group_size))
+        self.max_buffered_rows = max(1, int(max_buffered_rows or self.row_group_size))
+        self.partition_by = partition_by
+        self.compression = compression
+        self.schema = None
+        self._buffers = {}  # Partition value -> buffered rows
+        self._buffered = 0  # Rows in all the buffers
+        self.max_open_writers = max(1, int(max_open_writers))
+        self._writers = OrderedDict()  # Partition value -> open ParquetWriter, least recently used first
+        self._parts = {}  # Partition value -> number of part files written
+
+        if partition_by:
+            os.makedirs(path, exist_ok=True)
+
+    def _build_schema(self, result):
+        """Build the Arrow schema from the columns of the first result"""
+        pa = self._pa
+        dictionary_string = pa.dictionary(pa.int32(), pa.string())
+        types = {
+            'images': pa.list_(pa.string()),
+            'keyword': dictionary_string,
+            'site': dictionary_string,
+        }
+        fields = list(RESULT_FIELDS) + [field for field in result if field not in RESULT_FIELDS]
+        return pa.schema([(field, types.get(field, pa.string())) for field in fields])
+
+    def _partition_value(self, result):
+        if self.partition_by == 'keyword':
+            return result.get('keyword') or ''
+        if self.partition_by == 'date':
+            return datetime.now().strftime('%Y-%m-%d')
+        return None
+
+    def _writer_for(self, partition):
+        """Return the ParquetWriter of a partition, opening a new part file if it is not open"""
+        writer = self._writers.get(partition)
+        if writer is not None:
+            self._writers.move_to_end(partition)
+            return writer
+
+        if len(self._writers) >= self.max_open_writers:
+            _, oldest = self._writers.popitem(last=False)
+            oldest.close()
+        if self.partition_by:
+            key = self.PARTITION_KEYS[self.partition_by]
+            directory = os.path.join(self.path, f"{key}={quote(partition, safe='')}")
+            os.makedirs(directory, exist_ok=True)
+            part = self._parts.get(partition, 0)
+            self._parts[partition] = part + 1
+            file_path = os.path.join(directory, f'part-{part}.parquet')
+        else:
+            file_path = self.path
+        writer = self._pq.ParquetWriter(file_path, self.schema, compression=self.compression)
+        self._writers[partition] = writer
+        return writer
+
+    def _flush(self, partition):
+        """Write the buffered rows of a partition as one row group"""
+        rows = self._buffers.pop(partition, None)
+        if not rows:
+            return
+        self._buffered -= len(rows)
+        columns = {}
+        for field in self.schema:
+            if field.name == 'images':
+                columns[field.name] = [list(row.get('images') or []) for row in rows]
+            else:
+                columns[field.name] = [None if row.get(field.name) is None else str(row.get(field.name))
+                                       for row in rows]
+        table = self._pa.Table.from_pydict(columns, schema=self.schema)
+        self._writer_for(partition).write_table(table, row_group_size=len(rows))
+
+    def _write(self, result):
+        if self.schema is None:
+            self.schema = self._build_schema(result)
+        partition = self._partition_value(result)
+        rows = self._buffers.setdefault(partition, [])
+        rows.append(result)
+        self._buffered += 1
+        if len(rows) >= self.row_group_size:
+            self._flush(partition)
+        elif self._buffered >= self.max_buffered_rows:
+            self._flush(max(self._buffers, key=lambda value: len(self._buffers[value])))
+
+    def _close(self):
+        for partition in list(self._buffers):
+            self._flush(partition)
+        for writer in self._writers.values():
+            writer.close()
+
+
+# Sink classes by output file extension
+SINK_TYPES = {
+    '.jsonl': JsonlSink,
+    '.jsonl.gz': GzipJsonlSink,
+    '.xlsx': XlsxSink,
+    '.parquet': ParquetSink,
+}
+
+# Formats appended to by a resumed run, keeping the rows written before the interruption.
+# Not .jsonl.gz: rows buffered in the gzip stream and its truncated last member are lost in a crash
+APPENDABLE_FORMATS = ('.jsonl',)
+
+def create_sink(path, logger=None, **kwargs):
+    """
+    Create the sink matching the extension of the output path
+
+    Args:
+        path (str): Output file (.jsonl, .jsonl.gz, .xlsx or .parquet)
+        logger: Logger instance
+        **kwargs: Extra arguments for the sink class
+
+    Returns:
+        ResultSink: The opened sink
+    """
+    for extension, sink_class in sorted(SINK_TYPES.items(), key=lambda item: -len(item[0])):
+        if path.endswith(extension):
+            return sink_class(path, logger=logger, **kwargs)
+    raise ValueError(f"Unsupported output format for {path}, expected one of {sorted(SINK_TYPES)}")
@@ -1,12 +1,76 @@
-from urllib.parse import urlparse, urljoin
+from urllib.parse import urlparse, urljoin, urlunparse, urlencode, parse_qsl
+
+class WhitelistIndex:
+    """
+    Precompiled whitelist answering domain and subdomain matches with set lookups.
+
+    Entries are stored in a hash set. A domain with n labels is checked by looking up
+    its n suffixes (e.g. a.b.example.com, b.example.com, example.com, com), so a lookup
+    costs O(number of labels) whatever the size of the whitelist.
+    """
+
+    def __init__(self, domains=None):
+        """
+        Build the index
+
+        Args:
+            domains (iterable): Whitelisted domains, e.g. from utils.load_files.load_whitelist
+        """
+        self.domains = set()
+        for domain in domains or []:
+            domain = self.normalize_domain(domain)
+            if domain:
+                self.domains.add(domain)
+
+    def __len__(self):
+        return len(self.domains)
+
+    def __bool__(self):
+        return bool(self.domains)
+
+    @staticmethod
+    def normalize_domain(domain):
+        """Lowercase a domain and strip the port, trailing dot and 'www.' prefix"""
+        domain = domain.strip().lower().rstrip('.')
+        if ':' in domain:
+            domain = domain.split(':', 1)[0]
+        if domain.startswith('www.'):
+            domain = domain[4:]
+        return domain
+
+    def contains_domain(self, domain):
+        """Check if a domain is whitelisted or is a subdomain of a whitelisted domain"""
+        domain = self.normalize_domain(domain)
+        if domain in self.domains:
+            return True
+
+        # Walk the parent domains: a.b.example.com -> b.example.com -> example.com -> com
+        index = domain.find('.')
+        while index != -1:
+            if domain[index + 1:] in self.domains:
+                return True
+            index = domain.find('.', index + 1)
+        return False
+
+    def matches(self, url):
+        """Check if the domain of a URL is whitelisted"""
+        try:
+            return self.contains_domain(urlparse(url).netloc)
+        except Exception:
+            return False  # Default to not skipping in case of error
 
 def is_in_whitelist(url, whitelist):
     """
     Check if a URL in whitelist.
     Returns True if URL is in whitelist or is subdomain of whitelist entry
+
+    `whitelist` may be a list of domains (scanned linearly) or a prebuilt WhitelistIndex.
     """
     if not whitelist:
         return False
+
+    if isinstance(whitelist, WhitelistIndex):
+        return whitelist.matches(url)
         
     try:
         # Parse the URL to extract the netloc (domain)
@@ -42,4 +106,47 @@ def make_absolute_url(base_url, relative_url):
 def get_base_domain(url):
         """Extract the base domain from a URL"""
         parsed = urlparse(url)
-        return f"{parsed.scheme}://{parsed.netloc}"
\ No newline at end of file
+        return f"{parsed.scheme}://{parsed.netloc}"
+
+def normalize_url(url):
+    """
+    Normalize a URL so equivalent spellings map to the same string:
+    lowercase scheme and host, drop default ports and the fragment, sort query parameters
+    """
+    parsed = urlparse(url.strip())
+    scheme = parsed.scheme.lower()
+    netloc = parsed.netloc.lower()
+
+    # Drop default ports
+    if (scheme == 'http' and netloc.endswith(':80')) or (scheme == 'https' and netloc.endswith(':443')):
+        netloc = netloc.rsplit(':', 1)[0]
+
+    query = urlencode(sorted(parse_qsl(parsed.query, keep_blank_values=True)))
+    return urlunparse((scheme, netloc, parsed.path or '/', parsed.params, query, ''))
+
+# Query parameters that only track the visit and never change the page
+TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'dclid', 'gclsrc', 'msclkid', 'yclid', 'igshid', 'mc_cid', 'mc_eid',
+    '_ga', '_gl', 'ref_src', 'ref_url', 'spm', 'zarsrc', 'utm_id',
+}
+TRACKING_PREFIXES = ('utm_', 'pk_', 'mtm_', 'hsa_')
+
+def canonicalize_url(url):
+    """
+    Canonical form of a URL for de-duplication across runs:
+    normalize_url(), then treat http and https as the same, drop tracking
+    parameters (utm_*, fbclid, gclid, ...) and the trailing slash of the path
+    """
+    parsed = urlparse(normalize_url(url))
+    scheme = 'https' if parsed.scheme in ('http', 'https') else parsed.scheme
+
+    query = urlencode([
+        (key, value) for key, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)
+    ])
+
+    path = parsed.path
+    if len(path) > 1 and path.endswith('/'):
+        path = path.rstrip('/') or '/'
+
+    return urlunparse((scheme, parsed.netloc, path, parsed.params, query, ''))
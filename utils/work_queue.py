@@ -0,0 +1,213 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import logging
+import threading
+from collections import namedtuple
+
+# Topics of the crawler work queue
+KEYWORD_TOPIC = 'keywords'
+ARTICLE_TOPIC = 'articles'
+
+# A unit of work leased from a queue
+Job = namedtuple('Job', ['id', 'topic', 'payload', 'attempts'])
+
+class WorkQueue:
+    """
+    Interface of the shared work queues used to spread a job over several crawler nodes
+
+    Work items are leased for a limited time: a node that dies without acknowledging
+    its items lets the lease expire and another node picks them up again.
+    """
+
+    def put(self, topic, payload, key=None):
+        """Add an item; items with the same key in a topic are only queued once. Returns True if added"""
+        raise NotImplementedError
+
+    def lease(self, topic, lease_seconds=None):
+        """Lease the next available item of a topic, or return None if nothing is available"""
+        raise NotImplementedError
+
+    def extend(self, job_id, lease_seconds=None):
+        """Extend the lease of an item still being worked on"""
+        raise NotImplementedError
+
+    def ack(self, job_id):
+        """Mark a leased item as done"""
+        raise NotImplementedError
+
+    def nack(self, job_id, delay=0):
+        """Give a leased item back to the queue, available again after `delay` seconds"""
+        raise NotImplementedError
+
+    def counts(self, topic):
+        """Return the number of items of a topic per status"""
+        raise NotImplementedError
+
+    def has_unfinished(self, topic):
+        """Whether a topic still has items queued or leased by some node"""
+        counts = self.counts(topic)
+        return counts.get('queued', 0) + counts.get('leased', 0) > 0
+
+    def close(self):
+        pass
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """
+    Work queue stored in a SQLite database
+
+    Usable by several processes on one box, or by several nodes sharing a volume
+    whose file locking SQLite supports. Leasing runs in an IMMEDIATE transaction so two
+    workers never lease the same item. Items failing `max_attempts` times are parked
+    with the 'failed' status.
+    """
+
+    def __init__(self, path='queue/jobs.sqlite3', lease_seconds=600, max_attempts=3,
+                 worker_id=None, logger=None):
+        """
+        Open or create the queue
+
+        Args:
+            path (str): Database file
+            lease_seconds (float): Default lease duration
+            max_attempts (int): Number of leases after which an item is marked failed
+            worker_id (str): Identifier of this node, recorded on leased items
+            logger: Logger instance
+        """
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = int(max_attempts)
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                topic TEXT NOT NULL,
+                key TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                available_at REAL NOT NULL DEFAULT 0,
+                lease_owner TEXT,
+                lease_expires REAL,
+                updated_at REAL NOT NULL,
+                UNIQUE (topic, key)
+            );
+            CREATE INDEX IF NOT EXISTS jobs_available ON jobs (topic, status, available_at);
+        """)
+
+    def put(self, topic, payload, key=None):
+        key = key if key is not None else json.dumps(payload, sort_keys=True, ensure_ascii=False)
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO jobs (topic, key, payload, updated_at) VALUES (?, ?, ?, ?)",
+                (topic, key, json.dumps(payload, ensure_ascii=False), time.time())
+            )
+        return cursor.rowcount == 1
+
+    def put_many(self, topic, payloads, key_func=None):
+        """Add many items in one transaction. Returns the number of items added"""
+        now = time.time()
+        rows = []
+        for payload in payloads:
+            key = key_func(payload) if key_func else json.dumps(payload, sort_keys=True, ensure_ascii=False)
+            rows.append((topic, key, json.dumps(payload, ensure_ascii=False), now))
+        with self._lock:
+            before = self._db.total_changes
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO jobs (topic, key, payload, updated_at) VALUES (?, ?, ?, ?)", rows)
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            return self._db.total_changes - before
+
+    def lease(self, topic, lease_seconds=None):
+        lease_seconds = lease_seconds or self.lease_seconds
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                # Give up on items whose leases expired too many times
+                self._db.execute(
+                    """UPDATE jobs SET status = 'failed', lease_owner = NULL, updated_at = ?
+                       WHERE topic = ? AND status = 'leased' AND lease_expires < ? AND attempts >= ?""",
+                    (now, topic, now, self.max_attempts)
+                )
+                row = self._db.execute(
+                    """SELECT id, payload, attempts FROM jobs
+                       WHERE topic = ? AND ((status = 'queued' AND available_at <= ?)
+                                            OR (status = 'leased' AND lease_expires < ?))
+                       ORDER BY available_at, id LIMIT 1""",
+                    (topic, now, now)
+                ).fetchone()
+                if row is None:
+                    self._db.execute("COMMIT")
+                    return None
+
+                job_id, payload, attempts = row
+                self._db.execute(
+                    """UPDATE jobs SET status = 'leased', attempts = attempts + 1, lease_owner = ?,
+                       lease_expires = ?, updated_at = ? WHERE id = ?""",
+                    (self.worker_id, now + lease_seconds, now, job_id)
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return Job(job_id, topic, json.loads(payload), attempts + 1)
+
+    def extend(self, job_id, lease_seconds=None):
+        lease_seconds = lease_seconds or self.lease_seconds
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET lease_expires = ?, updated_at = ? WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+                (now + lease_seconds, now, job_id, self.worker_id)
+            )
+
+    def ack(self, job_id):
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'done', lease_owner = NULL, updated_at = ? WHERE id = ?",
+                (time.time(), job_id)
+            )
+
+    def nack(self, job_id, delay=0):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                """UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,
+                   available_at = ?, lease_owner = NULL, updated_at = ? WHERE id = ?""",
+                (self.max_attempts, now + delay, now, job_id)
+            )
+
+    def counts(self, topic):
+        now = time.time()
+        with self._lock:
+            rows = self._db.execute(
+                """SELECT CASE WHEN status = 'leased' AND lease_expires < ? THEN 'queued' ELSE status END,
+                          COUNT(*) FROM jobs WHERE topic = ? GROUP BY 1""",
+                (now, topic)
+            ).fetchall()
+        counts = {}
+        for status, count in rows:
+            counts[status] = counts.get(status, 0) + count
+        return counts
+
+    def close(self):
+        with self._lock:
+            self._db.close()